@@ -0,0 +1,95 @@
+"""
+Time the batched closed-form D2min of 'annotate_D2min' against a per-node
+least-squares fit (and, if scipy is installed, the per-node 'minimize' it
+replaced), on random affine neighborhood deformations.
+
+    python benchmarks/annotate_D2min.py --nodes 10000
+"""
+
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tests.test_annotate_D2min import calculate_D2min, reference_D2min  # noqa: E402
+
+
+def mean_squared_residual(
+    strain_tensor: np.ndarray, dij_now: np.ndarray, dij_future: np.ndarray
+) -> float:
+    """
+    Objective minimized per node before the closed form.
+    """
+
+    diff = dij_future - dij_now @ np.reshape(strain_tensor, (2, 2)).T
+    return (diff**2).sum(axis=1).mean()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--max_neighbors", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=3)
+
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+
+    num_neighbors = rng.integers(3, args.max_neighbors + 1, args.nodes)
+    mask = np.arange(args.max_neighbors) < num_neighbors[:, None]
+
+    dij_now = rng.normal(0, 10, (args.nodes, args.max_neighbors, 2))
+    deformations = np.eye(2) + rng.normal(0, 0.3, (args.nodes, 2, 2))
+    dij_future = np.einsum("nkj,nij->nki", dij_now, deformations)
+    dij_future += rng.normal(0, 0.5, dij_future.shape)
+
+    dij_now *= mask[..., None]
+    dij_future *= mask[..., None]
+
+    implementations = {
+        "batched closed form": lambda: calculate_D2min(
+            dij_now, dij_future, num_neighbors
+        ),
+        "per-node lstsq": lambda: np.array(
+            [
+                reference_D2min(dij_now[node, :n], dij_future[node, :n])
+                for node, n in enumerate(num_neighbors)
+            ]
+        ),
+    }
+
+    try:
+        from scipy.optimize import minimize
+
+        def scipy_D2min() -> np.ndarray:
+            D2min = np.empty(args.nodes)
+            for node, n in enumerate(num_neighbors):
+                D2min[node] = minimize(
+                    mean_squared_residual,
+                    x0=np.eye(2).reshape((4,)),
+                    args=(dij_now[node, :n], dij_future[node, :n]),
+                    tol=1e-3,
+                ).fun
+            return D2min
+
+        implementations["per-node scipy minimize"] = scipy_D2min
+    except ImportError:
+        print("scipy is not installed, skipping the per-node minimize")
+
+    results = {}
+    for name, implementation in implementations.items():
+        wall_times = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            results[name] = implementation()
+            wall_times.append(time.perf_counter() - start)
+
+        print(f"{name}: {min(wall_times):.3f} s ({args.nodes} nodes)")
+
+    for name, result in results.items():
+        deviation = np.abs(result - results["batched closed form"]).max()
+        print(f"{name}: max deviation from closed form {deviation:.2e}")
@@ -0,0 +1,50 @@
+"""
+Time the graph construction of 'build_graphs' (both graph formats) against
+the edge-by-edge networkx construction it replaced, on synthetic cell
+properties.
+
+    python benchmarks/build_graphs.py --cells 10000
+"""
+
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tests.synthetic import cell_properties  # noqa: E402
+from tests.test_build_graphs import build_graphs, reference_graph  # noqa: E402
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--cells", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=3)
+
+    args = parser.parse_args()
+
+    properties = cell_properties(args.cells)
+
+    networkx_transform = build_graphs.BuildGraphTransform(mum_px=0.65)
+    frame_graph_transform = build_graphs.BuildGraphTransform(
+        mum_px=0.65, graph_format="frame_graph"
+    )
+
+    implementations = {
+        "edge-by-edge networkx": lambda: reference_graph(properties, 0.65),
+        "edge_arrays, networkx": lambda: networkx_transform._build_networkx_graph(
+            properties
+        ),
+        "edge_arrays, frame_graph": lambda: frame_graph_transform._build_frame_graph(
+            properties
+        ),
+    }
+
+    for name, implementation in implementations.items():
+        wall_times = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            implementation()
+            wall_times.append(time.perf_counter() - start)
+
+        print(f"{name}: {min(wall_times):.3f} s ({args.cells} cells)")
@@ -0,0 +1,72 @@
+"""
+Time the Voronoi cell approximation against the watershed it can replace
+(and, with '--tile_size', the tiled variants of both), on a synthetic
+nuclei mask.
+
+    python benchmarks/cell_approximation.py --size 2048 --nuclei 8000 --tile_size 512
+"""
+
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+REPOSITORY = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(REPOSITORY), str(REPOSITORY / "lib")]
+
+from core_data_utils.datasets import BaseDataSetEntry  # noqa: E402
+
+from tests.synthetic import nuclei_mask  # noqa: E402
+from tests.utils import load_script  # noqa: E402
+
+cell_approximation = load_script(
+    "modules/image_processing/cell_approximation/scripts/cell_approximation.py"
+)
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--nuclei", type=int, default=2000)
+    parser.add_argument("--cell_cutoff_px", type=float, default=15.0)
+    parser.add_argument(
+        "--tile_size",
+        type=int,
+        default=None,
+        help="Also time the tiled approximation with tiles of this size.",
+    )
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=3)
+
+    args = parser.parse_args()
+
+    entry = BaseDataSetEntry(
+        identifier="frame", data=nuclei_mask((args.size, args.size), args.nuclei)
+    )
+
+    tile_sizes = [None] if args.tile_size is None else [None, args.tile_size]
+
+    for tile_size in tile_sizes:
+        results = {}
+        for method in ("voronoi", "watershed"):
+            transformation = cell_approximation.CellApproximationTransformation(
+                cell_cutoff_px=args.cell_cutoff_px,
+                method=method,
+                tile_size=tile_size,
+                threads=args.threads,
+            )
+
+            wall_times = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                results[method] = transformation._transform_single_entry(entry, {}).data
+                wall_times.append(time.perf_counter() - start)
+
+            name = method if tile_size is None else f"{method}, tiles {tile_size}"
+            print(f"{name}: {min(wall_times):.3f} s")
+
+        num_cells, _ = cv2.connectedComponents(results["voronoi"])
+        num_differences = np.count_nonzero(results["voronoi"] != results["watershed"])
+        print(f"{num_cells - 1} cells, {num_differences} pixels differ by method")
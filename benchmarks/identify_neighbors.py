@@ -0,0 +1,48 @@
+"""
+Time the neighbor identification of 'structure_abstraction' against the
+per-point dilation it replaced, on synthetic crowded label images.
+
+    python benchmarks/identify_neighbors.py --size 1024 --cells 2000
+"""
+
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tests.synthetic import separated_labels  # noqa: E402
+from tests.test_structure_abstraction import (  # noqa: E402
+    identify_neighbors,
+    reference_neighbors,
+)
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--cells", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--skip_reference",
+        action="store_true",
+        help="Only time the vectorized implementation.",
+    )
+
+    args = parser.parse_args()
+
+    labelim = separated_labels((args.size, args.size), args.cells)
+    parameters = dict(mum_px=0.5, cutout_size=30, dilation_size=5, iterations=2)
+
+    implementations = {"vectorized": identify_neighbors}
+    if not args.skip_reference:
+        implementations["per-point dilation"] = reference_neighbors
+
+    for name, implementation in implementations.items():
+        wall_times = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            implementation(labelim, **parameters)
+            wall_times.append(time.perf_counter() - start)
+
+        print(f"{name}: {min(wall_times):.3f} s ({labelim.max()} cells)")
@@ -0,0 +1,68 @@
+"""
+Time the separation of touching labels ('get_disconnected' without nuclei,
+as used after StarDist and Cellpose) against the sequential contour sweep it
+replaced, on synthetic crowded label images.
+
+    python benchmarks/separate_touching_labels.py --size 1024 --cells 1500
+"""
+
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import numpy as np
+
+REPOSITORY = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(REPOSITORY), str(REPOSITORY / "lib")]
+
+from cellular_dynamics.labels import separate_touching_labels  # noqa: E402
+
+from tests.synthetic import punched_labels, voronoi_labels  # noqa: E402
+from tests.test_labels import sequential_separation  # noqa: E402
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--cells", type=int, default=1500)
+    parser.add_argument(
+        "--holes",
+        type=int,
+        default=1000,
+        help="Number of background discs punched out of the second image.",
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--skip_reference",
+        action="store_true",
+        help="Only time the vectorized implementation.",
+    )
+
+    args = parser.parse_args()
+
+    shape = (args.size, args.size)
+    label_images = {
+        "voronoi": voronoi_labels(shape, args.cells),
+        "voronoi with holes": punched_labels(shape, args.cells, args.holes),
+    }
+
+    implementations = {"vectorized": separate_touching_labels}
+    if not args.skip_reference:
+        implementations["sequential"] = sequential_separation
+
+    for image_name, labels in label_images.items():
+        results = {}
+        for name, implementation in implementations.items():
+            wall_times = []
+            for _ in range(args.repeats if name == "vectorized" else 1):
+                start = time.perf_counter()
+                results[name] = implementation(labels)
+                wall_times.append(time.perf_counter() - start)
+
+            print(f"{image_name}, {name}: {min(wall_times):.3f} s")
+
+        if len(results) == 2:
+            num_differences = np.count_nonzero(
+                results["vectorized"] != results["sequential"]
+            )
+            print(f"{image_name}: {num_differences} differing pixels")
@@ -0,0 +1,3 @@
+"""
+Python code shared between the scripts of several modules.
+"""
@@ -0,0 +1,523 @@
+import warnings
+from collections.abc import Sequence
+from typing import Optional
+
+import networkx as nx
+import numpy as np
+from cellular_dynamics.frame_graph import FrameGraph, graph_topology, node_ids
+from cellular_dynamics.parallel import map_frames
+
+
+def _breadth_first_search(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    sources: np.ndarray,
+    max_distance: Optional[int] = None,
+) -> tuple[list, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Breadth-first searches from a batch of sources, advancing together level
+    by level. Nodes of the batch are addressed by flat indices
+    'source_row * num_nodes + node'. Searches stop after 'max_distance'
+    levels, if given.
+
+    Returns:
+        (tuple[list, np.ndarray, np.ndarray, np.ndarray]): Edges of the
+            shortest path DAGs between consecutive levels (frontier, parent
+            position in the frontier, flat child index, CSR entry), (S, N)
+            distances (-1 for unreached nodes), flat number of shortest
+            paths and a mask of the searches stopped by 'max_distance'.
+    """
+
+    num_nodes = len(indptr) - 1
+    num_sources = len(sources)
+
+    distances = np.full(num_sources * num_nodes, -1, dtype=np.int64)
+    num_paths = np.zeros(num_sources * num_nodes)
+    truncated = np.zeros(num_sources, dtype=bool)
+
+    frontier = np.arange(num_sources) * num_nodes + sources
+    distances[frontier] = 0
+    num_paths[frontier] = 1.0
+
+    levels = []
+
+    while len(frontier) > 0:
+        rows, nodes = np.divmod(frontier, num_nodes)
+        degree = indptr[nodes + 1] - indptr[nodes]
+
+        parents = np.repeat(np.arange(len(frontier)), degree)
+        csr_entries = (
+            np.arange(len(parents))
+            - np.repeat(np.cumsum(degree) - degree, degree)
+            + indptr[nodes][parents]
+        )
+        children = rows[parents] * num_nodes + indices[csr_entries]
+
+        # undiscovered neighbors form the next level
+        on_dag = distances[children] == -1
+        parents, children = parents[on_dag], children[on_dag]
+
+        if len(levels) == max_distance:
+            truncated[rows[parents]] = True
+            break
+
+        next_frontier, child_positions = np.unique(children, return_inverse=True)
+        distances[next_frontier] = len(levels) + 1
+        num_paths[next_frontier] = np.bincount(
+            child_positions, weights=num_paths[frontier[parents]]
+        )
+
+        levels.append((frontier, parents, children, csr_entries[on_dag]))
+        frontier = next_frontier
+
+    return levels, distances.reshape(num_sources, num_nodes), num_paths, truncated
+
+
+def _accumulate_dependencies(
+    levels: list,
+    num_paths: np.ndarray,
+    edge_index: np.ndarray,
+    num_edges: int,
+    sources: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Brandes' dependency accumulation over the levels of
+    '_breadth_first_search', summed over all sources. Sources do not depend
+    on themselves.
+    """
+
+    num_sources = len(sources)
+    dependencies = np.zeros(len(num_paths))
+    edges, contributions = [np.empty(0, dtype=np.int64)], [np.empty(0)]
+
+    for frontier, parents, children, csr_entries in reversed(levels):
+        level_contributions = (
+            num_paths[frontier[parents]]
+            / num_paths[children]
+            * (1.0 + dependencies[children])
+        )
+        dependencies[frontier] += np.bincount(
+            parents, weights=level_contributions, minlength=len(frontier)
+        )
+
+        edges.append(edge_index[csr_entries])
+        contributions.append(level_contributions)
+
+    dependencies = dependencies.reshape(num_sources, -1)
+    dependencies[np.arange(num_sources), sources] = 0.0
+
+    return dependencies.sum(axis=0), np.bincount(
+        np.concatenate(edges),
+        weights=np.concatenate(contributions),
+        minlength=num_edges,
+    )
+
+
+def shortest_path_sums(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    edge_index: np.ndarray,
+    num_edges: int,
+    sources: np.ndarray,
+    betweenness: bool = True,
+    closeness: bool = True,
+    max_distance: Optional[int] = None,
+    batch_size: int = 64,
+) -> dict[str, np.ndarray]:
+    """
+    Run the breadth-first searches from 'sources' over a CSR adjacency and
+    accumulate everything betweenness and closeness centrality need, in
+    batches of 'batch_size' sources.
+
+    Args:
+        indptr (np.ndarray): CSR index pointer.
+        indices (np.ndarray): CSR neighbors.
+        edge_index (np.ndarray): Edge belonging to each entry of 'indices'.
+        num_edges (int): Number of edges.
+        sources (np.ndarray): Source nodes.
+        betweenness (bool, optional): Accumulate dependencies.
+        closeness (bool, optional): Collect distances.
+        max_distance (int, optional): Search radius, only without
+            'betweenness'.
+        batch_size (int, optional): Number of sources searched together.
+
+    Returns:
+        (dict[str, np.ndarray]): 'node_dependencies' and 'edge_dependencies'
+            summed over all sources (for 'betweenness'), 'num_reachable',
+            'distance_sums' and 'truncated' for every source (for
+            'closeness').
+    """
+
+    if betweenness and (max_distance is not None):
+        raise ValueError("Betweenness requires unbounded searches.")
+
+    sums = {}
+    if betweenness:
+        sums["node_dependencies"] = np.zeros(len(indptr) - 1)
+        sums["edge_dependencies"] = np.zeros(num_edges)
+    batch_closeness = []
+
+    for start in range(0, len(sources), batch_size):
+        batch_sources = sources[start : start + batch_size]
+
+        levels, distances, num_paths, truncated = _breadth_first_search(
+            indptr, indices, batch_sources, max_distance=max_distance
+        )
+
+        if betweenness:
+            node_dependencies, edge_dependencies = _accumulate_dependencies(
+                levels, num_paths, edge_index, num_edges, batch_sources
+            )
+            sums["node_dependencies"] += node_dependencies
+            sums["edge_dependencies"] += edge_dependencies
+
+        if closeness:
+            batch_closeness.append(
+                (
+                    np.sum(distances >= 0, axis=1),
+                    np.sum(distances.clip(min=0), axis=1),
+                    truncated,
+                )
+            )
+
+    if closeness:
+        for index, (name, dtype) in enumerate(
+            (
+                ("num_reachable", np.int64),
+                ("distance_sums", np.int64),
+                ("truncated", bool),
+            )
+        ):
+            sums[name] = np.concatenate(
+                [np.empty(0, dtype=dtype)]
+                + [values[index] for values in batch_closeness]
+            )
+
+    return sums
+
+
+def _shortest_path_task(
+    task: int,
+    arrays: dict[str, np.ndarray],
+    closeness_radius: Optional[int],
+    batch_size: int,
+) -> dict[str, np.ndarray]:
+    """
+    'shortest_path_sums' for the sources of 'task', from the arrays built by
+    'shortest_path_centralities'.
+    """
+
+    frame = arrays["task_frames"][task]
+    betweenness, closeness = arrays["task_kinds"][task]
+    node_start, node_stop = arrays["node_offsets"][frame : frame + 2]
+    edge_start, edge_stop = arrays["edge_offsets"][frame : frame + 2]
+
+    indptr = arrays["indptr"][node_start : node_stop + 1]
+    entries = np.s_[indptr[0] : indptr[-1]]
+
+    return shortest_path_sums(
+        indptr - indptr[0],
+        arrays["indices"][entries] - node_start,
+        arrays["edge_index"][entries] - edge_start,
+        edge_stop - edge_start,
+        arrays["sources"][slice(*arrays["task_sources"][task])],
+        betweenness=betweenness,
+        closeness=closeness,
+        max_distance=None if betweenness else closeness_radius,
+        batch_size=batch_size,
+    )
+
+
+def _hoeffding_bound(num_samples: int, num_values: int, probability: float) -> float:
+    """
+    Deviation which none of 'num_values' means of 'num_samples' samples in
+    [0, 1] exceeds with probability 1 - 'probability' (Hoeffding's inequality
+    with a union bound, also valid for sampling without replacement).
+    """
+
+    if num_samples < 1:
+        return np.inf
+    return float(
+        np.sqrt(np.log(2 * max(num_values, 1) / probability) / (2 * num_samples))
+    )
+
+
+def shortest_path_centralities(
+    graphs: Sequence[nx.Graph | FrameGraph],
+    cpus: int = 1,
+    betweenness: bool = True,
+    closeness: bool = True,
+    num_samples: Optional[int] = None,
+    seed: int = 0,
+    closeness_radius: Optional[int] = None,
+    error_probability: float = 0.05,
+    batch_size: int = 64,
+) -> list[tuple[dict[str, dict], dict]]:
+    """
+    Betweenness centrality of nodes and edges and closeness centrality of
+    all graphs, from a single set of breadth-first searches per graph
+    (Brandes' algorithm). Values are identical (up to floating point
+    summation order) to 'networkx.betweenness_centrality',
+    'networkx.edge_betweenness_centrality' and 'networkx.closeness_centrality'
+    with their default arguments. Searches only needed for betweenness or
+    only for closeness are skipped if these are not requested.
+
+    For large graphs, betweenness can be estimated from 'num_samples'
+    source nodes per graph, drawn with a generator seeded by ('seed', graph
+    index) and normalized like networkx with 'k'. Closeness can be
+    restricted to the 'closeness_radius'-hop neighborhood of every node,
+    which is exact for nodes whose connected component lies within the
+    radius. Closeness stays exact unless a radius is given; as exact
+    closeness needs a search from every node, a warning is issued if
+    betweenness is sampled without one. The accuracy of both is returned
+    alongside the values: a Hoeffding bound which no betweenness estimate of
+    a graph exceeds with probability 1 - 'error_probability', and the
+    fraction of nodes with exact closeness.
+
+    The sources of every graph are split into ranges, so that all 'cpus'
+    processes are busy even for a single large graph.
+
+    Args:
+        graphs (Sequence[nx.Graph | FrameGraph]): Graphs.
+        cpus (int, optional): Number of worker processes. Defaults to 1.
+        betweenness (bool, optional): Compute node and edge betweenness.
+        closeness (bool, optional): Compute closeness.
+        num_samples (int, optional): Number of betweenness sources per graph.
+            Defaults to None (all nodes).
+        seed (int, optional): Seed for sampling the sources. Defaults to 0.
+        closeness_radius (int, optional): Closeness search radius. Defaults
+            to None (unbounded).
+        error_probability (float, optional): Probability with which the
+            betweenness error bounds may be exceeded. Defaults to 0.05.
+        batch_size (int, optional): Number of sources searched together.
+
+    Returns:
+        (list[tuple[dict[str, dict], dict]]): For every graph, the requested
+            'betweenness_centrality' and 'closeness_centrality' keyed by node
+            id and 'edge_betweenness_centrality' keyed by edge, together with
+            a description of the approximations (empty if exact).
+    """
+
+    if (num_samples is not None) and (num_samples < 1):
+        raise ValueError(f"Invalid number of samples ({num_samples}).")
+    if (closeness_radius is not None) and (closeness_radius < 1):
+        raise ValueError(f"Invalid closeness radius ({closeness_radius}).")
+    if closeness and (num_samples is not None) and (closeness_radius is None):
+        warnings.warn(
+            "Betweenness is sampled, but closeness is exact and needs a search "
+            "from every node, which dominates the run time for large graphs. "
+            "Set 'closeness_radius' to bound the closeness searches.",
+            stacklevel=2,
+        )
+
+    topologies = [graph_topology(graph) for graph in graphs]
+
+    node_offsets = np.zeros(len(topologies) + 1, dtype=np.int64)
+    np.cumsum(
+        [topology.number_of_nodes() for topology in topologies], out=node_offsets[1:]
+    )
+    edge_offsets = np.zeros(len(topologies) + 1, dtype=np.int64)
+    np.cumsum(
+        [topology.number_of_edges() for topology in topologies], out=edge_offsets[1:]
+    )
+
+    # every edge has two CSR entries
+    indptr = [np.zeros(1, dtype=np.int64)]
+    for frame, topology in enumerate(topologies):
+        indptr.append(topology.indptr[1:] + 2 * edge_offsets[frame])
+
+    # sources of the (betweenness, closeness) searches of every graph, one set
+    # of searches serves both if all nodes are searched without radius
+    frame_searches = []
+    for frame, topology in enumerate(topologies):
+        num_nodes = topology.number_of_nodes()
+
+        if (num_samples is None) or (num_samples >= num_nodes):
+            betweenness_sources = np.arange(num_nodes)
+        else:
+            betweenness_sources = np.sort(
+                np.random.default_rng((seed, frame)).choice(
+                    num_nodes, size=num_samples, replace=False
+                )
+            )
+
+        searches = {}
+        if (
+            betweenness
+            and closeness
+            and (len(betweenness_sources) == num_nodes)
+            and (closeness_radius is None)
+        ):
+            searches[(True, True)] = betweenness_sources
+        else:
+            if betweenness:
+                searches[(True, False)] = betweenness_sources
+            if closeness:
+                searches[(False, True)] = np.arange(num_nodes)
+        frame_searches.append(searches)
+
+    # split the searches of every graph such that there are at least 'cpus' tasks
+    ranges_per_search = max(1, -(-cpus // max(len(topologies), 1)))
+    sources, task_frames, task_kinds, task_sources = [], [], [], []
+    frame_tasks = []
+    num_sources = 0
+
+    for frame, searches in enumerate(frame_searches):
+        first_task = len(task_frames)
+
+        for kind, search_sources in searches.items():
+            bounds = num_sources + np.linspace(
+                0,
+                len(search_sources),
+                min(ranges_per_search, len(search_sources)) + 1,
+            ).astype(np.int64)
+
+            sources.append(search_sources)
+            num_sources += len(search_sources)
+
+            task_frames.extend([frame] * (len(bounds) - 1))
+            task_kinds.extend([kind] * (len(bounds) - 1))
+            task_sources.extend(zip(bounds[:-1], bounds[1:]))
+
+        frame_tasks.append(np.s_[first_task : len(task_frames)])
+
+    task_results = map_frames(
+        _shortest_path_task,
+        len(task_frames),
+        {
+            "node_offsets": node_offsets,
+            "edge_offsets": edge_offsets,
+            "indptr": np.concatenate(indptr),
+            "indices": np.concatenate(
+                [np.empty(0, dtype=np.int64)]
+                + [
+                    topology.indices + node_offsets[frame]
+                    for frame, topology in enumerate(topologies)
+                ]
+            ),
+            "edge_index": np.concatenate(
+                [np.empty(0, dtype=np.int64)]
+                + [
+                    topology.edge_index + edge_offsets[frame]
+                    for frame, topology in enumerate(topologies)
+                ]
+            ),
+            "sources": np.concatenate([np.empty(0, dtype=np.int64)] + sources),
+            "task_frames": np.array(task_frames, dtype=np.int64),
+            "task_kinds": np.array(task_kinds, dtype=bool).reshape(-1, 2),
+            "task_sources": np.array(task_sources, dtype=np.int64).reshape(-1, 2),
+        },
+        cpus=cpus,
+        closeness_radius=closeness_radius,
+        batch_size=batch_size,
+    )
+
+    centralities = []
+
+    for topology, searches, tasks in zip(topologies, frame_searches, frame_tasks):
+        frame_results = task_results[tasks]
+        num_nodes = topology.number_of_nodes()
+        num_edges = topology.number_of_edges()
+
+        frame_centralities = {}
+        approximation = {}
+        frame_node_ids = node_ids(topology).tolist()
+
+        if betweenness:
+            node_betweenness, edge_betweenness = (
+                sum(
+                    (result[name] for result in frame_results if name in result),
+                    np.zeros(size),
+                )
+                for name, size in (
+                    ("node_dependencies", num_nodes),
+                    ("edge_dependencies", num_edges),
+                )
+            )
+
+            # normalization of networkx (without endpoints for node
+            # betweenness), sampled sources only depend on the other k - 1
+            betweenness_sources = next(
+                search_sources
+                for (search_betweenness, _), search_sources in searches.items()
+                if search_betweenness
+            )
+            num_samples_frame = len(betweenness_sources)
+
+            if num_samples_frame < num_nodes:
+                if num_nodes > 2:
+                    node_scale = np.full(
+                        num_nodes, 1 / (num_samples_frame * (num_nodes - 2))
+                    )
+                    node_scale[betweenness_sources] = (
+                        1 / ((num_samples_frame - 1) * (num_nodes - 2))
+                        if num_samples_frame > 1
+                        else np.nan
+                    )
+                    node_betweenness *= node_scale
+                edge_betweenness *= 1 / (num_samples_frame * (num_nodes - 1))
+
+                approximation.update(
+                    {
+                        "betweenness_num_samples": num_samples_frame,
+                        "betweenness_seed": seed,
+                        "betweenness_error_probability": error_probability,
+                        "betweenness_centrality_error_bound": _hoeffding_bound(
+                            num_samples_frame - 1, num_nodes, error_probability
+                        ),
+                        "edge_betweenness_centrality_error_bound": _hoeffding_bound(
+                            num_samples_frame, num_edges, error_probability
+                        ),
+                    }
+                )
+            else:
+                if num_nodes > 2:
+                    node_betweenness *= 1 / ((num_nodes - 1) * (num_nodes - 2))
+                if num_nodes > 1:
+                    edge_betweenness *= 1 / (num_nodes * (num_nodes - 1))
+
+            edge_ids = map(tuple, topology.node_ids[topology.edge_nodes].tolist())
+
+            frame_centralities["betweenness_centrality"] = dict(
+                zip(frame_node_ids, node_betweenness.tolist())
+            )
+            frame_centralities["edge_betweenness_centrality"] = dict(
+                zip(edge_ids, edge_betweenness.tolist())
+            )
+
+        if closeness:
+            num_reachable, distance_sums, truncated = (
+                np.concatenate(
+                    [np.empty(0, dtype=dtype)]
+                    + [result[name] for result in frame_results if name in result]
+                )
+                for name, dtype in (
+                    ("num_reachable", np.int64),
+                    ("distance_sums", np.int64),
+                    ("truncated", bool),
+                )
+            )
+
+            closeness_values = np.zeros(num_nodes)
+            connected = (distance_sums > 0) & (num_nodes > 1)
+            closeness_values[connected] = (
+                (num_reachable[connected] - 1.0) / distance_sums[connected]
+            ) * ((num_reachable[connected] - 1.0) / (num_nodes - 1))
+
+            if closeness_radius is not None:
+                approximation.update(
+                    {
+                        "closeness_radius": closeness_radius,
+                        "closeness_exact_fraction": (
+                            float(1.0 - np.mean(truncated)) if num_nodes > 0 else 1.0
+                        ),
+                    }
+                )
+
+            frame_centralities["closeness_centrality"] = dict(
+                zip(frame_node_ids, closeness_values.tolist())
+            )
+
+        centralities.append((frame_centralities, approximation))
+
+    return centralities
@@ -0,0 +1,555 @@
+from collections.abc import Iterable, Iterator, MutableMapping
+from typing import Any
+
+import networkx as nx
+import numpy as np
+
+
+class AttributeTable:
+    """
+    Columnar storage of the attributes of a fixed number of items (nodes or
+    edges). Every attribute is an array whose first axis runs over the items.
+    Items without a value for an attribute are tracked in a boolean mask.
+    """
+
+    def __init__(self, num_items: int) -> None:
+        self._num_items = num_items
+        self._columns: dict[str, np.ndarray] = {}
+        self._missing: dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "AttributeTable":
+        """
+        Build a table from one attribute dictionary per item.
+        """
+
+        records = list(records)
+        table = cls(len(records))
+
+        names = list(dict.fromkeys(name for record in records for name in record))
+
+        for name in names:
+            present = np.fromiter(
+                (name in record for record in records), dtype=bool, count=len(records)
+            )
+            fill_value = records[int(np.argmax(present))][name]
+            values = [record.get(name, fill_value) for record in records]
+
+            table.set_column(name, values)
+            if not np.all(present):
+                table._missing[name] = ~present
+
+        return table
+
+    def __len__(self) -> int:
+        return self._num_items
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._columns
+
+    @property
+    def names(self) -> list[str]:
+        return list(self._columns)
+
+    def column(self, name: str, default: Any = None) -> np.ndarray:
+        """
+        Values of attribute 'name' for all items. Missing values are replaced
+        by 'default', if it is not None, and raise a KeyError otherwise.
+        """
+
+        if default is not None:
+            if name not in self._columns:
+                return np.full(self._num_items, default)
+            if name in self._missing:
+                column = self._columns[name].copy()
+                column[self._missing[name]] = default
+                return column
+
+        if name in self._missing:
+            raise KeyError(f"Attribute '{name}' is missing for some items.")
+        return self._columns[name]
+
+    def present(self, name: str) -> np.ndarray:
+        """
+        Mask of the items which have a value for attribute 'name'.
+        """
+
+        if name not in self._columns:
+            return np.zeros(self._num_items, dtype=bool)
+        if name in self._missing:
+            return ~self._missing[name]
+        return np.ones(self._num_items, dtype=bool)
+
+    def set_column(self, name: str, values: Any) -> None:
+        try:
+            column = np.asarray(values)
+        except ValueError:
+            column = None
+
+        # values of different shapes (e.g. dictionaries, lists) are stored as objects
+        if (
+            column is None
+            or column.shape[:1] != (self._num_items,)
+            or column.dtype == object
+        ):
+            column = np.empty(self._num_items, dtype=object)
+            for index, value in enumerate(values):
+                column[index] = value
+
+        self._columns[name] = column
+        self._missing.pop(name, None)
+
+    def has_value(self, name: str, index: int) -> bool:
+        if name not in self._columns:
+            return False
+        return name not in self._missing or not self._missing[name][index]
+
+    def get_value(self, name: str, index: int) -> Any:
+        if not self.has_value(name, index):
+            raise KeyError(name)
+
+        value = self._columns[name][index]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def set_value(self, name: str, index: int, value: Any) -> None:
+        column = self._columns.get(name)
+
+        if column is None:
+            dtype = np.asarray(value).dtype
+            shape = np.shape(value) if dtype != object else ()
+            column = np.zeros((self._num_items,) + shape, dtype=dtype)
+            self._columns[name] = column
+            self._missing[name] = np.ones(self._num_items, dtype=bool)
+        elif column.dtype != object and not np.can_cast(
+            np.asarray(value).dtype, column.dtype, casting="same_kind"
+        ):
+            column = column.astype(np.result_type(column, np.asarray(value)))
+            self._columns[name] = column
+
+        column[index] = value
+
+        if name in self._missing:
+            self._missing[name][index] = False
+            if not np.any(self._missing[name]):
+                del self._missing[name]
+
+    def delete_value(self, name: str, index: int) -> None:
+        if not self.has_value(name, index):
+            raise KeyError(name)
+
+        missing = self._missing.setdefault(name, np.zeros(self._num_items, dtype=bool))
+        missing[index] = True
+
+        if np.all(missing):
+            del self._columns[name]
+            del self._missing[name]
+
+    def record(self, index: int) -> dict:
+        return {
+            name: self.get_value(name, index)
+            for name in self._columns
+            if self.has_value(name, index)
+        }
+
+
+class NodeAttributeView(MutableMapping):
+    """
+    Dictionary-like view of the attributes of a single node, equivalent to
+    'graph.nodes[node_id]' of a networkx graph.
+    """
+
+    def __init__(self, table: AttributeTable, index: int) -> None:
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, name: str) -> Any:
+        return self._table.get_value(name, self._index)
+
+    def __setitem__(self, name: str, value: Any) -> None:
+        self._table.set_value(name, self._index, value)
+
+    def __delitem__(self, name: str) -> None:
+        self._table.delete_value(name, self._index)
+
+    def __contains__(self, name: object) -> bool:
+        return self._table.has_value(name, self._index)
+
+    def __iter__(self) -> Iterator[str]:
+        return (
+            name
+            for name in self._table.names
+            if self._table.has_value(name, self._index)
+        )
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class NodeView:
+    """
+    Read access to the nodes of a FrameGraph, mimicking 'networkx.Graph.nodes'.
+    """
+
+    def __init__(self, graph: "FrameGraph") -> None:
+        self._graph = graph
+
+    def __getitem__(self, node_id: int) -> NodeAttributeView:
+        return NodeAttributeView(
+            self._graph.node_attributes, self._graph.node_position(node_id)
+        )
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._graph.node_ids.tolist())
+
+    def __len__(self) -> int:
+        return self._graph.number_of_nodes()
+
+    def __contains__(self, node_id: object) -> bool:
+        return node_id in self._graph
+
+    def __call__(self, data: bool = False) -> Iterator:
+        if not data:
+            return iter(self)
+        return (
+            (node_id, NodeAttributeView(self._graph.node_attributes, index))
+            for index, node_id in enumerate(self._graph.node_ids.tolist())
+        )
+
+
+class FrameGraph:
+    """
+    Compact, array-backed representation of the cell graph of a single frame.
+
+    Nodes are identified by integer ids (the object labels) and have a fixed
+    position given by their order in 'node_ids'. Edges are undirected and
+    stored as (E, 2) array of node positions. Node and edge attributes are
+    kept column-wise. The adjacency is available in CSR format, where the
+    neighbors of a node appear in the order in which edges were added (as in
+    networkx).
+    """
+
+    def __init__(
+        self,
+        node_ids: np.ndarray,
+        node_attributes: AttributeTable | None = None,
+        edges: np.ndarray | None = None,
+        edge_attributes: AttributeTable | None = None,
+    ) -> None:
+        self._node_ids = np.asarray(node_ids, dtype=np.int64)
+        self._edges = (
+            np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+            if edges is not None
+            else np.empty((0, 2), dtype=np.int64)
+        )
+
+        self.node_attributes = (
+            node_attributes
+            if node_attributes is not None
+            else AttributeTable(len(self._node_ids))
+        )
+        self.edge_attributes = (
+            edge_attributes
+            if edge_attributes is not None
+            else AttributeTable(len(self._edges))
+        )
+
+        if len(self.node_attributes) != len(self._node_ids):
+            raise ValueError("Number of node attribute rows does not match nodes.")
+        if len(self.edge_attributes) != len(self._edges):
+            raise ValueError("Number of edge attribute rows does not match edges.")
+
+        self._build_index()
+
+    def _build_index(self) -> None:
+        num_nodes = len(self._node_ids)
+
+        self._sorter = np.argsort(self._node_ids, kind="stable")
+        if np.any(np.diff(self._node_ids[self._sorter]) == 0):
+            raise ValueError("Node ids are not unique.")
+
+        # both directions of every edge, in order of insertion
+        sources = self._edges.ravel()
+        targets = self._edges[:, ::-1].ravel()
+        order = np.argsort(sources, kind="stable")
+
+        self._indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=num_nodes), out=self._indptr[1:])
+        self._indices = targets[order]
+        self._edge_index = order // 2
+
+    def __getstate__(self) -> dict:
+        # the index is cheap to rebuild and would double the pickle size
+        return {
+            "node_ids": self._node_ids,
+            "edges": self._edges,
+            "node_attributes": self.node_attributes,
+            "edge_attributes": self.edge_attributes,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self._node_ids = state["node_ids"]
+        self._edges = state["edges"]
+        self.node_attributes = state["node_attributes"]
+        self.edge_attributes = state["edge_attributes"]
+        self._build_index()
+
+    @property
+    def node_ids(self) -> np.ndarray:
+        return self._node_ids
+
+    @property
+    def edge_nodes(self) -> np.ndarray:
+        """(E, 2) array of the node positions of all edges."""
+        return self._edges
+
+    @property
+    def indptr(self) -> np.ndarray:
+        return self._indptr
+
+    @property
+    def indices(self) -> np.ndarray:
+        return self._indices
+
+    @property
+    def edge_index(self) -> np.ndarray:
+        """Edge belonging to each entry of 'indices'."""
+        return self._edge_index
+
+    @property
+    def nodes(self) -> NodeView:
+        return NodeView(self)
+
+    def number_of_nodes(self) -> int:
+        return len(self._node_ids)
+
+    def number_of_edges(self) -> int:
+        return len(self._edges)
+
+    def __len__(self) -> int:
+        return self.number_of_nodes()
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._node_ids.tolist())
+
+    def __contains__(self, node_id: object) -> bool:
+        try:
+            self.node_position(node_id)
+        except (KeyError, TypeError, ValueError):
+            return False
+        return True
+
+    def node_positions(self, node_ids: Any) -> np.ndarray:
+        """
+        Map node ids to node positions.
+
+        Raises:
+            KeyError: If any of the ids is not a node of the graph.
+        """
+
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+
+        if len(self._node_ids) == 0:
+            if node_ids.size > 0:
+                raise KeyError(f"Nodes {np.unique(node_ids).tolist()} not in graph")
+            return node_ids
+
+        positions = self._sorter[
+            np.searchsorted(self._node_ids, node_ids, sorter=self._sorter).clip(
+                max=len(self._node_ids) - 1
+            )
+        ]
+
+        unknown = self._node_ids[positions] != node_ids
+        if np.any(unknown):
+            raise KeyError(
+                f"Nodes {np.unique(node_ids[unknown]).tolist()} not in graph"
+            )
+
+        return positions
+
+    def node_position(self, node_id: int) -> int:
+        if isinstance(node_id, (float, np.floating)) or np.ndim(node_id) != 0:
+            raise KeyError(node_id)
+        return int(self.node_positions(node_id))
+
+    def neighbor_positions(self, position: int) -> np.ndarray:
+        return self._indices[self._indptr[position] : self._indptr[position + 1]]
+
+    def neighbors(self, node_id: int) -> Iterator[int]:
+        return iter(
+            self._node_ids[
+                self.neighbor_positions(self.node_position(node_id))
+            ].tolist()
+        )
+
+    def degree(self) -> np.ndarray:
+        return np.diff(self._indptr)
+
+    @classmethod
+    def from_networkx(cls, graph: nx.Graph) -> "FrameGraph":
+        node_ids = np.fromiter(graph.nodes, dtype=np.int64, count=len(graph))
+        position = {node_id: index for index, node_id in enumerate(graph.nodes)}
+
+        edge_data = list(graph.edges(data=True))
+        edges = np.array(
+            [(position[u], position[v]) for u, v, _ in edge_data], dtype=np.int64
+        )
+
+        return cls(
+            node_ids,
+            node_attributes=AttributeTable.from_records(
+                data for _, data in graph.nodes(data=True)
+            ),
+            edges=edges,
+            edge_attributes=AttributeTable.from_records(
+                data for _, _, data in edge_data
+            ),
+        )
+
+    def to_networkx(self) -> nx.Graph:
+        graph = nx.Graph()
+
+        node_ids = self._node_ids.tolist()
+
+        graph.add_nodes_from(
+            (node_id, self.node_attributes.record(index))
+            for index, node_id in enumerate(node_ids)
+        )
+        graph.add_edges_from(
+            (node_ids[u], node_ids[v], self.edge_attributes.record(index))
+            for index, (u, v) in enumerate(self._edges.tolist())
+        )
+
+        return graph
+
+
+def node_ids(graph: nx.Graph | FrameGraph) -> np.ndarray:
+    """
+    Ids of all nodes, in node order.
+    """
+
+    if isinstance(graph, FrameGraph):
+        return graph.node_ids
+    return np.fromiter(graph.nodes, dtype=np.int64, count=len(graph))
+
+
+def node_column(
+    graph: nx.Graph | FrameGraph, name: str, default: Any = None
+) -> np.ndarray:
+    """
+    Values of node attribute 'name' for all nodes, in node order. Missing
+    values are replaced by 'default', if it is not None.
+    """
+
+    if isinstance(graph, FrameGraph):
+        return graph.node_attributes.column(name, default=default)
+    if default is not None:
+        return np.array([data.get(name, default) for _, data in graph.nodes(data=True)])
+    return np.array([data[name] for _, data in graph.nodes(data=True)])
+
+
+def node_attribute_table(graph: nx.Graph | FrameGraph) -> AttributeTable:
+    """
+    Node attributes of 'graph' as AttributeTable, in node order.
+    """
+
+    if isinstance(graph, FrameGraph):
+        return graph.node_attributes
+    return AttributeTable.from_records(data for _, data in graph.nodes(data=True))
+
+
+def set_node_column(graph: nx.Graph | FrameGraph, name: str, values: Any) -> None:
+    """
+    Set node attribute 'name' for all nodes from values given in node order.
+    """
+
+    if isinstance(graph, FrameGraph):
+        graph.node_attributes.set_column(name, values)
+        return
+
+    for (_, data), value in zip(graph.nodes(data=True), values, strict=True):
+        data[name] = value.item() if isinstance(value, np.generic) else value
+
+
+def graph_topology(graph: nx.Graph | FrameGraph) -> FrameGraph:
+    """
+    Nodes and edges of 'graph' as FrameGraph without attributes, edges in the
+    order of 'graph.edges()'. FrameGraphs are returned as they are.
+    """
+
+    if isinstance(graph, FrameGraph):
+        return graph
+
+    position = {node_id: index for index, node_id in enumerate(graph.nodes)}
+    edges = np.array(
+        [(position[u], position[v]) for u, v in graph.edges()], dtype=np.int64
+    )
+
+    return FrameGraph(node_ids(graph), edges=edges)
+
+
+def csr_adjacency(graph: nx.Graph | FrameGraph) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Adjacency in CSR format ('indptr', 'indices') over node positions.
+    """
+
+    frame_graph = graph_topology(graph)
+
+    return frame_graph.indptr, frame_graph.indices
+
+
+def set_node_attributes(
+    graph: nx.Graph | FrameGraph, values: dict[int, Any], name: str
+) -> None:
+    """
+    Equivalent of 'networkx.set_node_attributes' for both graph types.
+    """
+
+    if not isinstance(graph, FrameGraph):
+        nx.set_node_attributes(graph, values, name)
+        return
+
+    for node_id, value in values.items():
+        if node_id in graph:
+            graph.node_attributes.set_value(name, graph.node_position(node_id), value)
+
+
+def set_edge_attributes(
+    graph: nx.Graph | FrameGraph, values: dict[tuple[int, int], Any], name: str
+) -> None:
+    """
+    Equivalent of 'networkx.set_edge_attributes' for both graph types.
+    """
+
+    if not isinstance(graph, FrameGraph):
+        nx.set_edge_attributes(graph, values, name)
+        return
+
+    edge_ids = graph.node_ids[graph.edge_nodes].tolist()
+    edge_position = {}
+    for index, (u, v) in enumerate(edge_ids):
+        edge_position[(u, v)] = index
+        edge_position[(v, u)] = index
+
+    for edge, value in values.items():
+        if edge in edge_position:
+            graph.edge_attributes.set_value(name, edge_position[edge], value)
+
+
+def pad_adjacency(indptr: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    """
+    Convert a CSR adjacency ('indptr' starting at 0) to an (N, K) array of
+    neighbor indices, where K is the maximum degree. Rows of nodes with fewer
+    neighbors are padded with -1.
+    """
+
+    num_nodes = len(indptr) - 1
+    degree = np.diff(indptr)
+
+    rows = np.repeat(np.arange(num_nodes), degree)
+    slots = np.arange(len(indices)) - indptr[rows]
+
+    padded = np.full((num_nodes, degree.max(initial=0)), -1, dtype=np.int64)
+    padded[rows, slots] = indices
+
+    return padded
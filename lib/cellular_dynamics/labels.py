@@ -0,0 +1,359 @@
+import cv2
+import numpy as np
+
+
+def euler_numbers(labels: np.ndarray) -> np.ndarray:
+    """
+    Euler number (number of 8-connected components minus number of holes) of
+    every label, counted from the 2x2 pixel patterns of the label image.
+
+    Args:
+        labels (np.ndarray): Label image.
+
+    Returns:
+        (np.ndarray): Euler number of every label, indexed by label. Labels
+            which are not present have Euler number 0.
+    """
+
+    padded_labels = np.pad(labels, 1, mode="constant", constant_values=0)
+    padded_width = padded_labels.shape[1]
+
+    # patterns of a single label do not contribute
+    upper_left = padded_labels[:-1, :-1]
+    is_mixed = (
+        (upper_left != padded_labels[:-1, 1:])
+        | (upper_left != padded_labels[1:, :-1])
+        | (upper_left != padded_labels[1:, 1:])
+    )
+    # flat index of the upper left corner in the padded image, which is one
+    # column wider than the grid of patterns
+    origins = np.flatnonzero(is_mixed)
+    origins += origins // (padded_width - 1)
+
+    # upper left, upper right, lower left and lower right corner of all
+    # patterns, diagonal corners add up to 3
+    corners = [
+        padded_labels.ravel()[origins + offset]
+        for offset in (0, 1, padded_width, padded_width + 1)
+    ]
+    equal_corners = {
+        (first, second): corners[first] == corners[second]
+        for first in range(4)
+        for second in range(first + 1, 4)
+    }
+
+    def equal(first: int, second: int) -> np.ndarray:
+        return equal_corners[min(first, second), max(first, second)]
+
+    quad_sums = np.zeros(int(labels.max()) + 1, dtype=np.int64)
+
+    for index, corner in enumerate(corners):
+        # every label is counted once per pattern, at its first corner
+        first_occurrence = corner != 0
+        for other in range(index):
+            first_occurrence &= ~equal(index, other)
+
+        others = [other for other in range(4) if other != index]
+        num_matches = equal(index, others[0]).astype(np.int8)
+        num_matches += equal(index, others[1])
+        num_matches += equal(index, others[2])
+
+        # one pixel +1, three pixels -1, two diagonal pixels -2
+        weights = (num_matches == 0).astype(np.int8) - (num_matches == 2)
+        weights -= 2 * ((num_matches == 1) & equal(index, 3 - index))
+
+        counted = first_occurrence & (weights != 0)
+        quad_sums += np.bincount(
+            corner[counted], weights=weights[counted], minlength=len(quad_sums)
+        ).astype(np.int64)
+
+    return quad_sums // 4
+
+
+def bounding_boxes(labels: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Bounding boxes of all nonzero labels.
+
+    Args:
+        labels (np.ndarray): Label image.
+
+    Returns:
+        (tuple[np.ndarray, np.ndarray]): The labels present in ascending order
+            and their bounding boxes as (L, 4) array of the first row, first
+            column, last row and last column (inclusive).
+    """
+
+    positions = np.flatnonzero(labels)
+    if len(positions) == 0:
+        return np.empty(0, dtype=labels.dtype), np.empty((0, 4), dtype=np.int64)
+
+    # stable, so that the pixels of every label stay in raster order
+    positions = positions[np.argsort(labels.ravel()[positions], kind="stable")]
+    sorted_labels = labels.ravel()[positions]
+
+    starts = np.flatnonzero(np.diff(sorted_labels, prepend=sorted_labels[0] - 1))
+    ends = np.append(starts[1:], len(positions)) - 1
+    rows, columns = np.divmod(positions, labels.shape[1])
+
+    boxes = np.stack(
+        (
+            rows[starts],
+            np.minimum.reduceat(columns, starts),
+            rows[ends],
+            np.maximum.reduceat(columns, starts),
+        ),
+        axis=1,
+    )
+
+    return sorted_labels[starts], boxes
+
+
+def external_contour_mask(
+    labels: np.ndarray, seed_mask: np.ndarray | None = None
+) -> np.ndarray:
+    """
+    Mask of all pixels on the external contour of their label, as traced by
+    'cv2.findContours' with 'cv2.RETR_EXTERNAL' on every label on its own.
+
+    These are the pixels with a 4-neighbor outside of their label. Labels with
+    holes or several components are traced in their bounding box: only the
+    pixels of the largest component (optionally the largest one overlapping
+    the seed mask) next to the outside of that component are on the contour.
+
+    Args:
+        labels (np.ndarray): Label image.
+        seed_mask (np.ndarray, optional): Mask used to choose the traced
+            component of labels with several components.
+
+    Returns:
+        (np.ndarray): Boolean mask of external contour pixels.
+    """
+
+    height, width = labels.shape
+    padded_labels = np.pad(labels, 1, mode="constant", constant_values=0)
+
+    on_contour = np.zeros(labels.shape, dtype=bool)
+    for row_offset, column_offset in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+        on_contour |= (
+            padded_labels[
+                1 + row_offset : 1 + row_offset + height,
+                1 + column_offset : 1 + column_offset + width,
+            ]
+            != labels
+        )
+    on_contour &= labels != 0
+
+    # horizontal runs of equal labels, sorted by label, row and column
+    run_starts = np.ones(labels.shape, dtype=bool)
+    run_starts[:, 1:] = labels[:, 1:] != labels[:, :-1]
+    run_starts = np.flatnonzero(run_starts)
+
+    # every row starts a new run, so runs end right before the next one starts
+    run_rows, first_columns = np.divmod(run_starts, width)
+    last_columns = (np.append(run_starts[1:], labels.size) - 1) % width
+    run_labels = labels.ravel()[run_starts]
+
+    order = np.argsort(run_labels, kind="stable")
+    run_rows, run_labels = run_rows[order], run_labels[order]
+    first_columns, last_columns = first_columns[order], last_columns[order]
+
+    # a label with a hole occurs twice in some row, with the hole in between,
+    # a label with several components but without holes has an Euler
+    # number > 1. Only these labels need to be traced.
+    is_irregular = euler_numbers(labels) != 1
+    repeats_in_row = (run_labels[1:] == run_labels[:-1]) & (
+        run_rows[1:] == run_rows[:-1]
+    )
+    is_irregular[run_labels[1:][repeats_in_row]] = True
+    is_irregular[0] = False
+
+    label_starts = np.flatnonzero(np.diff(run_labels, prepend=-1))
+    label_ends = np.append(label_starts[1:], len(run_labels))
+    irregular_groups = np.flatnonzero(is_irregular[run_labels[label_starts]])
+
+    if len(irregular_groups) == 0:
+        return on_contour
+
+    if seed_mask is not None:
+        padded_seed_mask = np.pad(seed_mask > 0, 1, mode="constant")
+
+    min_columns = np.minimum.reduceat(first_columns, label_starts)
+    max_columns = np.maximum.reduceat(last_columns, label_starts)
+
+    for group in irregular_groups:
+        label = run_labels[label_starts[group]]
+        min_row = run_rows[label_starts[group]]
+        max_row = run_rows[label_ends[group] - 1]
+
+        # bounding box with a margin of one pixel, in padded coordinates
+        window = np.s_[
+            min_row : max_row + 3, min_columns[group] : max_columns[group] + 3
+        ]
+        label_mask = (padded_labels[window] == label).astype(np.uint8)
+
+        num_components, components, stats, _ = cv2.connectedComponentsWithStats(
+            label_mask, connectivity=8
+        )
+        candidates = np.arange(1, num_components)
+        if seed_mask is not None:
+            seeded = np.setdiff1d(components[padded_seed_mask[window]], (0,))
+            if len(seeded) > 0:
+                candidates = seeded
+        traced_mask = components == (
+            candidates[np.argmax(stats[candidates, cv2.CC_STAT_AREA])]
+        )
+
+        # the outside is the 4-connected background of the traced component
+        # containing the margin, the rest of the background are holes
+        _, background = cv2.connectedComponents(
+            (~traced_mask).astype(np.uint8), connectivity=4
+        )
+        outside = background == background[0, 0]
+        next_to_outside = (
+            outside[:-2, 1:-1]
+            | outside[2:, 1:-1]
+            | outside[1:-1, :-2]
+            | outside[1:-1, 2:]
+        )
+
+        is_label = label_mask[1:-1, 1:-1] > 0
+        on_contour[min_row : max_row + 1, min_columns[group] : max_columns[group] + 1][
+            is_label
+        ] = (traced_mask[1:-1, 1:-1] & next_to_outside)[is_label]
+
+    return on_contour
+
+
+def separate_touching_labels(
+    labels: np.ndarray, protected_mask: np.ndarray | None = None
+) -> np.ndarray:
+    """
+    Disconnect touching regions with different labels.
+
+    Equivalent to walking over all labels in ascending order and removing
+    every pixel on the external contour of the label (see
+    'external_contour_mask') that still touches (8-neighborhood) another
+    label: a contour pixel is removed if it touches a larger label, or a
+    smaller label whose touching pixel is not on its contour (and therefore
+    was not removed before). Pixels in 'protected_mask' are never removed.
+
+    Args:
+        labels (np.ndarray): Label image.
+        protected_mask (np.ndarray, optional): Mask of pixels which must not
+            be removed. Protected pixels of different labels must not touch.
+            Labels with several components are traced along their largest
+            component overlapping the protected pixels.
+
+    Returns:
+        (np.ndarray): Label image in which no two different labels touch.
+    """
+
+    height, width = labels.shape
+    padded_labels = np.pad(labels, 1, mode="constant", constant_values=0)
+
+    def neighbor_window(row_offset: int, column_offset: int) -> tuple[slice, slice]:
+        return np.s_[
+            1 + row_offset : 1 + row_offset + height,
+            1 + column_offset : 1 + column_offset + width,
+        ]
+
+    on_contour = external_contour_mask(labels, seed_mask=protected_mask)
+
+    # neighbors which survive the removal of their own contour pixels
+    persistent = ~np.pad(on_contour, 1, mode="constant")
+
+    if protected_mask is not None:
+        protected_mask = protected_mask > 0
+        persistent |= np.pad(protected_mask, 1, mode="constant")
+
+    remove_mask = np.zeros(labels.shape, dtype=bool)
+
+    for row_offset in (-1, 0, 1):
+        for column_offset in (-1, 0, 1):
+            if row_offset == column_offset == 0:
+                continue
+
+            window = neighbor_window(row_offset, column_offset)
+            neighbor_labels = padded_labels[window]
+
+            remove_mask |= (
+                (neighbor_labels != 0)
+                & (neighbor_labels != labels)
+                & ((neighbor_labels > labels) | persistent[window])
+            )
+
+    remove_mask &= on_contour
+    if protected_mask is not None:
+        remove_mask &= ~protected_mask
+
+    separated_labels = labels.copy()
+    separated_labels[remove_mask] = 0
+
+    return separated_labels
+
+
+def keep_largest_components(
+    labels: np.ndarray, seed_mask: np.ndarray | None = None
+) -> np.ndarray:
+    """
+    Remove all but the largest connected component of every label.
+
+    Connected components are computed once for the whole image, so labels
+    must not touch each other (see 'separate_touching_labels').
+
+    Args:
+        labels (np.ndarray): Label image without touching labels.
+        seed_mask (np.ndarray, optional): If provided, only components
+            overlapping the seed mask are kept. Labels without any such
+            component are removed entirely.
+
+    Returns:
+        (np.ndarray): Label image with one connected component per label.
+    """
+
+    num_components, components, stats, _ = cv2.connectedComponentsWithStats(
+        (labels > 0).astype(np.uint8), connectivity=8
+    )
+
+    component_labels = np.zeros(num_components, dtype=labels.dtype)
+    component_labels[components.ravel()] = labels.ravel()
+
+    if seed_mask is None:
+        candidates = np.arange(1, num_components)
+    else:
+        candidates = np.setdiff1d(components[seed_mask > 0], (0,))
+
+    # sort candidates by label and descending area, the first candidate of
+    # every label is the one to keep
+    candidates = candidates[
+        np.lexsort((-stats[candidates, cv2.CC_STAT_AREA], component_labels[candidates]))
+    ]
+    first_of_label = np.ones(len(candidates), dtype=bool)
+    first_of_label[1:] = np.diff(component_labels[candidates]) != 0
+
+    keep_component = np.zeros(num_components, dtype=bool)
+    keep_component[candidates[first_of_label]] = True
+
+    return np.where(keep_component[components], labels, 0)
+
+
+def get_disconnected(
+    labels: np.ndarray, nuclei_mask: np.ndarray | None = None
+) -> np.ndarray:
+    """
+    Disconnect touching regions with different labels, keeping the largest
+    connected component of every label.
+
+    Args:
+        labels (np.ndarray): Label image.
+        nuclei_mask (np.ndarray, optional): Binary nuclei mask. Nucleus pixels
+            are never removed and every label keeps its largest component
+            overlapping a nucleus.
+
+    Returns:
+        (np.ndarray): Disconnected label image.
+    """
+
+    disconnected_labels = separate_touching_labels(labels, protected_mask=nuclei_mask)
+
+    return keep_largest_components(disconnected_labels, seed_mask=nuclei_mask)
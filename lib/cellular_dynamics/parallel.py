@@ -0,0 +1,127 @@
+import multiprocessing as mp
+from collections.abc import Callable, Sequence
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any
+
+import numpy as np
+from tqdm import tqdm, trange
+
+# arrays attached by the worker processes of 'map_frames'
+_worker_arrays: dict[str, np.ndarray] = {}
+_worker_memory: list[SharedMemory] = []
+
+
+class SharedArrays:
+    """
+    Copies of numpy arrays in shared memory. Worker processes attach to them
+    via 'handles' instead of receiving pickled copies. Instead of an array,
+    a sequence of equally shaped frames can be given, which is written frame
+    by frame into a single stacked shared array (without stacking it in the
+    calling process first). The shared memory is released by 'close' (or when
+    leaving the context).
+    """
+
+    def __init__(self, arrays: dict[str, np.ndarray | Sequence[np.ndarray]]) -> None:
+        self._memory: list[SharedMemory] = []
+        self.handles: dict[str, tuple[str, tuple[int, ...], str]] = {}
+
+        for name, array in arrays.items():
+            if isinstance(array, np.ndarray):
+                shape, dtype = array.shape, array.dtype
+            elif len(array) > 0:
+                shape = (len(array), *np.shape(array[0]))
+                dtype = np.result_type(*array)
+            else:
+                raise ValueError(f"Cannot share '{name}' without frames.")
+
+            memory = SharedMemory(
+                create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1)
+            )
+            self._memory.append(memory)
+
+            shared_array = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+            if isinstance(array, np.ndarray):
+                shared_array[...] = array
+            else:
+                for index, frame in enumerate(array):
+                    shared_array[index] = frame
+
+            self.handles[name] = (memory.name, shape, dtype.str)
+
+    def close(self) -> None:
+        for memory in self._memory:
+            memory.close()
+            memory.unlink()
+        self._memory = []
+
+    def __enter__(self) -> "SharedArrays":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _attach_worker_arrays(handles: dict[str, tuple[str, tuple[int, ...], str]]) -> None:
+    for name, (memory_name, shape, dtype) in handles.items():
+        memory = SharedMemory(name=memory_name)
+        _worker_memory.append(memory)
+        _worker_arrays[name] = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+
+def _map_frame_chunk(task: tuple[Callable, tuple[int, int], dict[str, Any]]) -> list:
+    function, chunk, kwargs = task
+    return [function(frame, _worker_arrays, **kwargs) for frame in range(*chunk)]
+
+
+def map_frames(
+    function: Callable,
+    num_frames: int,
+    arrays: dict[str, np.ndarray | Sequence[np.ndarray]],
+    cpus: int = 1,
+    **kwargs,
+) -> list:
+    """
+    Evaluate 'function(frame, arrays, **kwargs)' for all frames, using 'cpus'
+    worker processes.
+
+    The arrays are placed in shared memory once, so that every worker can
+    access all frames (e.g. the frames 'sindex..sindex+lag' needed for lag
+    time observables) without copying. Frames are distributed in contiguous
+    chunks, a few per worker to balance the load. 'function' and 'kwargs'
+    must be picklable.
+
+    Args:
+        function (Callable): Function evaluated for every frame.
+        num_frames (int): Number of frames.
+        arrays (dict[str, np.ndarray | Sequence[np.ndarray]]): Arrays passed to
+            'function'. Sequences of equally shaped frames (e.g. the label
+            images of a dataset) are passed as they are when evaluating in the
+            calling process and stacked into shared memory otherwise, so
+            'function' should only index their first axis.
+        cpus (int, optional): Number of worker processes. Defaults to 1, which
+            evaluates all frames in the calling process.
+
+    Returns:
+        (list): Results of 'function' in frame order.
+    """
+
+    if cpus <= 1 or num_frames <= 1:
+        return [function(frame, arrays, **kwargs) for frame in trange(num_frames)]
+
+    bounds = np.linspace(0, num_frames, min(num_frames, 4 * cpus) + 1).astype(int)
+    chunks = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    with SharedArrays(arrays) as shared_arrays, mp.Pool(
+        cpus, initializer=_attach_worker_arrays, initargs=(shared_arrays.handles,)
+    ) as pool:
+        chunk_results = list(
+            tqdm(
+                pool.imap(
+                    _map_frame_chunk,
+                    [(function, chunk, kwargs) for chunk in chunks],
+                ),
+                total=len(chunks),
+            )
+        )
+
+    return [result for results in chunk_results for result in results]
@@ -0,0 +1,280 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+def tile_grid(
+    shape: tuple[int, ...], tile_size: int
+) -> list[list[tuple[slice, slice]]]:
+    """
+    Split an image into a grid of tiles of at most 'tile_size' x 'tile_size'
+    pixels. Returns the rows of the grid, every tile as a pair of slices.
+    """
+
+    height, width = shape[:2]
+
+    return [
+        [
+            np.s_[
+                row : min(row + tile_size, height),
+                column : min(column + tile_size, width),
+            ]
+            for column in range(0, width, tile_size)
+        ]
+        for row in range(0, height, tile_size)
+    ]
+
+
+def read_window(image: np.ndarray, tile: tuple[slice, slice], halo: int) -> np.ndarray:
+    """
+    Read 'tile' of 'image' extended by 'halo' pixels on every side. Parts of
+    the window outside of the image are filled with zeros.
+    """
+
+    rows, columns = tile
+    height, width = image.shape[:2]
+
+    top, bottom = rows.start - halo, rows.stop + halo
+    left, right = columns.start - halo, columns.stop + halo
+
+    window = image[max(top, 0) : min(bottom, height), max(left, 0) : min(right, width)]
+
+    return np.pad(
+        window,
+        (
+            (max(-top, 0), max(bottom - height, 0)),
+            (max(-left, 0), max(right - width, 0)),
+        ),
+        mode="constant",
+    )
+
+
+def clip_window(
+    shape: tuple[int, ...], tile: tuple[slice, slice], halo: int
+) -> tuple[tuple[slice, slice], tuple[slice, slice]]:
+    """
+    Extend 'tile' by 'halo' pixels on every side, clipped to an image of
+    'shape'. Returns the window and the tile within the window.
+    """
+
+    rows, columns = tile
+    height, width = shape[:2]
+
+    top, left = max(rows.start - halo, 0), max(columns.start - halo, 0)
+    window = np.s_[
+        top : min(rows.stop + halo, height), left : min(columns.stop + halo, width)
+    ]
+
+    return (
+        window,
+        np.s_[
+            rows.start - top : rows.stop - top,
+            columns.start - left : columns.stop - left,
+        ],
+    )
+
+
+def merge_labels(num_labels: int, pairs: np.ndarray) -> np.ndarray:
+    """
+    Union-find over the labels 0, ..., num_labels - 1.
+
+    Args:
+        num_labels (int): Number of labels.
+        pairs (np.ndarray): (P, 2) array of labels to merge.
+
+    Returns:
+        (np.ndarray): Root (smallest merged label) of every label.
+    """
+
+    roots = np.arange(num_labels)
+    if len(pairs) == 0:
+        return roots
+
+    while True:
+        previous_roots = roots.copy()
+
+        # hook the root of every pair onto the smaller root
+        smaller_roots = np.minimum(roots[pairs[:, 0]], roots[pairs[:, 1]])
+        np.minimum.at(roots, roots[pairs[:, 0]], smaller_roots)
+        np.minimum.at(roots, roots[pairs[:, 1]], smaller_roots)
+
+        # pointer jumping until every label points to its root
+        while True:
+            jumped_roots = roots[roots]
+            if np.array_equal(jumped_roots, roots):
+                break
+            roots = jumped_roots
+
+        if np.array_equal(roots, previous_roots):
+            return roots
+
+
+def _seam_pairs(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """
+    Pairs of components of two adjacent pixel lines which touch (8-neighborhood).
+    Background pixels are -1.
+    """
+
+    length = len(first)
+    pairs = []
+
+    for shift in (-1, 0, 1):
+        a = first[max(-shift, 0) : length - max(shift, 0)]
+        b = second[max(shift, 0) : length - max(-shift, 0)]
+        touching = (a >= 0) & (b >= 0)
+        pairs.append(np.stack((a[touching], b[touching]), axis=1))
+
+    return np.concatenate(pairs)
+
+
+class TiledComponents:
+    """
+    Connected components (8-neighborhood) of the foreground of a large image,
+    labelled tile by tile.
+
+    Components of all tiles are numbered consecutively and pieces of the same
+    component in adjacent tiles are merged by union-find over the pixels
+    along the tile seams. Only the labels of one tile per thread are held in
+    memory, the labels of a tile are recomputed when needed.
+
+    Attributes:
+        num_components (int): Number of components.
+        areas (np.ndarray): Area of every component.
+        values (np.ndarray): Nonzero value of 'values' within every
+            component (0 if there is none), if 'values' was given. Every
+            component must contain at most one distinct nonzero value.
+    """
+
+    def __init__(
+        self,
+        image: np.ndarray,
+        tile_size: int,
+        values: np.ndarray | None = None,
+        threads: int = 1,
+    ) -> None:
+
+        self._image = image
+        self._grid = tile_grid(image.shape, tile_size)
+        self._threads = threads
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            tile_results = list(
+                executor.map(
+                    lambda tile: self._label_tile(tile, values),
+                    [tile for grid_row in self._grid for tile in grid_row],
+                )
+            )
+
+        num_tile_components = [len(areas) for areas, _, _ in tile_results]
+        self._offsets = np.zeros(len(tile_results) + 1, dtype=np.int64)
+        np.cumsum(num_tile_components, out=self._offsets[1:])
+
+        # border pixels of every tile as global piece indices, background is -1
+        borders = [
+            {
+                side: np.where(border > 0, offset + border - 1, -1)
+                for side, border in tile_borders.items()
+            }
+            for offset, (_, tile_borders, _) in zip(self._offsets, tile_results)
+        ]
+        num_columns = len(self._grid[0])
+        grid_borders = [
+            borders[row * num_columns : (row + 1) * num_columns]
+            for row in range(len(self._grid))
+        ]
+
+        pairs = [np.empty((0, 2), dtype=np.int64)]
+        for upper, lower in zip(grid_borders[:-1], grid_borders[1:]):
+            pairs.append(
+                _seam_pairs(
+                    np.concatenate([tile["bottom"] for tile in upper]),
+                    np.concatenate([tile["top"] for tile in lower]),
+                )
+            )
+        for column in range(num_columns - 1):
+            pairs.append(
+                _seam_pairs(
+                    np.concatenate([row[column]["right"] for row in grid_borders]),
+                    np.concatenate([row[column + 1]["left"] for row in grid_borders]),
+                )
+            )
+
+        roots = merge_labels(self._offsets[-1], np.concatenate(pairs))
+        _, self._piece_components = np.unique(roots, return_inverse=True)
+        self.num_components = int(self._piece_components.max(initial=-1)) + 1
+
+        self.areas = np.bincount(
+            self._piece_components,
+            weights=np.concatenate([areas for areas, _, _ in tile_results]),
+            minlength=self.num_components,
+        ).astype(np.int64)
+
+        if values is not None:
+            self.values = np.zeros(self.num_components, dtype=values.dtype)
+            np.maximum.at(
+                self.values,
+                self._piece_components,
+                np.concatenate([piece_values for _, _, piece_values in tile_results]),
+            )
+
+    def _tile_labels(
+        self, tile: tuple[slice, slice]
+    ) -> tuple[int, np.ndarray, np.ndarray]:
+        return cv2.connectedComponentsWithStats(
+            (self._image[tile] > 0).astype(np.uint8), connectivity=8
+        )[:3]
+
+    def _label_tile(
+        self, tile: tuple[slice, slice], values: np.ndarray | None
+    ) -> tuple[np.ndarray, dict[str, np.ndarray], np.ndarray]:
+
+        num_labels, labels, stats = self._tile_labels(tile)
+
+        piece_values = np.zeros(
+            num_labels, dtype=np.int64 if values is None else values.dtype
+        )
+        if values is not None:
+            tile_values = values[tile]
+            has_value = (tile_values != 0) & (labels > 0)
+            piece_values[labels[has_value]] = tile_values[has_value]
+
+        # copies, so that the labels of the tile can be released
+        tile_borders = {
+            "top": labels[0, :].copy(),
+            "bottom": labels[-1, :].copy(),
+            "left": labels[:, 0].copy(),
+            "right": labels[:, -1].copy(),
+        }
+
+        return stats[1:, cv2.CC_STAT_AREA], tile_borders, piece_values[1:]
+
+    def write_mask(self, keep: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """
+        Write the components selected by 'keep' as binary mask to 'out',
+        which may be the labelled image itself.
+
+        Args:
+            keep (np.ndarray): Boolean mask over all components.
+            out (np.ndarray): Output image with the shape of the labelled image.
+
+        Returns:
+            (np.ndarray): 'out'
+        """
+
+        tiles = [tile for grid_row in self._grid for tile in grid_row]
+
+        def write_tile(tile_index: int) -> None:
+            tile = tiles[tile_index]
+            num_labels, labels, _ = self._tile_labels(tile)
+
+            start = self._offsets[tile_index]
+            lookup = np.zeros(num_labels, dtype=out.dtype)
+            lookup[1:] = keep[self._piece_components[start : start + num_labels - 1]]
+
+            out[tile] = lookup[labels]
+
+        with ThreadPoolExecutor(max_workers=self._threads) as executor:
+            list(executor.map(write_tile, range(len(tiles))))
+
+        return out
@@ -0,0 +1,285 @@
+from collections.abc import Sequence
+
+import networkx as nx
+import numpy as np
+from cellular_dynamics.frame_graph import (
+    FrameGraph,
+    csr_adjacency,
+    node_column,
+    node_ids,
+)
+from core_data_utils.datasets import BaseDataSet
+
+NO_OBJECT = -1
+
+
+def _positions_of(
+    ids: np.ndarray, query_ids: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find the positions of 'query_ids' in 'ids'. Returns the positions and a
+    mask of the query ids which are present in 'ids'.
+    """
+
+    if len(ids) == 0:
+        return np.zeros(len(query_ids), dtype=np.int64), np.zeros(
+            len(query_ids), dtype=bool
+        )
+
+    sorter = np.argsort(ids)
+    positions = sorter[
+        np.searchsorted(ids, query_ids, sorter=sorter).clip(max=len(ids) - 1)
+    ]
+
+    return positions, ids[positions] == query_ids
+
+
+class TrackIndex:
+    """
+    Index of all tracks of a tracked graph dataset, built once from the
+    'next_object_id' links of the nodes.
+
+    A track starts at every node which is not linked from the previous frame
+    and follows the links from there, like 'CellTrackAssembler' did. Tracks
+    are numbered in order of their first appearance (frame by frame, in node
+    order) and their nodes are stored track-major in a flat table, so that
+    the node of a track 'k' frames later is found in O(1).
+
+    Several objects may be linked to the same object of the next frame (e.g.
+    cells merged by the tracking). Their tracks then share all nodes from
+    this object on, and every node is addressed through one of the tracks
+    containing it: as every node has at most one link, its future nodes do
+    not depend on the track chosen.
+
+    Nodes are addressed by their position within the node order of their
+    frame. Links from the last frame are ignored, a link pointing to a
+    non-existent node raises a RuntimeError.
+    """
+
+    def __init__(self, graphs: Sequence[nx.Graph | FrameGraph]) -> None:
+
+        self._num_frames = len(graphs)
+        self._node_ids: list[np.ndarray] = []
+        self._node_tracks: list[np.ndarray] = []
+
+        # (track, frame, position) of every node of every track
+        table_tracks, table_frames, table_positions = [], [], []
+
+        num_tracks = 0
+        active_tracks = np.empty(0, dtype=np.int64)
+        active_positions = np.empty(0, dtype=np.int64)
+        previous_next_ids = np.empty(0, dtype=np.int64)
+
+        for frame, graph in enumerate(graphs):
+            frame_node_ids = node_ids(graph).astype(np.int64)
+
+            # continue the tracks of linked nodes from the previous frame
+            active_next_ids = previous_next_ids[active_positions]
+            continued = active_next_ids != NO_OBJECT
+            targets, known = _positions_of(frame_node_ids, active_next_ids[continued])
+
+            if not np.all(known):
+                unknown_ids = np.unique(active_next_ids[continued][~known])
+                raise RuntimeError(
+                    f"Objects {unknown_ids.tolist()} linked from frame "
+                    f"{frame - 1} do not exist in frame {frame}."
+                )
+
+            # all other nodes start new tracks
+            linked = np.zeros(len(frame_node_ids), dtype=bool)
+            linked[targets] = True
+            new_positions = np.flatnonzero(~linked)
+
+            active_tracks = np.concatenate(
+                (
+                    active_tracks[continued],
+                    np.arange(num_tracks, num_tracks + len(new_positions)),
+                )
+            )
+            active_positions = np.concatenate((targets, new_positions))
+            num_tracks += len(new_positions)
+
+            # of merged tracks, nodes are addressed through the first one
+            tracks = np.full(len(frame_node_ids), num_tracks, dtype=np.int64)
+            np.minimum.at(tracks, active_positions, active_tracks)
+
+            table_tracks.append(active_tracks)
+            table_frames.append(np.full(len(active_tracks), frame, dtype=np.int64))
+            table_positions.append(active_positions)
+
+            self._node_ids.append(frame_node_ids)
+            self._node_tracks.append(tracks)
+
+            previous_next_ids = node_column(
+                graph, "next_object_id", default=NO_OBJECT
+            ).astype(np.int64)
+
+        self._build_track_table(
+            num_tracks,
+            np.concatenate(table_tracks + [np.empty(0, dtype=np.int64)]),
+            np.concatenate(table_frames + [np.empty(0, dtype=np.int64)]),
+            np.concatenate(table_positions + [np.empty(0, dtype=np.int64)]),
+        )
+
+    def _build_track_table(
+        self,
+        num_tracks: int,
+        tracks: np.ndarray,
+        frames: np.ndarray,
+        positions: np.ndarray,
+    ) -> None:
+
+        # track-major order, frames increasing within a track
+        order = np.lexsort((frames, tracks))
+
+        self._track_frames = frames[order]
+        self._track_positions = positions[order]
+
+        self._track_lengths = np.bincount(tracks, minlength=num_tracks)
+        self._track_offsets = np.zeros(num_tracks + 1, dtype=np.int64)
+        np.cumsum(self._track_lengths, out=self._track_offsets[1:])
+        self._track_starts = self._track_frames[self._track_offsets[:-1]]
+
+    @classmethod
+    def from_dataset(cls, graph_dataset: BaseDataSet) -> "TrackIndex":
+        return cls([entry.data for entry in graph_dataset])
+
+    @property
+    def num_frames(self) -> int:
+        return self._num_frames
+
+    @property
+    def num_tracks(self) -> int:
+        return len(self._track_lengths)
+
+    @property
+    def track_starts(self) -> np.ndarray:
+        """First frame of every track."""
+        return self._track_starts
+
+    @property
+    def track_lengths(self) -> np.ndarray:
+        """Number of frames of every track."""
+        return self._track_lengths
+
+    @property
+    def track_offsets(self) -> np.ndarray:
+        """Start of every track in the flat track table (length num_tracks + 1)."""
+        return self._track_offsets
+
+    @property
+    def track_frames(self) -> np.ndarray:
+        """Frame of every entry of the flat track table."""
+        return self._track_frames
+
+    @property
+    def track_positions(self) -> np.ndarray:
+        """Node position of every entry of the flat track table."""
+        return self._track_positions
+
+    def node_ids(self, frame: int) -> np.ndarray:
+        return self._node_ids[frame]
+
+    def node_tracks(self, frame: int) -> np.ndarray:
+        """Track of every node of 'frame' (the first one, if tracks merged)."""
+        return self._node_tracks[frame]
+
+    def future_positions(
+        self, frame: int, lag_time_frames: int, positions: np.ndarray | None = None
+    ) -> np.ndarray:
+        """
+        Positions of the nodes of 'frame' (all nodes or only 'positions')
+        'lag_time_frames' frames later, NO_OBJECT (-1) where the track ends
+        before. Like for all lag time observables, the target frame must not
+        be the last frame of the dataset.
+
+        Args:
+            frame (int): Index of the current frame.
+            lag_time_frames (int): Number of frames to look ahead.
+            positions (np.ndarray, optional): Node positions in 'frame'.
+
+        Returns:
+            (np.ndarray): Node positions in frame 'frame + lag_time_frames'.
+        """
+
+        tracks = self._node_tracks[frame]
+        if positions is not None:
+            tracks = tracks[positions]
+
+        if frame + lag_time_frames + 1 >= self._num_frames:
+            return np.full(len(tracks), NO_OBJECT, dtype=np.int64)
+
+        steps = frame - self._track_starts[tracks] + lag_time_frames
+        valid = steps < self._track_lengths[tracks]
+
+        future = np.full(len(tracks), NO_OBJECT, dtype=np.int64)
+        future[valid] = self._track_positions[
+            self._track_offsets[tracks[valid]] + steps[valid]
+        ]
+
+        return future
+
+
+def lag_time_arrays(
+    graphs: Sequence[nx.Graph | FrameGraph],
+    track_index: TrackIndex,
+    lag_times_frames: Sequence[int],
+    prefix: str = "cell",
+) -> dict[str, np.ndarray]:
+    """
+    Flat arrays holding everything lag time observables need to know about
+    all frames. Nodes of all frames are numbered consecutively (frame by
+    frame, in node order), all node references are such global indices.
+
+    Returns:
+        (dict[str, np.ndarray]): 'node_offsets' (first node of every frame,
+            length num_frames + 1), 'positions' ((N, 2) centroids), 'indptr'
+            and 'indices' (CSR adjacency of all frames) and 'future_nodes'
+            ((L, N) node of every node after each lag time, NO_OBJECT (-1)
+            where the track ends before).
+    """
+
+    node_offsets = np.zeros(len(graphs) + 1, dtype=np.int64)
+    np.cumsum([len(node_ids(graph)) for graph in graphs], out=node_offsets[1:])
+
+    positions = np.concatenate(
+        [
+            np.stack(
+                (
+                    node_column(graph, f"{prefix}_centroid_x"),
+                    node_column(graph, f"{prefix}_centroid_y"),
+                ),
+                axis=-1,
+            ).astype(np.float64)
+            for graph in graphs
+        ]
+        + [np.empty((0, 2))]
+    )
+
+    indptr = [np.zeros(1, dtype=np.int64)]
+    indices = [np.empty(0, dtype=np.int64)]
+    for frame, graph in enumerate(graphs):
+        frame_indptr, frame_indices = csr_adjacency(graph)
+        indptr.append(frame_indptr[1:] + indptr[-1][-1])
+        indices.append(frame_indices + node_offsets[frame])
+
+    future_nodes = np.full(
+        (len(lag_times_frames), node_offsets[-1]), NO_OBJECT, dtype=np.int64
+    )
+    for lag_index, lag_time_frames in enumerate(lag_times_frames):
+        for frame in range(len(graphs)):
+            future = track_index.future_positions(frame, lag_time_frames)
+            tracked = future != NO_OBJECT
+            if np.any(tracked):
+                future[tracked] += node_offsets[frame + lag_time_frames]
+            future_nodes[lag_index, node_offsets[frame] : node_offsets[frame + 1]] = (
+                future
+            )
+
+    return {
+        "node_offsets": node_offsets,
+        "positions": positions,
+        "indptr": np.concatenate(indptr),
+        "indices": np.concatenate(indices),
+        "future_nodes": future_nodes,
+    }
@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+from cellular_dynamics.tiling import TiledComponents
+from core_data_utils.datasets import BaseDataSetEntry
+from core_data_utils.transformations import BaseDataSetTransformation
+
+
+class RemoveSmallObjectsTransform(BaseDataSetTransformation):
+    """
+    Remove connected foreground components smaller than a minimum area and
+    return the remaining foreground as a binary mask.
+
+    If 'tile_size' is given, components are labelled tile by tile (see
+    'TiledComponents') using 'threads' threads, which bounds the memory
+    needed for very large images.
+    """
+
+    def __init__(
+        self,
+        min_area_px2: float,
+        tile_size: int | None = None,
+        threads: int = 1,
+    ) -> None:
+        self._min_area_px2 = min_area_px2
+        self._tile_size = tile_size
+        self._threads = threads
+
+        super().__init__()
+
+    def _transform_single_entry(
+        self, entry: BaseDataSetEntry, dataset_properties: dict
+    ) -> BaseDataSetEntry:
+
+        if self._tile_size is not None:
+            components = TiledComponents(
+                entry.data, self._tile_size, threads=self._threads
+            )
+            mask = components.write_mask(
+                components.areas >= self._min_area_px2,
+                np.zeros(entry.data.shape, dtype=np.int8),
+            )
+
+            return BaseDataSetEntry(
+                identifier=entry.identifier, data=mask, metadata=entry.metadata
+            )
+
+        image = (entry.data > 0).astype(np.int8)
+
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(image)
+
+        # lookup table: component label -> keep component
+        keep = stats[:, cv2.CC_STAT_AREA] >= self._min_area_px2
+        keep[0] = False
+
+        # convert label image to binary mask
+        mask = keep[labels].astype(np.int8)
+
+        return BaseDataSetEntry(
+            identifier=entry.identifier, data=mask, metadata=entry.metadata
+        )
@@ -14,9 +14,11 @@ process annotate_graph_theoretical_observables {
 
     script:
     """
+    export PYTHONPATH="${moduleDir}/../../../lib:\${PYTHONPATH:-}"
 	 python ${moduleDir}/scripts/graph_theory_annotations.py \
         --infile=${graph_dataset_fpath} \
         --outfile="graph_dataset_annotated.pickle" \
+        --dataset_config="${dataset_config}" \
         --cpus=${task.cpus}
     """
 }
@@ -1,62 +1,194 @@
 import inspect
 import multiprocessing as mp
+import time
 from argparse import ArgumentParser
+from typing import Optional
 
 import networkx as nx
-from core_data_utils.datasets import BaseDataSet, BaseDataSetEntry
-from core_data_utils.transformations import BaseDataSetTransformation
+import toml
+from cellular_dynamics.centrality import shortest_path_centralities
+from cellular_dynamics.frame_graph import (
+    FrameGraph,
+    set_edge_attributes,
+    set_node_attributes,
+)
+from core_data_utils.datasets import BaseDataSet
 
+# observables taken from the shared breadth-first searches
+SHORTEST_PATH_OBSERVABLES = {
+    "node_betweenness_centrality": "betweenness_centrality",
+    "node_closeness_centrality": "closeness_centrality",
+    "edge_betweenness_centrality": "edge_betweenness_centrality",
+}
 
-class GraphTheoreticalAnnotationsTransform(BaseDataSetTransformation):
 
-    def _transform_single_entry(
-        self, entry: BaseDataSetEntry, dataset_properties: dict
-    ) -> BaseDataSetEntry:
-        cgraph = entry.data
+def _has_property(graph: nx.Graph | FrameGraph, kind: str, name: str) -> bool:
+    """
+    Whether nodes (or edges) of 'graph' already have property 'name'. For
+    networkx graphs only the first node (or edge) is checked, as properties
+    are always set for all of them.
+    """
 
-        # Find all methods that start with 'attribute_node'
-        methods = [
-            (name, method)
-            for name, method in inspect.getmembers(self, predicate=inspect.ismethod)
-            if name.startswith("_node_property_") or name.startswith("_edge_property")
-        ]
+    if isinstance(graph, FrameGraph):
+        attributes = graph.node_attributes if kind == "node" else graph.edge_attributes
+        return name in attributes
 
-        for name, method in methods:
-            if name.startswith("_edge_property_"):
-                current_property_name = name.removeprefix("_edge_property_")
+    items = graph.nodes(data=True) if kind == "node" else graph.edges(data=True)
+    first_item = next(iter(items), None)
 
-                assert not any(
-                    current_property_name in data
-                    for _, __, data in cgraph.edges(data=True)
-                )
+    return (first_item is not None) and (name in first_item[-1])
+
+
+class GraphTheoreticalAnnotationsTransform:
+    """
+    Annotate every graph with graph theoretical observables. Every
+    '_node_property_<name>' and '_edge_property_<name>' method defines the
+    observable 'node_<name>' or 'edge_<name>', which sets property '<name>'
+    of all nodes or edges. The registry of observables is built once, only
+    the selected 'observables' (default: all) are computed. The wall time
+    spent on every observable (summed over all graphs) is stored in the
+    dataset metadata under 'observable_wall_time_s'.
+
+    Betweenness and closeness centralities are taken from a single set of
+    breadth-first searches per graph ('shortest_path_centralities'), run for
+    all graphs at once and distributed over graphs and source nodes, whose
+    wall time is reported as 'shortest_path_centralities'. For large graphs,
+    betweenness can be estimated from 'num_samples' sampled sources and
+    closeness restricted to a 'closeness_radius' hop neighborhood. The
+    resulting error bounds are stored in the metadata of every entry under
+    'centrality_approximation'.
+    """
+
+    def __init__(
+        self,
+        observables: Optional[list[str]] = None,
+        num_samples: Optional[int] = None,
+        seed: int = 0,
+        closeness_radius: Optional[int] = None,
+    ) -> None:
+
+        registry = {}
+        for name, method in inspect.getmembers(self, predicate=inspect.ismethod):
+            for kind in ("node", "edge"):
+                prefix = f"_{kind}_property_"
+                if name.startswith(prefix):
+                    property_name = name.removeprefix(prefix)
+                    registry[f"{kind}_{property_name}"] = (kind, property_name, method)
+
+        if observables is None:
+            observables = list(registry)
+
+        unknown_observables = set(observables) - set(registry)
+        if unknown_observables:
+            raise ValueError(
+                f"Unknown observables {sorted(unknown_observables)}, "
+                f"available are {sorted(registry)}."
+            )
 
-                nx.set_edge_attributes(cgraph, method(cgraph), current_property_name)
+        self._observables = {name: registry[name] for name in observables}
+        self._num_samples = num_samples
+        self._seed = seed
+        self._closeness_radius = closeness_radius
 
-            elif name.startswith("_node_property_"):
-                current_property_name = name.removeprefix("_node_property_")
+    def _annotate_graph(
+        self,
+        cgraph: nx.Graph | FrameGraph,
+        centralities: dict,
+        wall_times: dict[str, float],
+    ) -> None:
 
-                assert not any(
-                    current_property_name in data for _, data in cgraph.nodes(data=True)
+        # networkx algorithms need a networkx graph, results are written back to 'cgraph'
+        nx_graph = cgraph
+        if isinstance(cgraph, FrameGraph) and any(
+            name not in SHORTEST_PATH_OBSERVABLES for name in self._observables
+        ):
+            nx_graph = cgraph.to_networkx()
+
+        for name, (kind, property_name, method) in self._observables.items():
+            start = time.perf_counter()
+
+            assert not _has_property(cgraph, kind, property_name)
+
+            if kind == "node":
+                set_node_attributes(
+                    cgraph, method(nx_graph, centralities), property_name
+                )
+            else:
+                set_edge_attributes(
+                    cgraph, method(nx_graph, centralities), property_name
                 )
 
-                nx.set_node_attributes(cgraph, method(cgraph), current_property_name)
+            wall_times[name] += time.perf_counter() - start
+
+    def __call__(
+        self, graph_ds: BaseDataSet, cpus: int = 1, copy_dataset: bool = False
+    ) -> BaseDataSet:
+
+        if copy_dataset:
+            graph_ds = graph_ds.copy()
+        graphs = [entry.data for entry in graph_ds]
+
+        wall_times = dict.fromkeys(self._observables, 0.0)
 
-        return BaseDataSetEntry(identifier=entry.identifier, data=cgraph)
+        betweenness = any(
+            name in self._observables
+            for name in ("node_betweenness_centrality", "edge_betweenness_centrality")
+        )
+        closeness = "node_closeness_centrality" in self._observables
 
-    def _node_property_betweenness_centrality(self, graph: nx.Graph) -> dict:
-        return nx.betweenness_centrality(graph)
+        if betweenness or closeness:
+            start = time.perf_counter()
+            frame_centralities = shortest_path_centralities(
+                graphs,
+                cpus=cpus,
+                betweenness=betweenness,
+                closeness=closeness,
+                num_samples=self._num_samples,
+                seed=self._seed,
+                closeness_radius=self._closeness_radius,
+            )
+            wall_times["shortest_path_centralities"] = time.perf_counter() - start
+        else:
+            frame_centralities = [({}, {}) for _ in graphs]
 
-    def _node_property_closeness_centrality(self, graph: nx.Graph) -> dict:
-        return nx.closeness_centrality(graph)
+        for entry, (centralities, approximation) in zip(graph_ds, frame_centralities):
+            self._annotate_graph(entry.data, centralities, wall_times)
 
-    def _node_property_local_clustering_coefficient(self, graph: nx.Graph) -> dict:
+            if approximation:
+                entry.metadata = {
+                    **(entry.metadata or {}),
+                    "centrality_approximation": approximation,
+                }
+
+        graph_ds.metadata = {
+            **(graph_ds.metadata or {}),
+            "observable_wall_time_s": wall_times,
+        }
+
+        return graph_ds
+
+    def _node_property_betweenness_centrality(
+        self, graph: nx.Graph, centralities: dict
+    ) -> dict:
+        return centralities[SHORTEST_PATH_OBSERVABLES["node_betweenness_centrality"]]
+
+    def _node_property_closeness_centrality(
+        self, graph: nx.Graph, centralities: dict
+    ) -> dict:
+        return centralities[SHORTEST_PATH_OBSERVABLES["node_closeness_centrality"]]
+
+    def _node_property_local_clustering_coefficient(
+        self, graph: nx.Graph, centralities: dict
+    ) -> dict:
         return nx.clustering(graph)
 
-    def _node_property_degree(self, graph: nx.Graph) -> dict:
+    def _node_property_degree(self, graph: nx.Graph, centralities: dict) -> dict:
         return dict(nx.degree(graph))
 
-    def _edge_property_betweenness_centrality(self, graph: nx.Graph) -> dict:
-        return nx.edge_betweenness_centrality(graph)
+    def _edge_property_betweenness_centrality(
+        self, graph: nx.Graph, centralities: dict
+    ) -> dict:
+        return centralities[SHORTEST_PATH_OBSERVABLES["edge_betweenness_centrality"]]
 
 
 if __name__ == "__main__":
@@ -76,6 +208,18 @@ if __name__ == "__main__":
         type=str,
         help="Path to output file.",
     )
+    parser.add_argument(
+        "--dataset_config",
+        required=True,
+        type=str,
+    )
+    parser.add_argument(
+        "--observables",
+        required=False,
+        default=None,
+        type=str,
+        help="Comma separated list of observables (default: all).",
+    )
     parser.add_argument(
         "--cpus",
         required=True,
@@ -84,9 +228,33 @@ if __name__ == "__main__":
     )
 
     args = parser.parse_args()
+    graph_config = toml.load(args.dataset_config).get("graph-processing", {})
+
+    # approximate centralities for large graphs
+    num_samples = None
+    if "centrality_num_samples" in graph_config:
+        num_samples = graph_config["centrality_num_samples"]
+    seed = 0
+    if "centrality_seed" in graph_config:
+        seed = graph_config["centrality_seed"]
+    closeness_radius = None
+    if "closeness_radius" in graph_config:
+        closeness_radius = graph_config["closeness_radius"]
+
+    # observables given on the command line take precedence over the config
+    observables = None
+    if args.observables is not None:
+        observables = args.observables.split(",")
+    elif "graph_observables" in graph_config:
+        observables = graph_config["graph_observables"]
 
     x = BaseDataSet.from_pickle(args.infile)
 
-    x = GraphTheoreticalAnnotationsTransform()(dataset=x, cpus=args.cpus)
+    x = GraphTheoreticalAnnotationsTransform(
+        observables=observables,
+        num_samples=num_samples,
+        seed=seed,
+        closeness_radius=closeness_radius,
+    )(x, cpus=args.cpus)
 
     x.to_pickle(args.outfile)
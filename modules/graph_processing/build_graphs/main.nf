@@ -12,6 +12,7 @@ process build_graphs {
 
     script:
     """
+    export PYTHONPATH="${moduleDir}/../../../lib:\${PYTHONPATH:-}"
 	 python ${moduleDir}/scripts/build_graphs.py \
         --infile=${abstract_structure_fpath} \
         --dataset_config=${dataset_config} \
@@ -4,24 +4,134 @@ from argparse import ArgumentParser
 import networkx as nx
 import numpy as np
 import toml
+from cellular_dynamics.frame_graph import (
+    AttributeTable,
+    FrameGraph,
+    csr_adjacency,
+    node_column,
+    set_node_column,
+)
 from core_data_utils.datasets import BaseDataSet, BaseDataSetEntry
 from core_data_utils.transformations import BaseDataSetTransformation
 
 
 class BuildGraphTransform(BaseDataSetTransformation):
-    def __init__(
-        self,
-        mum_px: float,
-    ) -> None:
+    def __init__(self, mum_px: float, graph_format: str = "networkx") -> None:
+        if graph_format not in ("networkx", "frame_graph"):
+            raise ValueError(f"Unknown graph format '{graph_format}'.")
+
         self._mum_per_px = mum_px
+        self._graph_format = graph_format
         super().__init__()
 
-    def _transform_single_entry(
-        self, entry: BaseDataSetEntry, dataset_properties: dict
-    ) -> BaseDataSetEntry:
+    @staticmethod
+    def edge_arrays(
+        properties: dict, mum_per_px: float
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Collect undirected edges from the (directed) neighbor information of
+        all cells. Shared perimeters reported by both cells are averaged.
+
+        Args:
+            properties (dict): Cell properties, including 'neighbors' mapping
+                neighbor ids to shared perimeters.
+            mum_per_px (float): Length of a pixel in micrometers.
+
+        Returns:
+            (tuple[np.ndarray, np.ndarray, np.ndarray]): (E, 2) array of edges
+                as positions of cells in 'properties', in order of first
+                occurrence, shared perimeters and centroid distances.
+        """
+
+        cell_ids = np.fromiter(properties.keys(), dtype=np.int64, count=len(properties))
+        centroids = np.array(
+            [
+                (property_dict["cell_centroid_x"], property_dict["cell_centroid_y"])
+                for property_dict in properties.values()
+            ],
+            dtype=np.float64,
+        ).reshape(-1, 2)
+
+        num_neighbors = [
+            len(property_dict["neighbors"]) for property_dict in properties.values()
+        ]
+        sources = np.repeat(np.arange(len(cell_ids)), num_neighbors)
+        neighbor_ids = np.fromiter(
+            (
+                neighbor_id
+                for property_dict in properties.values()
+                for neighbor_id in property_dict["neighbors"].keys()
+            ),
+            dtype=np.int64,
+            count=len(sources),
+        )
+        overlaps = np.fromiter(
+            (
+                overlap
+                for property_dict in properties.values()
+                for overlap in property_dict["neighbors"].values()
+            ),
+            dtype=np.float64,
+            count=len(sources),
+        )
 
-        properties = entry.data
+        # map neighbor ids to node positions
+        sorter = np.argsort(cell_ids)
+        targets = sorter[
+            np.searchsorted(cell_ids, neighbor_ids, sorter=sorter).clip(
+                max=len(cell_ids) - 1
+            )
+        ]
+        unknown = cell_ids[targets] != neighbor_ids
+        if np.any(unknown):
+            raise RuntimeError(
+                f"Neighbors {np.unique(neighbor_ids[unknown]).tolist()} not present in graph"
+            )
+
+        # identify both directions of an edge and average their shared perimeters
+        edge_keys = np.minimum(sources, targets) * len(cell_ids) + np.maximum(
+            sources, targets
+        )
+        _, first_index, edge_index = np.unique(
+            edge_keys, return_index=True, return_inverse=True
+        )
+        shared_perimeters = np.bincount(edge_index, weights=overlaps) / np.bincount(
+            edge_index
+        )
+
+        order = np.argsort(first_index)
+        first_index = first_index[order]
+        shared_perimeters = shared_perimeters[order]
+
+        edges = np.stack((sources[first_index], targets[first_index]), axis=1)
 
+        delta = centroids[edges[:, 0]] - centroids[edges[:, 1]]
+        distances = np.linalg.norm(delta, axis=1) * mum_per_px
+
+        return edges, shared_perimeters, distances
+
+    def _build_frame_graph(self, properties: dict) -> FrameGraph:
+        edges, shared_perimeters, distances = self.edge_arrays(
+            properties, self._mum_per_px
+        )
+
+        node_attributes = AttributeTable.from_records(
+            {k: v for k, v in property_dict.items() if k != "neighbors"}
+            for property_dict in properties.values()
+        )
+
+        edge_attributes = AttributeTable(len(edges))
+        edge_attributes.set_column("shared_cell_perimeter_mum", shared_perimeters)
+        edge_attributes.set_column("distance_mum", distances)
+
+        return FrameGraph(
+            np.fromiter(properties.keys(), dtype=np.int64, count=len(properties)),
+            node_attributes=node_attributes,
+            edges=edges,
+            edge_attributes=edge_attributes,
+        )
+
+    def _build_networkx_graph(self, properties: dict) -> nx.Graph:
         G = nx.Graph()
 
         # add all nodes in a first pass
@@ -35,44 +145,34 @@ class BuildGraphTransform(BaseDataSetTransformation):
                 raise RuntimeError(f"Node {cell_id} already present in graph")
 
         # add all edges in a second pass
-        for cell_id, property_dict in properties.items():
-            for neighbor_index, overlap in property_dict["neighbors"].items():
-                oc_x, oc_y = (
-                    property_dict["cell_centroid_x"],
-                    property_dict["cell_centroid_y"],
-                )
-                nbc_x, nbc_y = (
-                    properties[neighbor_index]["cell_centroid_x"],
-                    properties[neighbor_index]["cell_centroid_y"],
-                )
+        edges, shared_perimeters, distances = self.edge_arrays(
+            properties, self._mum_per_px
+        )
+        cell_ids = list(properties.keys())
+
+        G.add_edges_from(
+            (
+                cell_ids[source],
+                cell_ids[target],
+                {"shared_cell_perimeter_mum": perimeter, "distance_mum": distance},
+            )
+            for (source, target), perimeter, distance in zip(
+                edges.tolist(), shared_perimeters.tolist(), distances.tolist()
+            )
+        )
 
-                own_centroid = np.array([oc_x, oc_y])
-                nbh_centroid = np.array([nbc_x, nbc_y])
+        return G
 
-                distance = (
-                    np.linalg.norm(own_centroid - nbh_centroid) * self._mum_per_px
-                )
+    def _transform_single_entry(
+        self, entry: BaseDataSetEntry, dataset_properties: dict
+    ) -> BaseDataSetEntry:
 
-                # edge has been created before
-                if G.has_edge(cell_id, neighbor_index):
-                    old_value = G[cell_id][neighbor_index]["shared_cell_perimeter_mum"]
-                    new_value = (old_value + overlap) / 2
-                    G[cell_id][neighbor_index]["shared_cell_perimeter_mum"] = new_value
-
-                    # check if distance is consistent:
-                    if not np.allclose(
-                        distance, G[cell_id][neighbor_index]["distance_mum"]
-                    ):
-                        raise RuntimeError(
-                            f"New distance {distance} inconsistent with old distance {G[cell_id][neighbor_index]['distance_mum']}"
-                        )
-                else:
-                    G.add_edge(
-                        cell_id,
-                        neighbor_index,
-                        shared_cell_perimeter_mum=overlap,
-                        distance_mum=distance,
-                    )
+        properties = entry.data
+
+        if self._graph_format == "frame_graph":
+            G = self._build_frame_graph(properties)
+        else:
+            G = self._build_networkx_graph(properties)
 
         return BaseDataSetEntry(identifier=entry.identifier, data=G)
 
@@ -83,20 +183,27 @@ class CalculateCellNucleusShapeTransformation(BaseDataSetTransformation):
     ) -> BaseDataSetEntry:
         graph = entry.data
 
-        for _, nodeprops in graph.nodes(data=True):
+        cell_area = node_column(graph, "cell_area_mum_squared").astype(np.float64)
+        cell_perimeter = node_column(graph, "cell_perimeter_mum").astype(np.float64)
+        nucleus_major_axis = node_column(graph, "nucleus_major_axis_mum").astype(
+            np.float64
+        )
+        nucleus_minor_axis = node_column(graph, "nucleus_minor_axis_mum").astype(
+            np.float64
+        )
 
-            nodeprops["cell_shape"] = np.nan
-            if nodeprops["cell_area_mum_squared"] > 0:
-                nodeprops["cell_shape"] = nodeprops["cell_perimeter_mum"] / np.sqrt(
-                    nodeprops["cell_area_mum_squared"]
-                )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cell_shape = np.where(
+                cell_area > 0, cell_perimeter / np.sqrt(cell_area), np.nan
+            )
+            nucleus_shape = np.where(
+                nucleus_minor_axis > 0,
+                nucleus_major_axis / nucleus_minor_axis,
+                np.nan,
+            )
 
-            nodeprops["nucleus_shape"] = np.nan
-            if nodeprops["nucleus_minor_axis_mum"] > 0:
-                nodeprops["nucleus_shape"] = nodeprops["nucleus_shape"] = (
-                    nodeprops["nucleus_major_axis_mum"]
-                    / nodeprops["nucleus_minor_axis_mum"]
-                )
+        set_node_column(graph, "cell_shape", cell_shape)
+        set_node_column(graph, "nucleus_shape", nucleus_shape)
 
         return BaseDataSetEntry(identifier=entry.identifier, data=graph)
 
@@ -109,36 +216,52 @@ class CalculateOrderParameter(BaseDataSetTransformation):
         super().__init__()
 
     @staticmethod
-    def calculate_Q_tensor_entry(data, indices: tuple[int, int]) -> float:
-        i, j = indices
-        delta = 1.0 if (i == j) else 0.0
-
-        return 2 * (np.multiply(data[:, i], data[:, j]) - 0.5 * delta).mean()
-
-    @staticmethod
-    def calculate_order_parameter(data: list[np.array]) -> float:
-
-        Q_tensor = np.zeros((2, 2))
-
-        data_matrix = np.vstack(data)
-
-        # assert that vectors have unit norm
-        assert np.allclose(np.linalg.norm(data_matrix, axis=1), 1.0)
-
-        Q_tensor[0, 0] = CalculateOrderParameter.calculate_Q_tensor_entry(
-            data_matrix, (0, 0)
+    def calculate_order_parameters(
+        angles: np.ndarray, indptr: np.ndarray, indices: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Calculate the nematic order parameter of the neighborhood (node and
+        its neighbors) of every node.
+
+        For unit directors at angles t, Q = [[<cos 2t>, <sin 2t>],
+        [<sin 2t>, -<cos 2t>]] and its largest eigenvalue is
+        S = sqrt(<cos 2t>^2 + <sin 2t>^2).
+
+        Args:
+            angles (np.ndarray): Director angle of every node.
+            indptr (np.ndarray): CSR index pointer of the adjacency.
+            indices (np.ndarray): CSR neighbor positions of the adjacency.
+
+        Returns:
+            (tuple[np.ndarray, np.ndarray]): Order parameters S with shape (N,)
+                and Q tensors with shape (N, 2, 2).
+        """
+
+        num_nodes = len(angles)
+        cos_2t, sin_2t = np.cos(2 * angles), np.sin(2 * angles)
+
+        # the neighborhood of a node consists of the node itself and its neighbors
+        sources = np.concatenate(
+            (np.arange(num_nodes), np.repeat(np.arange(num_nodes), np.diff(indptr)))
         )
-        Q_tensor[1, 0] = CalculateOrderParameter.calculate_Q_tensor_entry(
-            data_matrix, (1, 0)
+        targets = np.concatenate((np.arange(num_nodes), indices))
+
+        neighborhood_size = np.bincount(sources, minlength=num_nodes)
+        q_00 = (
+            np.bincount(sources, weights=cos_2t[targets], minlength=num_nodes)
+            / neighborhood_size
         )
-        Q_tensor[0, 1] = Q_tensor[1, 0]  # tensor is symmetric!
-        Q_tensor[1, 1] = CalculateOrderParameter.calculate_Q_tensor_entry(
-            data_matrix, (1, 1)
+        q_01 = (
+            np.bincount(sources, weights=sin_2t[targets], minlength=num_nodes)
+            / neighborhood_size
         )
 
-        S = np.max(np.linalg.eigvals(Q_tensor))
+        Q_tensors = np.stack(
+            (np.stack((q_00, q_01), axis=-1), np.stack((q_01, -q_00), axis=-1)),
+            axis=1,
+        )
 
-        return S, Q_tensor
+        return np.hypot(q_00, q_01), Q_tensors
 
     def _transform_single_entry(
         self, entry: BaseDataSetEntry, dataset_properties: dict
@@ -146,33 +269,21 @@ class CalculateOrderParameter(BaseDataSetTransformation):
 
         current_graph = entry.data
 
-        # calculate the nematic order parameter in a second pass
-        for nodeid, nodedata in current_graph.nodes(data=True):
-
-            # collect all local directors
-            own_angle = nodedata[self._angle_property]
-
-            neighborhood_local_directors = [
-                np.array([np.cos(own_angle), np.sin(own_angle)])
-            ]
-
-            for neighbor in current_graph.neighbors(nodeid):
-                cangle = current_graph.nodes[neighbor][self._angle_property]
-                neighborhood_local_directors.append(
-                    np.array([np.cos(cangle), np.sin(cangle)])
-                )
-
-            (
-                order_parameter_S,
-                Q_tensor,
-            ) = CalculateOrderParameter.calculate_order_parameter(
-                neighborhood_local_directors
+        order_parameters_S, Q_tensors = (
+            CalculateOrderParameter.calculate_order_parameters(
+                node_column(current_graph, self._angle_property).astype(np.float64),
+                *csr_adjacency(current_graph),
             )
+        )
 
-            nodedata[f"{self._save_property_prefix}_nematic_order_parameter_S"] = (
-                order_parameter_S
-            )
-            nodedata[f"{self._save_property_prefix}_Q_tensor"] = Q_tensor
+        set_node_column(
+            current_graph,
+            f"{self._save_property_prefix}_nematic_order_parameter_S",
+            order_parameters_S,
+        )
+        set_node_column(
+            current_graph, f"{self._save_property_prefix}_Q_tensor", Q_tensors
+        )
 
         return BaseDataSetEntry(identifier=entry.identifier, data=current_graph)
 
@@ -213,7 +324,13 @@ if __name__ == "__main__":
     mum_per_px = dataset_config["experimental-parameters"]["mum_per_px"]
 
     x = BaseDataSet.from_pickle(args.infile)
-    x = BuildGraphTransform(mum_px=mum_per_px)(x, cpus=args.cpus)
+    graph_format = "networkx"
+    if "graph_format" in dataset_config.get("graph-processing", {}):
+        graph_format = dataset_config["graph-processing"]["graph_format"]
+
+    x = BuildGraphTransform(mum_px=mum_per_px, graph_format=graph_format)(
+        x, cpus=args.cpus
+    )
     x = CalculateCellNucleusShapeTransformation()(x, cpus=args.cpus)
     x = CalculateOrderParameter("cell_major_axis_angle_rad", "cell")(x, cpus=args.cpus)
     x = CalculateOrderParameter("nucleus_major_axis_angle_rad", "nucleus")(
@@ -12,6 +12,7 @@ process calculate_local_density {
 
     script:
     """
+    export PYTHONPATH="${moduleDir}/../../../lib:\${PYTHONPATH:-}"
 	 python ${moduleDir}/scripts/calculate_local_density.py \
         --infile=${graph_dataset} \
         --outfile="graph_dataset_with_local_density.pickle" \
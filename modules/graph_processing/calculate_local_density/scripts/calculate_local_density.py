@@ -3,6 +3,12 @@ from argparse import ArgumentParser
 
 import networkx as nx
 import numpy as np
+from cellular_dynamics.frame_graph import (
+    FrameGraph,
+    csr_adjacency,
+    node_column,
+    set_node_column,
+)
 from core_data_utils.datasets import BaseDataSet, BaseDataSetEntry
 from core_data_utils.transformations import BaseDataSetTransformation
 
@@ -13,17 +19,25 @@ class CalculateLocalDensityTransformation(BaseDataSetTransformation):
         self, entry: BaseDataSetEntry, dataset_properties: dict
     ) -> BaseDataSetEntry:
 
-        current_graph: nx.Graph = entry.data
+        current_graph: nx.Graph | FrameGraph = entry.data
 
-        for nodeid, nodeprops in current_graph.nodes(data=True):
-            areas = [nodeprops["cell_area_mum_squared"]]  # add own area to list
+        areas = node_column(current_graph, "cell_area_mum_squared").astype(np.float64)
+        indptr, indices = csr_adjacency(current_graph)
 
-            # iterate over neighbors, adding their areas to the list
-            for nb_index in current_graph.neighbors(nodeid):
-                areas.append(current_graph.nodes[nb_index]["cell_area_mum_squared"])
+        # sum the own area and the areas of all neighbors
+        num_nodes = len(areas)
+        neighborhood_area = areas + np.bincount(
+            np.repeat(np.arange(num_nodes), np.diff(indptr)),
+            weights=areas[indices],
+            minlength=num_nodes,
+        )
 
-            # local density is the inverse of the mean area of the node and its neighbors
-            nodeprops["local_density_per_mum_squared"] = 1.0 / np.mean(areas)
+        # local density is the inverse of the mean area of the node and its neighbors
+        set_node_column(
+            current_graph,
+            "local_density_per_mum_squared",
+            (np.diff(indptr) + 1) / neighborhood_area,
+        )
 
         return BaseDataSetEntry(
             identifier=entry.identifier, data=current_graph, metadata=entry.metadata
@@ -47,11 +47,17 @@ class ObjectInformationTransform(BaseDataSetTransformation):
 
         for contour in contours:
 
-            contour2labelim = np.unique(
-                labelim[contour.squeeze()[:, 1], contour.squeeze()[:, 0]]
-            ).item()
+            # all points of an external contour belong to the same component
+            column, row = contour[0, 0]
+            contour2labelim = labelim[row, column]
+
+            # only look at the bounding box of the current object
+            left, top, width, height = stats[contour2labelim, :4]
+            roi = np.s_[top : top + height, left : left + width]
 
-            original_label = np.unique(image[labelim == contour2labelim]).item()
+            original_label = np.unique(
+                image[roi][labelim[roi] == contour2labelim]
+            ).item()
 
             perimeter = cv2.arcLength(contour, closed=True)
             area = cv2.contourArea(contour)
@@ -89,19 +95,23 @@ class MergeCellNucleiInformation(BaseMultiDataSetTransformation):
         nuc_ids = np.setdiff1d(nuc_labelim, 0)
         cell_ids = np.setdiff1d(cell_labelim, 0)
 
-        merged_properties = {}
+        nucleus_cell_pairs = MergeCellNucleiInformation.overlapping_label_pairs(
+            nuc_labelim, cell_labelim
+        )
 
-        assert len(nuc_ids) == len(cell_ids)
+        validation_errors = MergeCellNucleiInformation.validate_correspondence(
+            nuc_ids, cell_ids, nucleus_cell_pairs
+        )
 
-        for nucleus_id in nuc_ids:
-            ccids = np.setdiff1d(cell_labelim[nuc_labelim == nucleus_id], 0)
-            assert len(ccids) == 1, f"{ccids}"
-            cell_counterpart = ccids.item()
+        if len(validation_errors) > 0:
+            raise RuntimeError(
+                f"Nuclei and cells of entry '{entry.identifier}' do not correspond:\n"
+                + "\n".join(validation_errors)
+            )
 
-            assert (
-                cell_counterpart not in merged_properties
-            ), f"Cell with ID '{cell_counterpart}' already in merged properties dict"
+        merged_properties = {}
 
+        for nucleus_id, cell_counterpart in nucleus_cell_pairs.tolist():
             merged_properties[cell_counterpart] = {
                 f"cell_{k}": v for k, v in cell_props[cell_counterpart].items()
             }
@@ -111,6 +121,88 @@ class MergeCellNucleiInformation(BaseMultiDataSetTransformation):
 
         return BaseDataSetEntry(identifier=entry.identifier, data=merged_properties)
 
+    @staticmethod
+    def overlapping_label_pairs(
+        nuc_labelim: np.ndarray, cell_labelim: np.ndarray
+    ) -> np.ndarray:
+        """
+        Find all (nucleus, cell) label pairs sharing at least one pixel.
+
+        Args:
+            nuc_labelim (np.ndarray): Nucleus label image.
+            cell_labelim (np.ndarray): Cell label image.
+
+        Returns:
+            (np.ndarray): Array of shape (N, 2) holding nucleus and cell labels,
+                sorted by nucleus label.
+        """
+
+        overlap_mask = (nuc_labelim > 0) & (cell_labelim > 0)
+        num_cell_labels = np.int64(cell_labelim.max()) + 1
+
+        pair_codes = np.unique(
+            nuc_labelim[overlap_mask].astype(np.int64) * num_cell_labels
+            + cell_labelim[overlap_mask]
+        )
+
+        return np.stack(np.divmod(pair_codes, num_cell_labels), axis=1)
+
+    @staticmethod
+    def validate_correspondence(
+        nuc_ids: np.ndarray, cell_ids: np.ndarray, nucleus_cell_pairs: np.ndarray
+    ) -> list[str]:
+        """
+        Check that nuclei and cells correspond one-to-one.
+
+        Args:
+            nuc_ids (np.ndarray): All nucleus labels.
+            cell_ids (np.ndarray): All cell labels.
+            nucleus_cell_pairs (np.ndarray): Overlapping (nucleus, cell) label
+                pairs as returned by 'overlapping_label_pairs'.
+
+        Returns:
+            (list[str]): Description of every violation found, empty if nuclei
+                and cells correspond.
+        """
+
+        validation_errors = []
+
+        if len(nuc_ids) != len(cell_ids):
+            validation_errors.append(
+                f"Number of nuclei ({len(nuc_ids)}) does not match number of cells ({len(cell_ids)})"
+            )
+
+        matched_nuclei, cells_per_nucleus = np.unique(
+            nucleus_cell_pairs[:, 0], return_counts=True
+        )
+
+        unmatched_nuclei = np.setdiff1d(nuc_ids, matched_nuclei)
+        if len(unmatched_nuclei) > 0:
+            validation_errors.append(
+                f"Nuclei without overlapping cell: {unmatched_nuclei.tolist()}"
+            )
+
+        ambiguous_nuclei = matched_nuclei[cells_per_nucleus > 1]
+        if len(ambiguous_nuclei) > 0:
+            validation_errors.append(
+                f"Nuclei overlapping more than one cell: {ambiguous_nuclei.tolist()}"
+            )
+
+        matched_cells, nuclei_per_cell = np.unique(
+            nucleus_cell_pairs[
+                np.isin(nucleus_cell_pairs[:, 0], ambiguous_nuclei, invert=True), 1
+            ],
+            return_counts=True,
+        )
+
+        shared_cells = matched_cells[nuclei_per_cell > 1]
+        if len(shared_cells) > 0:
+            validation_errors.append(
+                f"Cells overlapping more than one nucleus: {shared_cells.tolist()}"
+            )
+
+        return validation_errors
+
     def __call__(
         self, nuc_label_ds, cell_label_ds, nuc_prop_ds, cell_prop_ds
     ) -> BaseDataSet:
@@ -150,53 +242,164 @@ class IdentifyNeighborsTransformation(BaseMultiDataSetTransformation):
                 "Unequal length of property dictionary and objects present in labelled image"
             )
 
+        rows, columns, owners = IdentifyNeighborsTransformation.contour_points(
+            labelim, cell_labels
+        )
+
+        # every contour point 'sees' all labels inside the footprint of a
+        # dilated single pixel, i.e. a square window around the point, clipped
+        # to the cutout [point - cutout_size, point + cutout_size). For even
+        # kernels OpenCV anchors at 'dilation_size // 2', so the footprint
+        # reaches further after the point than before it.
+        before, after = self.window_extent()
+        padded_labelim = np.pad(
+            labelim, ((before, after), (before, after)), constant_values=0
+        )
+        padded_width = padded_labelim.shape[1]
+        padded_labelim = padded_labelim.ravel()
+
+        # flat index of the upper left corner of every window
+        window_origins = rows * padded_width + columns
+
+        # remember the two most recently seen labels of every point, so that we
+        # do not collect the same (point, neighbor) pair for every offset
+        last_seen = np.full(len(owners), -1, dtype=np.int64)
+        second_last_seen = np.full(len(owners), -1, dtype=np.int64)
+
+        point_indices, overlaps = [], []
+        for row_offset in range(before + after + 1):
+            for column_offset in range(before + after + 1):
+                window_labels = padded_labelim.take(
+                    window_origins + (row_offset * padded_width + column_offset)
+                )
+                is_overlap = (
+                    (window_labels != 0)
+                    & (window_labels != owners)
+                    & (window_labels != last_seen)
+                    & (window_labels != second_last_seen)
+                )
+                new_point_indices = np.flatnonzero(is_overlap)
+                new_overlaps = window_labels[new_point_indices]
+
+                second_last_seen[new_point_indices] = last_seen[new_point_indices]
+                last_seen[new_point_indices] = new_overlaps
+
+                point_indices.append(new_point_indices)
+                overlaps.append(new_overlaps)
+
+        num_labels = np.int64(labelim.max()) + 1
+
+        # each contour point contributes at most once to every neighbor
+        point_overlap_pairs = np.unique(
+            np.concatenate(point_indices) * num_labels + np.concatenate(overlaps)
+        )
+        point_indices, overlaps = np.divmod(point_overlap_pairs, num_labels)
+
+        cell_neighbor_pairs, contact_points = np.unique(
+            owners[point_indices] * num_labels + overlaps, return_counts=True
+        )
+        pair_owners, pair_neighbors = np.divmod(cell_neighbor_pairs, num_labels)
+
         for current_cell_label in cell_labels:
-            current_binary_mask = (labelim == current_cell_label).astype(np.uint8)
-            contours, _ = cv2.findContours(
-                current_binary_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE
-            )
+            props[current_cell_label].update({"neighbors": defaultdict(int)})
 
-            neighbors = defaultdict(int)
+        for owner, neighbor, count in zip(
+            pair_owners.tolist(), pair_neighbors.tolist(), contact_points.tolist()
+        ):
+            props[owner]["neighbors"][neighbor] = count * self._mum_per_px
 
-            if len(contours) != 1:
-                raise RuntimeError()
+        return BaseDataSetEntry(identifier=entry.identifier, data=props)
 
-            contour = contours[0]
+    def window_extent(self) -> tuple[int, int]:
+        """
+        Extent of the neighborhood window of a contour point.
 
-            # we need to use cutouts otherwise this is too slow!!
-            empty_image = np.zeros_like(labelim, dtype=np.uint8)
+        Returns:
+            (tuple[int, int]): Number of pixels the window reaches before and
+                after the point, equal along rows and columns.
+        """
 
-            for point in contour:
-                column, row = point[0]
+        anchor = self._dilation_size // 2
 
-                min_row: int = max(0, row - self._cutout_size)
-                max_row: int = min(labelim.shape[0], row + self._cutout_size)
-                min_col: int = max(0, column - self._cutout_size)
-                max_col: int = min(labelim.shape[1], column + self._cutout_size)
+        before = min(
+            self._dilate_iterations * (self._dilation_size - 1 - anchor),
+            self._cutout_size,
+        )
+        after = min(self._dilate_iterations * anchor, self._cutout_size - 1)
 
-                empty_image *= 0  # reset to 0 for each point
-                empty_image[row, column] = 1
-                empty_image_cutout = empty_image[min_row:max_row, min_col:max_col]
-                labelim_cutout = labelim[min_row:max_row, min_col:max_col]
+        return max(before, 0), max(after, 0)
 
-                dilated_empty_image_cutout = cv2.dilate(
-                    empty_image_cutout,
-                    cv2.getStructuringElement(
-                        cv2.MORPH_RECT, (self._dilation_size, self._dilation_size)
-                    ),
-                    iterations=self._dilate_iterations,
-                )
+    @staticmethod
+    def contour_points(
+        labelim: np.ndarray, cell_labels: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Collect the external contour points of all labelled objects.
 
-                overlaps = np.setdiff1d(
-                    labelim_cutout * dilated_empty_image_cutout, [0, current_cell_label]
+        Contours are traced once on the binary image. Objects that cannot be
+        separated this way (touching other labels or lying inside the hole of
+        another object) fall back to tracing their own binary mask.
+
+        Args:
+            labelim (np.ndarray): Label image.
+            cell_labels (np.ndarray): All (non-zero) labels present in 'labelim'.
+
+        Returns:
+            (tuple[np.ndarray, np.ndarray, np.ndarray]): Row indices, column
+                indices and owning label of every contour point.
+        """
+
+        contours, _ = cv2.findContours(
+            (labelim > 0).astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE
+        )
+
+        points = [contour.reshape(-1, 2) for contour in contours]
+        contour_labels = [labelim[pts[:, 1], pts[:, 0]] for pts in points]
+
+        # only keep contours which belong to exactly one object
+        single_object = [lbls.min() == lbls.max() for lbls in contour_labels]
+        points = [pts for pts, keep in zip(points, single_object) if keep]
+        contour_labels = [
+            lbls for lbls, keep in zip(contour_labels, single_object) if keep
+        ]
+
+        traced_labels, contours_per_label = np.unique(
+            [lbls[0] for lbls in contour_labels], return_counts=True
+        )
+
+        if np.any(contours_per_label != 1):
+            raise RuntimeError(
+                f"Objects {traced_labels[contours_per_label != 1]} have more than one contour"
+            )
+
+        for current_cell_label in np.setdiff1d(cell_labels, traced_labels):
+            contours, _ = cv2.findContours(
+                (labelim == current_cell_label).astype(np.uint8),
+                cv2.RETR_EXTERNAL,
+                cv2.CHAIN_APPROX_NONE,
+            )
+
+            if len(contours) != 1:
+                raise RuntimeError(
+                    f"Object {current_cell_label} has more than one contour"
                 )
 
-                for ov in overlaps:
-                    neighbors[ov] += 1 * self._mum_per_px
+            points.append(contours[0].reshape(-1, 2))
+            contour_labels.append(
+                np.full(len(points[-1]), current_cell_label, dtype=labelim.dtype)
+            )
 
-            props[current_cell_label].update({"neighbors": neighbors})
+        if len(points) == 0:
+            no_points = np.empty(0, dtype=np.int64)
+            return no_points, no_points, no_points
 
-        return BaseDataSetEntry(identifier=entry.identifier, data=props)
+        points = np.concatenate(points).astype(np.int64)
+
+        return (
+            points[:, 1],
+            points[:, 0],
+            np.concatenate(contour_labels).astype(np.int64),
+        )
 
     def __call__(self, merged_properties, cell_labels, cpus: int = 1) -> Any:
         return super()._transform(
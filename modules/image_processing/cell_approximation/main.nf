@@ -14,6 +14,7 @@ process cell_approximation {
 
     script:
     """
+    export PYTHONPATH="${moduleDir}/../../../lib:\${PYTHONPATH:-}"
 	 python ${moduleDir}/scripts/cell_approximation.py \
         --infile="${fpath}" \
         --outfile="cell_approximation.pickle" \
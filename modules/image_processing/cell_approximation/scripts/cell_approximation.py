@@ -1,107 +1,212 @@
 import multiprocessing as mp
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 import cv2
 import numpy as np
 import toml
+from cellular_dynamics.labels import (
+    bounding_boxes,
+    get_disconnected,
+    separate_touching_labels,
+)
+from cellular_dynamics.tiling import (
+    TiledComponents,
+    clip_window,
+    read_window,
+    tile_grid,
+)
+from cellular_dynamics.transformations import RemoveSmallObjectsTransform
 from core_data_utils.datasets import BaseDataSet, BaseDataSetEntry
 from core_data_utils.transformations import BaseDataSetTransformation
 
 
 class CellApproximationTransformation(BaseDataSetTransformation):
 
-    def __init__(self, cell_cutoff_px: Optional[int] = None):
+    def __init__(
+        self,
+        cell_cutoff_px: Optional[int] = None,
+        method: str = "watershed",
+        tile_size: Optional[int] = None,
+        threads: int = 1,
+    ):
 
         if cell_cutoff_px is not None:
             if cell_cutoff_px <= 0:
                 raise ValueError(
                     "Provided value for 'cell_cutoff_px' ({cell_cutoff_px}) is invalid."
                 )
+        if method not in ("watershed", "voronoi"):
+            raise ValueError(f"Unknown cell approximation method '{method}'.")
+        if (tile_size is not None) and (cell_cutoff_px is None):
+            raise ValueError("Tiled cell approximation requires 'cell_cutoff_px'.")
 
         self._cell_cutoff_px = cell_cutoff_px
+        self._method = method
+        self._tile_size = tile_size
+        self._threads = threads
 
         super().__init__()
 
-    @staticmethod
-    def ensure_cell_integrity(cell_mask, nucleus_mask):
-        num_cell_ccs, labelled_ccs, stats, _ = cv2.connectedComponentsWithStats(
-            cell_mask.astype(np.uint8)
-        )
-        set_zero_mask = np.zeros_like(cell_mask, dtype=bool)
+    def _watershed_labels(self, label_image: np.ndarray) -> np.ndarray:
+        """
+        Grow the nuclei labels by a watershed on the distance to the nuclei.
+        """
 
-        if num_cell_ccs != 2:
-            nucleus_overlapping_ccs = np.setdiff1d(labelled_ccs[nucleus_mask], (0,))
+        # without nuclei, the distance transform is infinite everywhere
+        if not np.any(label_image):
+            return np.zeros(label_image.shape, dtype=np.int32)
 
-            keep_index = nucleus_overlapping_ccs[
-                np.argmax(stats[nucleus_overlapping_ccs, cv2.CC_STAT_AREA], axis=0)
-            ]
+        dislabels = label_image.copy().astype(np.int32)
+        bg_mask = np.zeros_like(label_image, dtype=bool)
+        inimage = cv2.distanceTransform(
+            (label_image == 0).astype(np.uint8), cv2.DIST_L2, cv2.DIST_MASK_PRECISE
+        )
 
-            set_zero_mask[np.logical_and(cell_mask > 0, labelled_ccs != keep_index)] = (
-                True
-            )
+        if self._cell_cutoff_px is not None:
+            bg_mask[inimage >= self._cell_cutoff_px] = True
 
-        return set_zero_mask
+        inimage = cv2.merge(3 * [inimage]).astype(np.uint8)
 
-    @staticmethod
-    def get_disconnected(label_image: np.array, nuclei_mask: np.array):
+        dislabels = cv2.watershed(inimage, dislabels)
 
-        all_cell_labels = np.setdiff1d(label_image, (0,))
-        disconnected_cell_labels = label_image.copy()
+        # step 4: some post-processing
+        dislabels[dislabels == -1] = 0  # set boundaries to 0
 
-        _, nuclei_labelled = cv2.connectedComponents(
-            nuclei_mask.astype(np.uint8), connectivity=8
-        )
+        # limit cell area by distance transform
+        if self._cell_cutoff_px is not None:
+            dislabels[bg_mask] = 0
 
-        height, width = label_image.shape
+        return dislabels
 
-        for cell_label in all_cell_labels:
+    def _voronoi_labels(self, label_image: np.ndarray) -> np.ndarray:
+        """
+        Assign every pixel to its closest nucleus (nucleus-seeded Voronoi
+        tessellation), using a single labelled distance transform.
+        """
 
-            corresponding_nucleus_label = np.setdiff1d(
-                nuclei_labelled[label_image == cell_label], (0,)
-            ).item()
+        distances, nearest_pixels = cv2.distanceTransformWithLabels(
+            (label_image == 0).astype(np.uint8),
+            cv2.DIST_L2,
+            cv2.DIST_MASK_5,
+            labelType=cv2.DIST_LABEL_PIXEL,
+        )
 
-            binary_cell_mask = label_image == cell_label
+        # nucleus pixels are numbered from 1 in raster order, map them to
+        # the label of their nucleus
+        nucleus_pixel_labels = label_image.ravel()[np.flatnonzero(label_image)]
+        dislabels = np.concatenate(((0,), nucleus_pixel_labels)).astype(np.int32)[
+            nearest_pixels
+        ]
 
-            # cells are possibly already disconnected, so we remove all but the
-            # largest nucleus-overlapping cc
+        # limit cell area by distance transform
+        if self._cell_cutoff_px is not None:
+            dislabels[distances >= self._cell_cutoff_px] = 0
+
+        return dislabels
+
+    def _cell_labels(self, label_image: np.ndarray) -> np.ndarray:
+        if self._method == "voronoi":
+            return self._voronoi_labels(label_image)
+        return self._watershed_labels(label_image)
+
+    def _tiled_cell_mask(self, image: np.ndarray) -> np.ndarray:
+        """
+        Approximate cells tile by tile, with the same result as the full frame
+        path. Cells are grown in every tile with a halo of at least
+        'cell_cutoff_px' pixels, so that the tile sees all nuclei its cells can
+        belong to. Touching cells are then separated on the stitched labels,
+        every tile within a window containing all cells on the tile and around
+        it, as the separation depends on the whole contour of a cell. Cells
+        continued across seams are merged by 'TiledComponents'. Apart from the
+        nuclei and cell labels, memory is bounded by the tile (and cell) size.
+        """
+
+        # padded and labelled like in the full frame path, label order decides
+        # which cell keeps contested boundary pixels
+        binary_nuclei_mask = np.pad(
+            (image > 0).astype(np.int8), 1, mode="constant", constant_values=0
+        )
+        num_labels, nuclei_labels = cv2.connectedComponents(binary_nuclei_mask)
+        del binary_nuclei_mask
+
+        tiles = [
+            tile
+            for grid_row in tile_grid(nuclei_labels.shape, self._tile_size)
+            for tile in grid_row
+        ]
+        # the watershed decides ties between cells meeting within the cutoff by
+        # its flooding order, which also depends on pixels beyond the cutoff
+        halo = int(
+            np.ceil((2 if self._method == "watershed" else 1) * self._cell_cutoff_px)
+        )
 
-            set_zero_mask = CellApproximationTransformation.ensure_cell_integrity(
-                binary_cell_mask, nuclei_labelled == corresponding_nucleus_label
+        cell_labels = np.zeros(nuclei_labels.shape, dtype=np.int32)
+        cell_mask = np.zeros(nuclei_labels.shape, dtype=np.uint8)
+
+        def grow_tile(tile: tuple[slice, slice]) -> tuple[np.ndarray, np.ndarray]:
+            # windows end at the frame border, which the watershed leaves
+            # unassigned like in the full frame
+            window, window_tile = clip_window(nuclei_labels.shape, tile, halo)
+            cell_labels[tile] = self._cell_labels(nuclei_labels[window])[window_tile]
+
+            tile_labels, boxes = bounding_boxes(cell_labels[tile])
+            return tile_labels, boxes + [tile[0].start, tile[1].start] * 2
+
+        # bounding box of every cell across all tiles
+        first_pixels = np.full((num_labels, 2), np.iinfo(np.int64).max)
+        last_pixels = np.full((num_labels, 2), -1)
+
+        def separate_tile(tile: tuple[slice, slice]) -> None:
+            # the window contains every cell on the tile or touching it
+            window_labels = np.unique(read_window(cell_labels, tile, 1))
+            window_labels = window_labels[window_labels > 0]
+
+            starts = np.array([tile[0].start, tile[1].start])
+            stops = np.array([tile[0].stop, tile[1].stop])
+            window_halo = max(
+                1,
+                *(
+                    starts
+                    - first_pixels[window_labels].min(axis=0, initial=starts.max())
+                ),
+                *(last_pixels[window_labels].max(axis=0, initial=0) - stops + 1),
             )
-            binary_cell_mask[set_zero_mask] = 0
-            disconnected_cell_labels[set_zero_mask] = 0
 
-            contours, _ = cv2.findContours(
-                binary_cell_mask.astype(np.uint8),
-                cv2.RETR_EXTERNAL,
-                cv2.CHAIN_APPROX_NONE,
+            dislabels = separate_touching_labels(
+                read_window(cell_labels, tile, window_halo),
+                protected_mask=read_window(nuclei_labels, tile, window_halo),
+            )
+            cell_mask[tile] = (
+                dislabels[window_halo:-window_halo, window_halo:-window_halo] > 0
             )
 
-            assert len(contours) == 1
+        with ThreadPoolExecutor(max_workers=self._threads) as executor:
+            for tile_labels, boxes in executor.map(grow_tile, tiles):
+                np.minimum.at(first_pixels, tile_labels, boxes[:, :2])
+                np.maximum.at(last_pixels, tile_labels, boxes[:, 2:])
 
-            contour = contours[0].squeeze()
+            list(executor.map(separate_tile, tiles))
 
-            for column, row in contour:
-                # only delete if the pixel is not part of the nuclei mask
-                if nuclei_mask[row, column] == 0:
-                    current_neighbors = disconnected_cell_labels[
-                        max(0, row - 1) : min(height, row + 2),
-                        max(0, column - 1) : min(width, column + 2),
-                    ].flatten()
+        del cell_labels
 
-                    if np.setdiff1d(current_neighbors, (0, cell_label)).size > 0:
-                        disconnected_cell_labels[row, column] = 0
+        # keep the largest component of every cell overlapping its nucleus
+        components = TiledComponents(
+            cell_mask, self._tile_size, values=nuclei_labels, threads=self._threads
+        )
+        candidates = np.flatnonzero(components.values > 0)
+        candidates = candidates[
+            np.lexsort((-components.areas[candidates], components.values[candidates]))
+        ]
+        is_largest = np.ones(len(candidates), dtype=bool)
+        is_largest[1:] = np.diff(components.values[candidates]) != 0
 
-            # this procedure might have disconnected cells again, so we need to,
-            # again, remove all but the largest nucleus-overlapping cc
-            set_zero_mask = CellApproximationTransformation.ensure_cell_integrity(
-                disconnected_cell_labels == cell_label,
-                nuclei_labelled == corresponding_nucleus_label,
-            )
-            disconnected_cell_labels[set_zero_mask] = 0
+        keep = np.zeros(components.num_components, dtype=bool)
+        keep[candidates[is_largest]] = True
 
-        return disconnected_cell_labels
+        # remove the padding
+        return components.write_mask(keep, cell_mask)[1:-1, 1:-1].copy()
 
     def _transform_single_entry(
         self, entry: BaseDataSetEntry, dataset_properties: dict
@@ -112,6 +217,18 @@ class CellApproximationTransformation(BaseDataSetTransformation):
             (image > 0).astype(np.uint8), connectivity=8
         )
 
+        if self._tile_size is not None:
+            dislabels = self._tiled_cell_mask(image)
+            num_cells, _ = cv2.connectedComponents(dislabels)
+
+            assert (
+                num_cells == num_nuclei
+            ), f"Number of cells ({num_cells}) does not match number of nuclei ({num_nuclei})"
+
+            return BaseDataSetEntry(
+                identifier=entry.identifier, data=dislabels, metadata=entry.metadata
+            )
+
         binary_nuclei_mask: np.array = (image > 0).astype(np.int8)
 
         # we pad the binary nuclei mask with zeros to avoid border effects
@@ -121,28 +238,8 @@ class CellApproximationTransformation(BaseDataSetTransformation):
 
         _, label_image = cv2.connectedComponents(binary_nuclei_mask)
 
-        dislabels = label_image.copy().astype(np.int32)
-        bg_mask = np.zeros_like(label_image, dtype=bool)
-        inimage = cv2.distanceTransform(
-            (label_image == 0).astype(np.uint8), cv2.DIST_L2, cv2.DIST_MASK_PRECISE
-        )
-
-        if self._cell_cutoff_px is not None:
-            bg_mask[inimage >= self._cell_cutoff_px] = True
-
-        inimage = cv2.merge(3 * [inimage]).astype(np.uint8)
-
-        dislabels = cv2.watershed(inimage, dislabels)
-
-        # step 4: some post-processing
-        dislabels[dislabels == -1] = 0  # set boundaries to 0
-
-        # limit cell area by distance transform
-        if self._cell_cutoff_px is not None:
-            dislabels[bg_mask] = 0
-
-        dislabels = CellApproximationTransformation.get_disconnected(
-            dislabels, binary_nuclei_mask
+        dislabels = get_disconnected(
+            self._cell_labels(label_image), nuclei_mask=binary_nuclei_mask
         )
 
         # we remove the padding
@@ -162,37 +259,6 @@ class CellApproximationTransformation(BaseDataSetTransformation):
         )
 
 
-class RemoveSmallObjectsTransform(BaseDataSetTransformation):
-    def __init__(
-        self,
-        min_area_px2: float,
-    ) -> None:
-        self._min_area_px2 = min_area_px2
-
-        super().__init__()
-
-    def _transform_single_entry(
-        self, entry: BaseDataSetEntry, dataset_properties: dict
-    ) -> BaseDataSetEntry:
-
-        image = entry.data
-
-        image = (image > 0).astype(np.int8)
-
-        num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(image)
-
-        for component_idx in range(1, num_labels):
-            if stats[component_idx, cv2.CC_STAT_AREA] < self._min_area_px2:
-                labels[labels == component_idx] = 0
-
-        # convert label image to binary mask
-        labels = (labels > 0).astype(np.int8)
-
-        return BaseDataSetEntry(
-            identifier=entry.identifier, data=labels, metadata=entry.metadata
-        )
-
-
 if __name__ == "__main__":
 
     mp.set_start_method("spawn")
@@ -235,15 +301,33 @@ if __name__ == "__main__":
 
     x = BaseDataSet.from_pickle(args.infile)
 
-    x = CellApproximationTransformation(cell_cutoff_px=cell_cutoff_px)(
-        dataset=x, cpus=args.cpus
-    )
+    cell_approximation_method = "watershed"
+    if "cell_approximation_method" in full_config["data-preparation"]:
+        cell_approximation_method = full_config["data-preparation"][
+            "cell_approximation_method"
+        ]
+
+    # very large mosaics are processed in tiles, using the cores within
+    # every frame instead of across frames
+    tile_size = None
+    if "cell_approximation_tile_size" in full_config["data-preparation"]:
+        tile_size = full_config["data-preparation"]["cell_approximation_tile_size"]
+    frame_cpus, tile_threads = (args.cpus, 1) if tile_size is None else (1, args.cpus)
+
+    x = CellApproximationTransformation(
+        cell_cutoff_px=cell_cutoff_px,
+        method=cell_approximation_method,
+        tile_size=tile_size,
+        threads=tile_threads,
+    )(dataset=x, cpus=frame_cpus)
 
     if "min_cell_size_mumsq" in full_config["data-preparation"]:
         min_area_px2 = full_config["data-preparation"]["min_cell_size_mumsq"] / (
             full_config["experimental-parameters"]["mum_per_px"] ** 2
         )
 
-        x = RemoveSmallObjectsTransform(min_area_px2=min_area_px2)
+        x = RemoveSmallObjectsTransform(
+            min_area_px2=min_area_px2, tile_size=tile_size, threads=tile_threads
+        )(dataset=x, cpus=frame_cpus)
 
     x.to_pickle(args.outfile)
@@ -15,6 +15,7 @@ process nuclei_segmentation {
 
     script:
     """
+    export PYTHONPATH="${moduleDir}/../../../lib:\${PYTHONPATH:-}"
 	 python ${moduleDir}/scripts/nuclei_segmentation.py \
         --infile="${fpath}" \
         --outfile="nuclei_segmentation.pickle" \
@@ -1,86 +1,38 @@
 import os
+import queue
+import threading
 from argparse import ArgumentParser
 
 import cv2
 import numpy as np
+import tensorflow as tf
 import toml
+from cellular_dynamics.labels import get_disconnected
+from cellular_dynamics.transformations import RemoveSmallObjectsTransform
 from core_data_utils.datasets import BaseDataSet, BaseDataSetEntry
 from core_data_utils.transformations import BaseDataSetTransformation
+from stardist import polygons_to_label
 from stardist.models import StarDist2D
+from stardist.nms import non_maximum_suppression_sparse
 
 
-def get_disconnected(labels):
-    """
-    Disconnect touching regions with different labels (stardist).
-
-    Args:
-        labels (np.array): Label image.
-
-    Returns:
-        (np.array): Disconnected label image.
-    """
-
-    disconnected_labels = labels.copy()
-    all_labels = np.setdiff1d(disconnected_labels, (0,))  # ignore background
-
-    height, width = disconnected_labels.shape
-
-    for cl in all_labels:
-        mask = disconnected_labels == cl  # binary object mask
-
-        # check whether there are more than one connected components
-        num_ccs, labelled_ccs, stats, _ = cv2.connectedComponentsWithStats(
-            mask.astype(np.uint8), connectivity=8
-        )
-
-        if num_ccs > 2:
-            # delete all but the largest connected component
-            keep_label = np.argmax(stats[1:, cv2.CC_STAT_AREA]) + 1
-            mask[labelled_ccs != keep_label] = 0
-
-        contours, _ = cv2.findContours(
-            mask.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE
-        )
-
-        assert len(contours) == 1, f"More than one contour found for label {cl}."
-
-        contour_points = contours[0].squeeze()
-
-        for column, row in contour_points:
-            current_neighbors = disconnected_labels[
-                max(0, row - 1) : min(height, row + 2),
-                max(0, column - 1) : min(width, column + 2),
-            ].flatten()
-
-            # only delete pixel if necessary
-            if np.setdiff1d(current_neighbors, (0, cl)).size > 0:
-                disconnected_labels[row, column] = 0
-
-    return disconnected_labels
-
-
-class MinMaxScaleTransform(BaseDataSetTransformation):
+class GrayScaleNormalizeTransform(BaseDataSetTransformation):
     def _transform_single_entry(
         self, entry: BaseDataSetEntry, dataset_properties: dict
     ) -> BaseDataSetEntry:
 
-        new_image = entry.data
-
-        minval, maxval = np.min(new_image), np.max(new_image)
-        new_image = (new_image - minval) / (maxval - minval)
-
-        return BaseDataSetEntry(identifier=entry.identifier, data=new_image)
+        image = entry.data
 
+        # min-max scaling makes the channel sum equivalent to the channel mean
+        new_image = image.sum(axis=2, dtype=np.float32)
 
-class GrayScaleTransform(BaseDataSetTransformation):
-    def _transform_single_entry(
-        self, entry: BaseDataSetEntry, dataset_properties: dict
-    ) -> BaseDataSetEntry:
+        minval, maxval = new_image.min(), new_image.max()
+        new_image -= minval
+        new_image /= maxval - minval
 
-        image = entry.data
-
-        new_image = image.mean(axis=2)
-        return BaseDataSetEntry(identifier=entry.identifier, data=new_image)
+        return BaseDataSetEntry(
+            identifier=entry.identifier, data=new_image, metadata=entry.metadata
+        )
 
 
 class StarDistSegmentationTransform(BaseDataSetTransformation):
@@ -88,13 +40,37 @@ class StarDistSegmentationTransform(BaseDataSetTransformation):
         self,
         prob_threshold: float | None = None,
         num_tiles: int = 1,
+        batch_size: int = 1,
+        preprocessing: list[BaseDataSetTransformation] | None = None,
     ):
+        if batch_size > 1 and num_tiles > 1:
+            raise ValueError("Batched StarDist inference does not support tiling.")
+
         self._probability_threshold: float = prob_threshold
         self._stardist_model = StarDist2D.from_pretrained("2D_versatile_fluo")
         self._num_tiles = num_tiles
+        self._batch_size = batch_size
+        self._preprocessing = preprocessing if preprocessing is not None else []
 
         super().__init__()
 
+    def _to_binary_mask(self, labels: np.ndarray, prob: np.ndarray) -> np.ndarray:
+        """
+        Disconnect touching labels and remove objects below the probability
+        threshold. Label 'j + 1' belongs to the object with probability 'prob[j]'.
+        """
+
+        # We need to disconnect touching labels:
+        labels = get_disconnected(labels)
+
+        keep = np.ones(len(prob) + 1, dtype=bool)
+        keep[0] = False
+        if self._probability_threshold is not None:
+            keep[1:] = prob >= self._probability_threshold
+
+        # convert label image to binary mask
+        return keep[labels].astype(np.int8)
+
     def _transform_single_entry(
         self, entry: BaseDataSetEntry, dataset_properties: dict
     ) -> BaseDataSetEntry:
@@ -105,49 +81,134 @@ class StarDistSegmentationTransform(BaseDataSetTransformation):
             image, show_tile_progress=False, n_tiles=(self._num_tiles, self._num_tiles)
         )
 
-        # We need to disconnect touching labels:
-        labels = get_disconnected(labels)
-
-        if self._probability_threshold is not None:
-            for j in range(len(info["prob"])):
-                if info["prob"][j] < self._probability_threshold:
-                    labels[labels == j + 1] = 0
-
-        # convert label image to binary mask
-        labels = (labels > 0).astype(np.int8)
-
         return BaseDataSetEntry(
-            identifier=entry.identifier, data=labels, metadata=entry.metadata
+            identifier=entry.identifier,
+            data=self._to_binary_mask(labels, info["prob"]),
+            metadata=entry.metadata,
+        )
+
+    def _transform_batch(
+        self, entries: list[BaseDataSetEntry]
+    ) -> list[BaseDataSetEntry]:
+        """
+        Segment several images of the same shape in a single forward pass.
+        Apart from the batched prediction, every image goes through the same
+        steps as in 'predict_instances' (without tiling): reflect padding to
+        the network's divisibility, selection of candidates above the
+        probability threshold (away from the border of the padded prediction
+        and within the image) and sparse non-maximum suppression.
+        """
+
+        model = self._stardist_model
+        config = model.config
+        grid = np.array(config.grid)
+        height, width = entries[0].data.shape
+
+        # the network requires image dimensions divisible by its total downsampling
+        div_by = [
+            pool**config.unet_n_depth * g for pool, g in zip(config.unet_pool, grid)
+        ]
+        pad_height, pad_width = (
+            -size % size_div_by for size, size_div_by in zip((height, width), div_by)
+        )
+        images = np.stack([entry.data for entry in entries])
+        images = np.pad(
+            images, ((0, 0), (0, pad_height), (0, pad_width)), mode="reflect"
         )
 
+        prob, dist = model.keras_model.predict(images[..., np.newaxis], verbose=0)[:2]
+        prob, dist = prob[..., 0], np.maximum(1e-3, dist)
+
+        # candidates at least two grid cells away from the padded border
+        inner = np.zeros(prob.shape[1:], dtype=bool)
+        inner[2:-2, 2:-2] = True
+
+        new_entries = []
+        for entry, entry_prob, entry_dist in zip(entries, prob, dist):
+            candidates = (entry_prob > model.thresholds.prob) & inner
+            points = np.argwhere(candidates) * grid
+            within = np.all(points < (height, width), axis=1)
+
+            points, object_prob, object_dist, _ = non_maximum_suppression_sparse(
+                entry_dist[candidates][within],
+                entry_prob[candidates][within],
+                points[within],
+                nms_thresh=model.thresholds.nms,
+            )
+            labels = polygons_to_label(
+                object_dist, points, prob=object_prob, shape=(height, width)
+            )
+
+            new_entries.append(
+                BaseDataSetEntry(
+                    identifier=entry.identifier,
+                    data=self._to_binary_mask(labels, object_prob),
+                    metadata=entry.metadata,
+                )
+            )
+
+        return new_entries
+
+    def _load_entries(self, dataset: BaseDataSet, buffer: queue.Queue) -> None:
+        """
+        Preprocess entries in the background and hand them over through 'buffer'.
+        'None' marks the end of the dataset, exceptions are passed on. Entries
+        are preprocessed one at a time (as datasets of a single entry), so the
+        preprocessing must not depend on properties of the whole dataset.
+        """
+
+        try:
+            for entry in dataset:
+                frame = BaseDataSet(
+                    ds_metadata=dataset.metadata,
+                    dataset_entries={entry.identifier: entry},
+                )
+                for transformation in self._preprocessing:
+                    frame = transformation(frame)
+                buffer.put(frame[0])
+        except Exception as exception:
+            buffer.put(exception)
+            return
+
+        buffer.put(None)
+
+    def __call__(self, dataset: BaseDataSet) -> BaseDataSet:
+
+        # preprocessing of upcoming entries overlaps with the prediction
+        buffer = queue.Queue(maxsize=2 * self._batch_size)
+        loader = threading.Thread(
+            target=self._load_entries, args=(dataset, buffer), daemon=True
+        )
+        loader.start()
 
-class RemoveSmallObjectsTransform(BaseDataSetTransformation):
-    def __init__(
-        self,
-        min_nuc_area_px2: float,
-    ) -> None:
-        self._min_nuclei_area_px = min_nuc_area_px2
+        new_data_dict = {}
+        batch = []
 
-        super().__init__()
+        while True:
+            entry = buffer.get()
 
-    def _transform_single_entry(
-        self, entry: BaseDataSetEntry, dataset_properties: dict
-    ) -> BaseDataSetEntry:
+            if isinstance(entry, Exception):
+                raise entry
 
-        image = entry.data
+            if entry is not None:
+                batch.append(entry)
 
-        image = (image > 0).astype(np.int8)
+            if batch and (entry is None or len(batch) == self._batch_size):
+                if self._batch_size > 1:
+                    new_entries = self._transform_batch(batch)
+                else:
+                    new_entries = [self._transform_single_entry(batch[0], {})]
 
-        num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(image)
+                for new_entry in new_entries:
+                    new_data_dict[new_entry.identifier] = new_entry
+                batch = []
 
-        for component_idx in range(1, num_labels):
-            if stats[component_idx, 4] < self._min_nuclei_area_px:
-                labels[labels == component_idx] = 0
+            if entry is None:
+                break
 
-        # convert label image to binary mask
-        labels = (labels > 0).astype(np.int8)
+        loader.join()
 
-        return BaseDataSetEntry(identifier=entry.identifier, data=labels)
+        return BaseDataSet(ds_metadata=dataset.metadata, dataset_entries=new_data_dict)
 
 
 if __name__ == "__main__":
@@ -180,10 +241,18 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
+    # has to happen before TensorFlow executes its first operation
+    tf.config.threading.set_intra_op_parallelism_threads(args.cpus)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
     full_config = toml.load(args.dataset_config)
 
     stardist_tiles = full_config["data-preparation"]["stardist_tiles"]
 
+    stardist_batch_size = 1
+    if "stardist_batch_size" in full_config["data-preparation"]:
+        stardist_batch_size = full_config["data-preparation"]["stardist_batch_size"]
+
     stardist_thresh = None
     if "stardist_probality_threshold":
         stardist_thresh = full_config["data-preparation"][
@@ -192,9 +261,6 @@ if __name__ == "__main__":
 
     x = BaseDataSet.from_pickle(args.infile)
 
-    x = GrayScaleTransform()(x)
-    x = MinMaxScaleTransform()(x)
-
     min_nucleus_area_pxsq = args.min_nucleus_area_mumsq / (
         full_config["experimental-parameters"]["mum_per_px"] ** 2
     )
@@ -202,7 +268,11 @@ if __name__ == "__main__":
     x = StarDistSegmentationTransform(
         prob_threshold=stardist_thresh,
         num_tiles=stardist_tiles,
+        batch_size=stardist_batch_size,
+        preprocessing=[GrayScaleNormalizeTransform()],
     )(dataset=x)
-    x = RemoveSmallObjectsTransform(min_nuc_area_px2=min_nucleus_area_pxsq)(dataset=x)
+    x = RemoveSmallObjectsTransform(min_area_px2=min_nucleus_area_pxsq)(
+        dataset=x, cpus=args.cpus
+    )
 
     x.to_pickle(args.outfile)
@@ -15,6 +15,7 @@ process nuclei_segmentation_cellpose {
 
     script:
     """
+    export PYTHONPATH="${moduleDir}/../../../lib:\${PYTHONPATH:-}"
 	 python ${moduleDir}/scripts/nuclei_segmentation_cellpose.py \
         --infile="${fpath}" \
         --outfile="nuclei_segmentation_cellpose.pickle" \
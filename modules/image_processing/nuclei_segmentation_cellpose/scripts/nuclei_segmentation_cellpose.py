@@ -4,60 +4,12 @@ from argparse import ArgumentParser
 import cv2
 import numpy as np
 import toml
+from cellpose import models
+from cellular_dynamics.labels import get_disconnected
+from cellular_dynamics.transformations import RemoveSmallObjectsTransform
 from core_data_utils.datasets import BaseDataSet, BaseDataSetEntry
 from core_data_utils.transformations import BaseDataSetTransformation
-from cellpose import models
-
-
-def get_disconnected(labels):
-    """
-    Disconnect touching regions with different labels (stardist).
-
-    Args:
-        labels (np.array): Label image.
-
-    Returns:
-        (np.array): Disconnected label image.
-    """
-
-    disconnected_labels = labels.copy()
-    all_labels = np.setdiff1d(disconnected_labels, (0,))  # ignore background
-
-    height, width = disconnected_labels.shape
-
-    for cl in all_labels:
-
-        mask = disconnected_labels == cl  # binary object mask
-
-        # check whether there are more than one connected components
-        num_ccs, labelled_ccs, stats, _ = cv2.connectedComponentsWithStats(
-            mask.astype(np.uint8), connectivity=8
-        )
-
-        if num_ccs > 2:
-            # delete all but the largest connected component
-            keep_label = np.argmax(stats[1:, cv2.CC_STAT_AREA]) + 1
-            mask[labelled_ccs != keep_label] = 0
-
-        contours, _ = cv2.findContours(
-            mask.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE
-        )
-
-        assert len(contours) == 1, f"More than one contour found for label {cl}."
-
-        contour_points = contours[0].squeeze()
 
-        for column, row in contour_points:
-            current_neighbors = disconnected_labels[
-                max(0, row - 1) : min(height, row + 2),
-                max(0, column - 1) : min(width, column + 2),
-            ].flatten()
-
-            # only delete pixel if necessary
-            if np.setdiff1d(current_neighbors, (0, cl)).size > 0:
-                disconnected_labels[row, column] = 0
-
-    return disconnected_labels
 
 class CellposeNucleiSegmentation(BaseDataSetTransformation):
     def __init__(self):
@@ -68,49 +20,26 @@ class CellposeNucleiSegmentation(BaseDataSetTransformation):
 
         self._model = models.CellposeModel(gpu=True)
 
-
         super().__init__()
 
-
     def _transform_single_entry(self, entry, dataset_properties):
 
-        masks, _, __ = self._model.eval(entry.data, batch_size=32, flow_threshold=self._flow_threshold, cellprob_threshold=self._cellprob_threshold,
-                                  normalize={"tile_norm_blocksize": self._tile_norm_blocksize})
+        masks, _, __ = self._model.eval(
+            entry.data,
+            batch_size=32,
+            flow_threshold=self._flow_threshold,
+            cellprob_threshold=self._cellprob_threshold,
+            normalize={"tile_norm_blocksize": self._tile_norm_blocksize},
+        )
 
         masks = get_disconnected(masks)
 
         # make mask binary
         masks = (masks > 0).astype(np.uint8)
 
-        return BaseDataSetEntry(identifier=entry.identifier, data=masks, metadata=entry.metadata)
-
-class RemoveSmallObjectsTransform(BaseDataSetTransformation):
-    def __init__(
-        self,
-        min_nuc_area_px2: float,
-    ) -> None:
-        self._min_nuclei_area_px = min_nuc_area_px2
-
-        super().__init__()
-
-    def _transform_single_entry(
-        self, entry: BaseDataSetEntry, dataset_properties: dict
-    ) -> BaseDataSetEntry:
-
-        image = entry.data
-
-        image = (image > 0).astype(np.int8)
-
-        num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(image)
-
-        for component_idx in range(1, num_labels):
-            if stats[component_idx, 4] < self._min_nuclei_area_px:
-                labels[labels == component_idx] = 0
-
-        # convert label image to binary mask
-        labels = (labels > 0).astype(np.int8)
-
-        return BaseDataSetEntry(identifier=entry.identifier, data=labels)
+        return BaseDataSetEntry(
+            identifier=entry.identifier, data=masks, metadata=entry.metadata
+        )
 
 
 if __name__ == "__main__":
@@ -160,6 +89,6 @@ if __name__ == "__main__":
     )
 
     x = CellposeNucleiSegmentation()(dataset=x)
-    x = RemoveSmallObjectsTransform(min_nuc_area_px2=min_nucleus_area_pxsq)(dataset=x)
+    x = RemoveSmallObjectsTransform(min_area_px2=min_nucleus_area_pxsq)(dataset=x)
 
     x.to_pickle(args.outfile)
@@ -12,6 +12,7 @@ process nucleus_displacement_index {
 
     script:
     """
+    export PYTHONPATH="${moduleDir}/../../../lib:\${PYTHONPATH:-}"
 	 python ${moduleDir}/scripts/main.py \
         --labelled_cell_infile=${labelled_cells_ds} \
         --labelled_nuclei_infile=${labelled_nuclei_ds} \
@@ -1,8 +1,8 @@
 import multiprocessing as mp
 from argparse import ArgumentParser
 
-import networkx as nx
 import numpy as np
+from cellular_dynamics.frame_graph import set_node_attributes
 from core_data_utils.datasets import BaseDataSet, BaseDataSetEntry
 from core_data_utils.transformations import BaseMultiDataSetTransformation
 from nucleus_displacement_index import calculate_nusdi_single_frame
@@ -15,13 +15,13 @@ class CalculateNucleusDisplacementIndex(BaseMultiDataSetTransformation):
     ) -> BaseDataSetEntry:
         cell_image: np.array = entry.data["cell_image"]
         nuclei_image: np.array = entry.data["nuclei_image"]
-        graph: np.array = entry.data["graph"]
+        graph = entry.data["graph"]
 
         nusdi_dict: dict[int, float] = calculate_nusdi_single_frame(
             cell_image, nuclei_image, dilate=False
         )
 
-        nx.set_node_attributes(graph, nusdi_dict, "nucleus_displacement_index")
+        set_node_attributes(graph, nusdi_dict, "nucleus_displacement_index")
 
         return BaseDataSetEntry(identifier=entry.identifier, data=graph)
 
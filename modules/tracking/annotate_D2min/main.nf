@@ -16,6 +16,7 @@ process annotate_D2min {
 
     script:
     """
+    export PYTHONPATH="${moduleDir}/../../../lib:\${PYTHONPATH:-}"
 	 python ${moduleDir}/scripts/annotate_D2min.py \
         --infile=${graph_dataset_fpath} \
         --outfile="D2min_annotated_graphs.pickle" \
@@ -1,150 +1,149 @@
+import multiprocessing as mp
 from argparse import ArgumentParser
-from copy import deepcopy
 from typing import Any, Optional
 
-import networkx as nx
 import numpy as np
 import toml
+from cellular_dynamics.frame_graph import pad_adjacency, set_node_column
+from cellular_dynamics.parallel import map_frames
+from cellular_dynamics.tracking import NO_OBJECT, TrackIndex, lag_time_arrays
 from core_data_utils.datasets import BaseDataSet
-from scipy.optimize import minimize
-from tqdm import trange
-
-
-def get_object_positions(graph_ds, node_label, sindex, prefix="cell"):
-    node_x = graph_ds[sindex].data.nodes[node_label][f"{prefix}_centroid_x"]
-    node_y = graph_ds[sindex].data.nodes[node_label][f"{prefix}_centroid_y"]
-
-    position_vector = np.array([node_x, node_y])
-    position_vector = position_vector[
-        np.newaxis, :
-    ]  # always return vector of shape (1,2)
-    return position_vector
-
-
-def get_future_label(
-    graph_ds: BaseDataSet, node_label: int, lag_time_frames: int, sindex: int
-) -> int | None:
-
-    if sindex + lag_time_frames + 1 >= len(graph_ds):
-        return None
-    if lag_time_frames == 0:
-        return node_label
-
-    current_label = node_label
-    for i in range(lag_time_frames):
-        nprops = graph_ds[sindex + i].data.nodes[current_label]
-        if "next_object_id" not in nprops:
-            return None
-        current_label = nprops["next_object_id"]
-
-    return current_label
 
 
 class D2minAnnotationTransformation:
     def __init__(
-        self, mum_per_px: float, lag_time_frames: int, mininum_neighbors: int
+        self, mum_per_px: float, lag_times_frames: list[int], mininum_neighbors: int
     ) -> None:
         self._mum_per_px = mum_per_px
-        self._lag_time_frames = lag_time_frames
+        self._lag_times_frames = lag_times_frames
         self._minimum_neighbors = mininum_neighbors
 
     @staticmethod
-    def _calc_D2min(strain_tensor, dij_now, dij_future) -> float:
-
-        # dij_now: array of shape (N, 2)
-        # dij_future array of shape (N,2)
-
-        assert dij_now.shape[0] == dij_future.shape[0]
-        assert dij_now.shape[1] == 2
-        assert dij_future.shape[1] == 2
-
-        strain_tensor = np.reshape(strain_tensor, (2, 2))
-        diff = dij_future - (dij_now @ strain_tensor.T)  # diff has shape (N, 2)
-
-        assert diff.shape[0] == dij_now.shape[0]
-        assert diff.shape[1] == 2
-        return (diff**2).sum(axis=1).mean()
-
-    def _annotate_single_node(
-        self,
-        graph_dataset: BaseDataSet,
-        node_label: int,
-        sindex: int,
-        lag_time_frames: int,
-    ):
-
-        future_own_label = get_future_label(
-            graph_dataset, node_label, lag_time_frames=lag_time_frames, sindex=sindex
+    def calculate_D2min(
+        dij_now: np.ndarray, dij_future: np.ndarray, num_neighbors: np.ndarray
+    ) -> np.ndarray:
+        """
+        Calculate D2min for a batch of nodes.
+
+        D2min is the mean squared residual of the best affine approximation
+        'dij_future ~ dij_now @ J.T' of the neighbor displacements. 'J.T' is the
+        least-squares solution of the 2x2 normal equations
+        (dij_now.T @ dij_now) J.T = dij_now.T @ dij_future, solved via the
+        pseudo-inverse for degenerate (e.g. collinear) neighborhoods.
+
+        Args:
+            dij_now (np.ndarray): (M, K, 2) current neighbor offsets, rows of
+                missing neighbors are zero.
+            dij_future (np.ndarray): (M, K, 2) future neighbor offsets, rows of
+                missing neighbors are zero.
+            num_neighbors (np.ndarray): (M,) number of neighbors of every node.
+
+        Returns:
+            (np.ndarray): (M,) D2min values (in squared pixels).
+        """
+
+        normal_matrix = np.einsum("nki,nkj->nij", dij_now, dij_now)
+        moment_matrix = np.einsum("nki,nkj->nij", dij_now, dij_future)
+
+        strain_tensor_T = np.linalg.pinv(normal_matrix) @ moment_matrix
+
+        diff = dij_future - dij_now @ strain_tensor_T  # zero for missing neighbors
+
+        return (diff**2).sum(axis=(1, 2)) / num_neighbors
+
+    def _annotate_frame(
+        self, frame: int, arrays: dict[str, np.ndarray]
+    ) -> list[np.ndarray]:
+        """
+        Calculate D2min of all nodes of 'frame' for all lag times, from the
+        arrays built by 'lag_time_arrays'.
+        """
+
+        start, stop = arrays["node_offsets"][frame : frame + 2]
+        positions = arrays["positions"]
+
+        # current neighbor offsets are shared by all lag times
+        indptr = arrays["indptr"][start : stop + 1]
+        neighbors = pad_adjacency(
+            indptr - indptr[0], arrays["indices"][indptr[0] : indptr[-1]]
         )
+        existing_neighbors = neighbors != NO_OBJECT
+        current_offsets = positions[neighbors] - positions[start:stop, np.newaxis]
 
-        if future_own_label is None:
-            return np.nan
+        D2min_values = []
 
-        current_own_position = get_object_positions(
-            graph_dataset, node_label, sindex=sindex
-        )
-        future_own_position = get_object_positions(
-            graph_dataset, future_own_label, sindex=sindex + lag_time_frames
-        )
-        neighbor_current_positions = []
-        neighbor_future_positions = []
+        for lag_index in range(len(self._lag_times_frames)):
+            D2min = np.full(stop - start, np.nan)
+            D2min_values.append(D2min)
 
-        for nb in nx.neighbors(graph_dataset[sindex].data, node_label):
-            future_nb_label = get_future_label(
-                graph_dataset, nb, lag_time_frames, sindex
-            )
-            if future_nb_label is not None:
-                neighbor_current_positions.append(
-                    get_object_positions(graph_dataset, nb, sindex=sindex)
-                )
-                neighbor_future_positions.append(
-                    get_object_positions(
-                        graph_dataset, future_nb_label, sindex=sindex + lag_time_frames
-                    )
-                )
-
-        if len(neighbor_current_positions) <= self._minimum_neighbors:
-            return np.nan
-
-        neighbor_current_positions = np.vstack(neighbor_current_positions)
-        neighbor_future_positions = np.vstack(neighbor_future_positions)
-
-        dij_now = neighbor_current_positions - current_own_position
-        dij_future = neighbor_future_positions - future_own_position
-
-        min_result = minimize(
-            D2minAnnotationTransformation._calc_D2min,
-            x0=np.eye(2).reshape((4,)),
-            args=(dij_now, dij_future),
-            tol=1e-3,
-        )
-        if not min_result.success:
-            return np.nan
+            future_nodes = arrays["future_nodes"][lag_index]
+            if np.all(future_nodes[start:stop] == NO_OBJECT):
+                continue
 
-        D2min = min_result.fun.item() * (self._mum_per_px**2)
+            # only neighbors tracked until the future frame are taken into account
+            future_neighbors = np.where(
+                existing_neighbors, future_nodes[neighbors], NO_OBJECT
+            )
+            valid_neighbors = future_neighbors != NO_OBJECT
+            num_neighbors = valid_neighbors.sum(axis=1)
 
-        return D2min
+            nodes = np.flatnonzero(
+                (future_nodes[start:stop] != NO_OBJECT)
+                & (num_neighbors > self._minimum_neighbors)
+            )
+            mask = valid_neighbors[nodes, :, np.newaxis]
+
+            dij_now = np.where(mask, current_offsets[nodes], 0.0)
+            dij_future = np.where(
+                mask,
+                positions[future_neighbors[nodes]]
+                - positions[future_nodes[start + nodes], np.newaxis],
+                0.0,
+            )
 
-    def __call__(self, graph_dataset, property_suffix: Optional[str] = None) -> Any:
+            D2min[nodes] = (
+                self.calculate_D2min(dij_now, dij_future, num_neighbors[nodes])
+                * self._mum_per_px**2
+            )
 
-        psuff = "" if property_suffix is None else property_suffix
-        graph_dataset = deepcopy(graph_dataset)
+        return D2min_values
 
-        for sindex in trange(len(graph_dataset)):
-            for nodeid, nodeprops in graph_dataset[sindex].data.nodes(data=True):
-                current_D2min = self._annotate_single_node(
-                    graph_dataset=graph_dataset,
-                    node_label=nodeid,
-                    sindex=sindex,
-                    lag_time_frames=self._lag_time_frames,
-                )
+    def __call__(
+        self,
+        graph_dataset,
+        track_index: TrackIndex,
+        property_suffixes: list[Optional[str]],
+        cpus: int = 1,
+        copy_dataset: bool = False,
+    ) -> Any:
+
+        property_names = [
+            f"D2min_{'' if suffix is None else suffix}" for suffix in property_suffixes
+        ]
+        # new properties are collected per frame and written at the end, the
+        # dataset is only copied if requested
+        if copy_dataset:
+            graph_dataset = graph_dataset.copy()
+        graphs = [entry.data for entry in graph_dataset]
+
+        frame_values = map_frames(
+            self._annotate_frame,
+            len(graphs),
+            lag_time_arrays(graphs, track_index, self._lag_times_frames),
+            cpus=cpus,
+        )
 
-                nodeprops[f"D2min_{psuff}"] = current_D2min
+        for graph, D2min_values in zip(graphs, frame_values):
+            for property_name, D2min in zip(property_names, D2min_values, strict=True):
+                set_node_column(graph, property_name, D2min)
 
         return graph_dataset
 
 
 if __name__ == "__main__":
+
+    mp.set_start_method("spawn")
+
     parser = ArgumentParser()
 
     parser.add_argument(
@@ -193,12 +192,17 @@ if __name__ == "__main__":
     lag_times_frames = [int(lt / delta_t_minutes) for lt in lag_times_minutes]
 
     x = BaseDataSet.from_pickle(args.infile)
-
-    for lt_frames, lt_minutes in zip(lag_times_frames, lag_times_minutes, strict=True):
-        x = D2minAnnotationTransformation(
-            mum_per_px=mum_per_px,
-            lag_time_frames=lt_frames,
-            mininum_neighbors=args.minimum_neighbors,
-        )(x, property_suffix=f"{lt_minutes}_minutes")
+    track_index = TrackIndex.from_dataset(x)
+
+    x = D2minAnnotationTransformation(
+        mum_per_px=mum_per_px,
+        lag_times_frames=lag_times_frames,
+        mininum_neighbors=args.minimum_neighbors,
+    )(
+        x,
+        track_index,
+        property_suffixes=[f"{lt_minutes}_minutes" for lt_minutes in lag_times_minutes],
+        cpus=args.cpus,
+    )
 
     x.to_pickle(args.outfile)
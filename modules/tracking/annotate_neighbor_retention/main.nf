@@ -14,6 +14,7 @@ process annotate_neighbor_retention {
 
     script:
     """
+    export PYTHONPATH="${moduleDir}/../../../lib:\${PYTHONPATH:-}"
 	 python ${moduleDir}/scripts/annotate_neighbor_retention.py \
         --infile=${graph_dataset_fpath} \
         --outfile="neighbor_retention_graph_ds.pickle" \
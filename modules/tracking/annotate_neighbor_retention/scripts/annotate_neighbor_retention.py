@@ -1,111 +1,158 @@
+import multiprocessing as mp
 from argparse import ArgumentParser
-from copy import deepcopy
 from typing import Any, Optional
 
-import networkx as nx
 import numpy as np
+from cellular_dynamics.frame_graph import set_node_column
+from cellular_dynamics.parallel import map_frames
+from cellular_dynamics.tracking import NO_OBJECT, TrackIndex, lag_time_arrays
 from core_data_utils.datasets import BaseDataSet
-from tqdm import trange
-
-
-def get_neighbor_list(G: nx.Graph, node: int) -> list[int]:
-    return list(G.neighbors(node))
-
-
-def get_future_label(
-    graph_ds: BaseDataSet, node_label: int, lag_time_frames: int, sindex: int
-) -> int | None:
-
-    if sindex + lag_time_frames + 1 >= len(graph_ds):
-        return None
-    if lag_time_frames == 0:
-        return node_label
-
-    current_label = node_label
-    for i in range(lag_time_frames):
-        nprops = graph_ds[sindex + i].data.nodes[current_label]
-        if "next_object_id" not in nprops:
-            return None
-        current_label = nprops["next_object_id"]
-
-    return current_label
 
 
 class NeighborRetentionTransformation:
 
-    def __init__(self, lag_time_frames: int) -> None:
-        self._lag_time_frames = lag_time_frames
+    def __init__(self, lag_times_frames: list[int]) -> None:
+        self._lag_times_frames = lag_times_frames
 
     @staticmethod
-    def get_neighbor_retention_fraction(
-        graph_ds: BaseDataSet, node_label: int, lag_time_frames: int, sindex: int
-    ) -> float:
-
-        if sindex + lag_time_frames + 1 >= len(graph_ds):
-            return np.nan
-        if lag_time_frames == 0:
-            return 1.0
-
-        future_own_label = get_future_label(
-            graph_ds=graph_ds,
-            sindex=sindex,
-            node_label=node_label,
-            lag_time_frames=lag_time_frames,
+    def calculate_neighbor_retention(
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        future_indptr: np.ndarray,
+        future_indices: np.ndarray,
+        future_nodes: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Calculate the fraction of neighbors which are still neighbors after the
+        lag time for all nodes of a frame. The edges of the current frame are
+        pushed forward along the tracks and joined with the edges of the
+        future frame.
+
+        Args:
+            indptr (np.ndarray): CSR index pointer of the current frame.
+            indices (np.ndarray): CSR neighbors of the current frame.
+            future_indptr (np.ndarray): CSR index pointer of the future frame.
+            future_indices (np.ndarray): CSR neighbors of the future frame.
+            future_nodes (np.ndarray): Future node of every node, NO_OBJECT (-1)
+                for nodes which are not tracked until the future frame.
+
+        Returns:
+            (np.ndarray): Neighbor retention of every node, NaN for nodes which
+                are not tracked or have no neighbors.
+        """
+
+        num_nodes = len(indptr) - 1
+        num_future_nodes = len(future_indptr) - 1
+        degree = np.diff(indptr)
+
+        # push edges forward
+        sources = np.repeat(np.arange(num_nodes), degree)
+        future_sources = future_nodes[sources]
+        future_targets = future_nodes[indices]
+        tracked = (future_sources != NO_OBJECT) & (future_targets != NO_OBJECT)
+
+        edge_keys = future_sources[tracked] * num_future_nodes + future_targets[tracked]
+        future_edge_keys = (
+            np.repeat(np.arange(num_future_nodes), np.diff(future_indptr))
+            * num_future_nodes
+            + future_indices
         )
 
-        if future_own_label is None:
-            return np.nan
-
-        current_neighbors = get_neighbor_list(graph_ds[sindex].data, node_label)
-        if len(current_neighbors) == 0:
-            return np.nan
-
-        # push neighbors forward
-        future_current_neighbors = []
-
-        for nb in current_neighbors:
-            flabel = get_future_label(
-                graph_ds=graph_ds,
-                sindex=sindex,
-                node_label=nb,
-                lag_time_frames=lag_time_frames,
-            )
-            if flabel is not None:
-                future_current_neighbors.append(flabel)
-
-        true_future_neighbors = get_neighbor_list(
-            graph_ds[sindex + lag_time_frames].data, future_own_label
+        retained_neighbors = np.bincount(
+            sources[tracked][np.isin(edge_keys, future_edge_keys)],
+            minlength=num_nodes,
         )
-        retained_neighbors = 0
 
-        for fnb in future_current_neighbors:
-            if fnb in true_future_neighbors:
-                retained_neighbors += 1
+        retention = np.full(num_nodes, np.nan)
+        valid = (future_nodes != NO_OBJECT) & (degree > 0)
+        retention[valid] = retained_neighbors[valid] / degree[valid]
+
+        return retention
+
+    def _annotate_frame(
+        self, frame: int, arrays: dict[str, np.ndarray]
+    ) -> list[np.ndarray]:
+        """
+        Calculate the neighbor retention of all nodes of 'frame' for all lag
+        times, from the arrays built by 'lag_time_arrays'.
+        """
+
+        node_offsets = arrays["node_offsets"]
+        num_frames = len(node_offsets) - 1
+        start, stop = node_offsets[frame : frame + 2]
+
+        retention_values = []
+
+        for lag_index, lag_time_frames in enumerate(self._lag_times_frames):
+            if frame + lag_time_frames + 1 >= num_frames:
+                retention_values.append(np.full(stop - start, np.nan))
+                continue
+            if lag_time_frames == 0:
+                retention_values.append(np.ones(stop - start))
+                continue
+
+            future_start, future_stop = node_offsets[
+                frame + lag_time_frames : frame + lag_time_frames + 2
+            ]
+
+            # frame-local node positions
+            future_nodes = arrays["future_nodes"][lag_index, start:stop]
+            future_nodes = np.where(
+                future_nodes != NO_OBJECT, future_nodes - future_start, NO_OBJECT
+            )
+            indptr = arrays["indptr"][start : stop + 1]
+            future_indptr = arrays["indptr"][future_start : future_stop + 1]
+
+            retention_values.append(
+                self.calculate_neighbor_retention(
+                    indptr - indptr[0],
+                    arrays["indices"][indptr[0] : indptr[-1]] - start,
+                    future_indptr - future_indptr[0],
+                    arrays["indices"][future_indptr[0] : future_indptr[-1]]
+                    - future_start,
+                    future_nodes,
+                )
+            )
 
-        return retained_neighbors / len(current_neighbors)
+        return retention_values
 
     def __call__(
-        self, graph_ds: BaseDataSet, property_suffix: Optional[str] = None
+        self,
+        graph_ds: BaseDataSet,
+        track_index: TrackIndex,
+        property_suffixes: list[Optional[str]],
+        cpus: int = 1,
+        copy_dataset: bool = False,
     ) -> Any:
 
-        graph_ds = deepcopy(graph_ds)
-        suff = "" if property_suffix is None else property_suffix
-
-        for i in trange(len(graph_ds)):
-            for node, nodeprops in graph_ds[i].data.nodes(data=True):
-                nodeprops[f"neighbor_retention_{suff}"] = (
-                    NeighborRetentionTransformation.get_neighbor_retention_fraction(
-                        graph_ds=graph_ds,
-                        node_label=node,
-                        lag_time_frames=self._lag_time_frames,
-                        sindex=i,
-                    )
-                )
+        property_names = [
+            f"neighbor_retention_{'' if suffix is None else suffix}"
+            for suffix in property_suffixes
+        ]
+        if copy_dataset:
+            graph_ds = graph_ds.copy()
+        graphs = [entry.data for entry in graph_ds]
+
+        frame_values = map_frames(
+            self._annotate_frame,
+            len(graphs),
+            lag_time_arrays(graphs, track_index, self._lag_times_frames),
+            cpus=cpus,
+        )
+
+        for graph, retention_values in zip(graphs, frame_values):
+            for property_name, retention in zip(
+                property_names, retention_values, strict=True
+            ):
+                set_node_column(graph, property_name, retention)
 
         return graph_ds
 
 
 if __name__ == "__main__":
+
+    mp.set_start_method("spawn")
+
     parser = ArgumentParser()
 
     parser.add_argument(
@@ -147,10 +194,13 @@ if __name__ == "__main__":
     lag_times_frames = [int(lt / args.delta_t_minutes) for lt in lag_times_minutes]
 
     x = BaseDataSet.from_pickle(args.infile)
+    track_index = TrackIndex.from_dataset(x)
 
-    for lt_frames, lt_minutes in zip(lag_times_frames, lag_times_minutes, strict=True):
-        x = NeighborRetentionTransformation(lt_frames)(
-            x, property_suffix=f"{lt_minutes}_minutes"
-        )
+    x = NeighborRetentionTransformation(lag_times_frames)(
+        x,
+        track_index,
+        property_suffixes=[f"{lt_minutes}_minutes" for lt_minutes in lag_times_minutes],
+        cpus=args.cpus,
+    )
 
     x.to_pickle(args.outfile)
@@ -16,6 +16,7 @@ process assemble_cell_track_dataframe {
 
     script:
     """
+    export PYTHONPATH="${moduleDir}/../../../lib:\${PYTHONPATH:-}"
 	 python ${moduleDir}/scripts/assemble_tracking_df.py \
         --infile=${graph_dataset_fpath} \
         --outfile="cell_tracks.ipc" \
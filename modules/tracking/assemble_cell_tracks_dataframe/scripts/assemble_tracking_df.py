@@ -1,11 +1,12 @@
 from argparse import ArgumentParser
-from collections import defaultdict
 from typing import Iterable, Optional
 
+import numpy as np
 import polars as pl
 import toml
+from cellular_dynamics.frame_graph import AttributeTable, node_attribute_table
+from cellular_dynamics.tracking import TrackIndex
 from core_data_utils.datasets import BaseDataSet
-from tqdm import trange
 
 
 class CellTrackAssembler:
@@ -16,8 +17,6 @@ class CellTrackAssembler:
         include_attr: Optional[Iterable[str]] = None,
         exclude_attr: Optional[Iterable[str]] = None,
     ) -> None:
-        self._seen_node_ids = defaultdict(list)
-        self._current_track_id: int = 1
 
         if (include_attr is not None) and (exclude_attr is not None):
             raise ValueError("Cannot specify both 'include_attrs' and 'exclude_attr'.")
@@ -26,102 +25,119 @@ class CellTrackAssembler:
         self._attributes_to_include = include_attr
         self._attributes_to_exclude = exclude_attr
 
-    def _extract_properties(self, properties: dict) -> dict:
+    def _extract_attribute_names(self, names: list[str]) -> list[str]:
         """
-        Function for extracting properties according to
+        Function for extracting attribute names according to
             'self._attributes_to_include' and 'self._attributes_to_exclude'
         Args:
-            properties (dict): Node property dictionary from which attributes
-                should be extracted
+            names (list[str]): Names of all node attributes
         Returns:
-            (dict): dictionary containing the relevant properties as specified
+            (list[str]): names of the relevant attributes as specified
                 via include_attrs and exclude_attrs
         """
 
         if self._attributes_to_include is not None:
-            return {
-                k: v for k, v in properties.items() if k in self._attributes_to_include
-            }
+            return [name for name in names if name in self._attributes_to_include]
         if self._attributes_to_exclude is not None:
-            return {
-                k: v
-                for k, v in properties.items()
-                if k not in self._attributes_to_exclude
-            }
+            return [name for name in names if name not in self._attributes_to_exclude]
         # both are None, that means return everything!
-        return properties
+        return names
 
-    def _get_node_information(
-        self,
-        graph_dataset: BaseDataSet,
-        cindex: int,
-        node_label: int,
-        track_time_index: int,
-    ) -> dict:
-        cgraph = graph_dataset[cindex].data
-        cprops = cgraph.nodes[node_label]
-
-        df_columns = self._extract_properties(cprops)
-
-        df_columns["track_id"] = self._current_track_id
-        df_columns["object_id"] = node_label
-        df_columns["image_id"] = graph_dataset[cindex].identifier
-        df_columns["frame_id"] = cindex
-        df_columns["track_relative_time_minutes"] = (
-            track_time_index * self._delta_t_minutes
-        )
+    @staticmethod
+    def _attribute_column(
+        tables: list[AttributeTable], name: str, rows: np.ndarray
+    ) -> pl.Series:
+        """
+        Build the column of attribute 'name' from the node attribute tables of
+        all frames. 'rows' selects the nodes (numbered consecutively over all
+        frames) in row order. Nodes without a value become null.
+        """
 
-        next_object_id = (
-            cprops["next_object_id"] if "next_object_id" in cprops else None
+        template = next(
+            table.column(name, default=0) for table in tables if name in table
         )
-        self._seen_node_ids[cindex].append(node_label)
-
-        return df_columns, next_object_id
-
-    def _track_single_node(
-        self, tds: BaseDataSet, sindex: int, node_label: int
-    ) -> list[dict]:
-        new_df_rows: list[dict] = []
 
-        assert node_label not in self._seen_node_ids[sindex]
-
-        track_time_index = 0
-        current_props, nobj_id = self._get_node_information(
-            tds, sindex, node_label=node_label, track_time_index=track_time_index
-        )
-        current_props["starting_frame"] = sindex
-        new_df_rows.append(current_props)
-
-        while nobj_id is not None:
-            track_time_index += 1
-            current_props, nobj_id = self._get_node_information(
-                tds,
-                sindex + track_time_index,
-                node_label=nobj_id,
-                track_time_index=track_time_index,
+        values = np.concatenate(
+            [
+                (
+                    table.column(name, default=0)
+                    if name in table
+                    else np.zeros((len(table),) + template.shape[1:], template.dtype)
+                )
+                for table in tables
+            ]
+        )[rows]
+        present = np.concatenate([table.present(name) for table in tables])[rows]
+
+        if values.dtype == object:
+            return pl.Series(
+                name,
+                [
+                    value if is_present else None
+                    for value, is_present in zip(values.tolist(), present.tolist())
+                ],
             )
-            current_props["starting_frame"] = sindex
-            new_df_rows.append(current_props)
 
-        self._current_track_id += 1
-        return new_df_rows
+        series = pl.Series(name, values)
+        # per-node arrays are stored as lists of their rows
+        if values.ndim > 2:
+            series = series.cast(pl.List(series.dtype.inner))
+        if not np.all(present):
+            series = series.scatter(np.flatnonzero(~present), None)
+
+        return series
 
     def __call__(self, tracked_cell_graph_ds: BaseDataSet) -> pl.DataFrame:
 
-        df_rows: list[dict] = []
+        track_index = TrackIndex.from_dataset(tracked_cell_graph_ds)
+        tables = [node_attribute_table(entry.data) for entry in tracked_cell_graph_ds]
 
-        for sindex in trange(len(tracked_cell_graph_ds)):
-            current_graph = tracked_cell_graph_ds[sindex].data
-            for nodeid in current_graph.nodes:
-                if nodeid not in self._seen_node_ids[sindex]:
-                    nrows = self._track_single_node(
-                        tracked_cell_graph_ds, sindex, nodeid
-                    )
+        node_offsets = np.zeros(len(tables) + 1, dtype=np.int64)
+        np.cumsum([len(table) for table in tables], out=node_offsets[1:])
 
-                    assert len(nrows) >= 1  # at least return current information
+        # one row per (track, frame), tracks in order of their first appearance;
+        # merged tracks each contain the nodes after the merge
+        track_frames = track_index.track_frames
+        rows = node_offsets[track_frames] + track_index.track_positions
+        track_starts = np.repeat(track_index.track_starts, track_index.track_lengths)
+
+        attribute_names = self._extract_attribute_names(
+            list(dict.fromkeys(name for table in tables for name in table.names))
+        )
 
-                    df_rows.extend(nrows)
-        return pl.DataFrame(df_rows)
+        columns = [
+            self._attribute_column(tables, name, rows) for name in attribute_names
+        ]
+        columns += [
+            pl.Series(
+                "track_id",
+                np.repeat(
+                    np.arange(1, track_index.num_tracks + 1),
+                    track_index.track_lengths,
+                ),
+            ),
+            pl.Series(
+                "object_id",
+                np.concatenate(
+                    [
+                        track_index.node_ids(frame)
+                        for frame in range(track_index.num_frames)
+                    ]
+                    + [np.empty(0, dtype=np.int64)]
+                )[rows],
+            ),
+            pl.Series(
+                "image_id", [entry.identifier for entry in tracked_cell_graph_ds]
+            ).gather(track_frames),
+            pl.Series("frame_id", track_frames),
+            pl.Series(
+                "track_relative_time_minutes",
+                (track_frames - track_starts) * self._delta_t_minutes,
+            ),
+            pl.Series("starting_frame", track_starts),
+        ]
+
+        return pl.DataFrame(columns)
 
 
 if __name__ == "__main__":
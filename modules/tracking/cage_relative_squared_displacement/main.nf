@@ -14,6 +14,7 @@ process cage_relative_squared_displacement {
 
     script:
     """
+    export PYTHONPATH="${moduleDir}/../../../lib:\${PYTHONPATH:-}"
 	 python ${moduleDir}/scripts/main.py \
             --infile=${graph_dataset_fpath} \
             --outfile="crsd_annotated_graphs.pickle" \
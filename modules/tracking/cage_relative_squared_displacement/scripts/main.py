@@ -1,158 +1,177 @@
+import multiprocessing as mp
 from argparse import ArgumentParser
 from typing import Optional
 
-import networkx as nx
 import numpy as np
 import toml
+from cellular_dynamics.frame_graph import set_node_column
+from cellular_dynamics.parallel import map_frames
+from cellular_dynamics.tracking import NO_OBJECT, TrackIndex, lag_time_arrays
 from core_data_utils.datasets import BaseDataSet
-from tqdm import trange
-
-
-def get_object_positions(graph_ds, node_label, sindex, prefix="cell"):
-    node_x = graph_ds[sindex].data.nodes[node_label][f"{prefix}_centroid_x"]
-    node_y = graph_ds[sindex].data.nodes[node_label][f"{prefix}_centroid_y"]
-
-    position_vector = np.array([node_x, node_y])
-    position_vector = position_vector[
-        np.newaxis, :
-    ]  # always return vector of shape (1,2)
-    return position_vector
-
-
-def get_future_node(
-    graph_ds: BaseDataSet, node_label: int, lag_time_frames: int, sindex: int
-) -> tuple[int, dict] | tuple[None, None]:
-
-    if sindex + lag_time_frames + 1 >= len(graph_ds):
-        return None, None
-    if lag_time_frames == 0:
-        return node_label, graph_ds[sindex].data.nodes[node_label]
-
-    current_label = node_label
-
-    for i in range(lag_time_frames):
-        nprops = graph_ds[sindex + i].data.nodes[current_label]
-        if "next_object_id" not in nprops:
-            return None, None
-        current_label = nprops["next_object_id"]
-
-    return current_label, graph_ds[sindex + lag_time_frames].data.nodes[current_label]
 
 
 class CageRelativeSquaredDisplacementTransformation:
     def __init__(
         self,
         mum_per_px: float,
-        lag_time_frames: int,
-        property_suffix: str,
+        lag_times_frames: list[int],
+        property_suffixes: list[str],
         property_string: Optional[str] = None,
     ) -> None:
+        if len(lag_times_frames) != len(property_suffixes):
+            raise ValueError(
+                "'lag_times_frames' and 'property_suffixes' must have the same length"
+            )
+
         self._mum_per_px = mum_per_px
-        self._lag_time_frames = lag_time_frames
-        self._property_suffix = property_suffix
+        self._lag_times_frames = lag_times_frames
+        self._property_suffixes = property_suffixes
         self._property_string = (
             property_string
             if property_string is not None
             else "cage_relative_squared_displacement_mum_squared_"
         )
-        self._full_property_string = f"{self._property_string}{self._property_suffix}"
-
-    def crsd(
-        self,
-        current_position,
-        future_position,
-        neighbors_current_pos,
-        neighbors_future_pos,
-    ) -> float:
-
-        if (neighbors_current_pos is None) and (neighbors_future_pos is None):
-            return (np.linalg.norm(future_position - current_position) ** 2) * (
-                self._mum_per_px**2
-            )
-
-        if (neighbors_current_pos is None) ^ (neighbors_future_pos is None):
-            raise ValueError(
-                "'neighbors_current_pos' and 'neighbors_future_pos' must be either both None or both not None"
-            )
-
-        node_displacement = future_position - current_position  # (1,2)
-        neighbors_displacement = neighbors_future_pos - neighbors_current_pos  # (n,2)
-
-        mean_neighbor_displacement = np.mean(neighbors_displacement, axis=0)  # (1,2)
-
-        return (np.linalg.norm(node_displacement - mean_neighbor_displacement) ** 2) * (
-            self._mum_per_px**2
+        self._full_property_strings = [
+            f"{self._property_string}{suffix}" for suffix in self._property_suffixes
+        ]
+
+    @staticmethod
+    def calculate_crsd(
+        positions: np.ndarray,
+        future_positions: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        future_nodes: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Calculate the cage relative squared displacement (in squared pixels)
+        of all nodes of a frame, i.e. the squared norm of the displacement of
+        a node minus the mean displacement of its neighbors. Only neighbors
+        tracked until the future frame are taken into account, for nodes
+        without such neighbors this is the plain squared displacement.
+
+        Args:
+            positions (np.ndarray): (N, 2) positions in the current frame.
+            future_positions (np.ndarray): (M, 2) positions in the future frame.
+            indptr (np.ndarray): CSR index pointer of the current frame.
+            indices (np.ndarray): CSR neighbors of the current frame.
+            future_nodes (np.ndarray): Future node of every node, NO_OBJECT (-1)
+                for nodes which are not tracked until the future frame.
+
+        Returns:
+            (np.ndarray): CRSD of every node, NaN for nodes which are not
+                tracked.
+        """
+
+        num_nodes = len(positions)
+        tracked = future_nodes != NO_OBJECT
+
+        displacements = np.zeros((num_nodes, 2))
+        displacements[tracked] = (
+            future_positions[future_nodes[tracked]] - positions[tracked]
         )
 
-    def crsd_single_node(self, graph_ds, node_label, sindex) -> float:
-        current_own_position = get_object_positions(
-            graph_ds, node_label, sindex, prefix="cell"
-        )
+        # mean displacement of the tracked neighbors (segment means over CSR rows)
+        sources = np.repeat(np.arange(num_nodes), np.diff(indptr))
+        tracked_edges = tracked[indices]
+        sources, targets = sources[tracked_edges], indices[tracked_edges]
+
+        num_tracked_neighbors = np.bincount(sources, minlength=num_nodes)
+        mean_neighbor_displacements = np.zeros((num_nodes, 2))
+        has_neighbors = num_tracked_neighbors > 0
+        for axis in range(2):
+            mean_neighbor_displacements[has_neighbors, axis] = (
+                np.bincount(
+                    sources, weights=displacements[targets, axis], minlength=num_nodes
+                )[has_neighbors]
+                / num_tracked_neighbors[has_neighbors]
+            )
 
-        future_own_label, future_own_props = get_future_node(
-            graph_ds, node_label, self._lag_time_frames, sindex
+        crsd = np.full(num_nodes, np.nan)
+        crsd[tracked] = np.sum(
+            (displacements[tracked] - mean_neighbor_displacements[tracked]) ** 2,
+            axis=1,
         )
 
-        if future_own_label is None:
-            return np.nan
-
-        future_own_position = np.array(
-            (future_own_props["cell_centroid_x"], future_own_props["cell_centroid_y"])
-        )[np.newaxis, :]
-
-        neighbors_current_positions = []
-        neighbors_future_positions = []
-
-        for nb in nx.neighbors(graph_ds[sindex].data, node_label):
-            future_nb_label, future_nb_props = get_future_node(
-                graph_ds, nb, self._lag_time_frames, sindex
-            )
-
-            if future_nb_label is not None:
-                neighbors_current_positions.append(
-                    get_object_positions(graph_ds, nb, sindex, prefix="cell")
+        return crsd
+
+    def _annotate_frame(
+        self, frame: int, arrays: dict[str, np.ndarray]
+    ) -> list[np.ndarray]:
+        """
+        Calculate the CRSD of all nodes of 'frame' for all lag times, from the
+        arrays built by 'lag_time_arrays'.
+        """
+
+        node_offsets = arrays["node_offsets"]
+        start, stop = node_offsets[frame : frame + 2]
+        positions = arrays["positions"]
+
+        indptr = arrays["indptr"][start : stop + 1]
+        indices = arrays["indices"][indptr[0] : indptr[-1]] - start
+
+        crsd_values = []
+
+        for lag_index, lag_time_frames in enumerate(self._lag_times_frames):
+            future_nodes = arrays["future_nodes"][lag_index, start:stop]
+
+            if np.all(future_nodes == NO_OBJECT):
+                crsd_values.append(np.full(stop - start, np.nan))
+                continue
+
+            future_start, future_stop = node_offsets[
+                frame + lag_time_frames : frame + lag_time_frames + 2
+            ]
+
+            crsd_values.append(
+                self.calculate_crsd(
+                    positions[start:stop],
+                    positions[future_start:future_stop],
+                    indptr - indptr[0],
+                    indices,
+                    np.where(
+                        future_nodes != NO_OBJECT,
+                        future_nodes - future_start,
+                        NO_OBJECT,
+                    ),
                 )
-                neighbors_future_positions.append(
-                    np.array(
-                        (
-                            future_nb_props["cell_centroid_x"],
-                            future_nb_props["cell_centroid_y"],
-                        )
-                    )[np.newaxis, :]
-                )
-
-        assert len(neighbors_current_positions) == len(neighbors_future_positions)
-
-        # if there are no neighbors or no neighbors were tracked long enough we
-        # return the squared distance between the current and future position
-        if len(neighbors_current_positions) == 0:
-            return self.crsd(current_own_position, future_own_position, None, None)
+                * self._mum_per_px**2
+            )
 
-        neighbors_current_positions = np.vstack(neighbors_current_positions)
-        neighbors_future_positions = np.vstack(neighbors_future_positions)
+        return crsd_values
 
-        return self.crsd(
-            current_own_position,
-            future_own_position,
-            neighbors_current_positions,
-            neighbors_future_positions,
+    def __call__(
+        self,
+        graph_ds: BaseDataSet,
+        track_index: TrackIndex,
+        cpus: int = 1,
+        copy_dataset: bool = False,
+    ) -> BaseDataSet:
+
+        if copy_dataset:
+            graph_ds = graph_ds.copy()
+        graphs = [entry.data for entry in graph_ds]
+
+        frame_values = map_frames(
+            self._annotate_frame,
+            len(graphs),
+            lag_time_arrays(graphs, track_index, self._lag_times_frames),
+            cpus=cpus,
         )
 
-    def __call__(self, graph_ds: BaseDataSet) -> BaseDataSet:
-
-        graph_ds = graph_ds.copy()
-
-        for sindex in trange(len(graph_ds)):
-            for node_label in graph_ds[sindex].data.nodes:
-                crsd = self.crsd_single_node(graph_ds, node_label, sindex)
-                graph_ds[sindex].data.nodes[node_label][
-                    self._full_property_string
-                ] = crsd
+        for graph, crsd_values in zip(graphs, frame_values):
+            for property_string, crsd in zip(
+                self._full_property_strings, crsd_values, strict=True
+            ):
+                set_node_column(graph, property_string, crsd)
 
         return graph_ds
 
 
 if __name__ == "__main__":
+
+    mp.set_start_method("spawn")
+
     parser = ArgumentParser()
 
     parser.add_argument(
@@ -195,12 +214,12 @@ if __name__ == "__main__":
     lag_times_frames = [int(lt / delta_t_minutes) for lt in lag_times_minutes]
 
     x = BaseDataSet.from_pickle(args.infile)
+    track_index = TrackIndex.from_dataset(x)
 
-    for lt_frames, lt_minutes in zip(lag_times_frames, lag_times_minutes, strict=True):
-        x = CageRelativeSquaredDisplacementTransformation(
-            mum_per_px=mum_per_px,
-            lag_time_frames=lt_frames,
-            property_suffix=f"{lt_minutes}_min",
-        )(x)
+    x = CageRelativeSquaredDisplacementTransformation(
+        mum_per_px=mum_per_px,
+        lag_times_frames=lag_times_frames,
+        property_suffixes=[f"{lt_minutes}_min" for lt_minutes in lag_times_minutes],
+    )(x, track_index, cpus=args.cpus)
 
     x.to_pickle(args.outfile)
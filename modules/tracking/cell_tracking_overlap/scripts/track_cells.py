@@ -1,39 +1,53 @@
+import multiprocessing as mp
 from argparse import ArgumentParser
-from typing import Iterable
+from typing import Iterable, Sequence
 
+import numpy as np
 import overlap_tracking
+from cellular_dynamics.parallel import map_frames
 from core_data_utils.datasets import BaseDataSet, BaseDataSetEntry
-from tqdm import trange
 
 
 class OverlapTrackingTransformation:
     def __init__(self, labels_to_ignore: Iterable[int]) -> None:
         self._ignore_labels = labels_to_ignore
 
+    def _track_frame_pair(
+        self, frame: int, arrays: dict[str, Sequence[np.ndarray]]
+    ) -> dict:
+        labels = arrays["labels"]
+
+        return overlap_tracking.single_timestep_overlap_tracking(
+            labels[frame], labels[frame + 1], self._ignore_labels
+        )
+
     def __call__(
-        self, cell_labels: BaseDataSet, properties: BaseDataSet
+        self, cell_labels: BaseDataSet, properties: BaseDataSet, cpus: int = 1
     ) -> BaseDataSet:
 
         new_data_dict = {}
         properties = properties.copy()
 
-        for i in trange(len(cell_labels)):
+        # if we are in the index range for tracking add tracking informtion
+        # otherwise add properties unchanged as future processes will expect
+        # nodes without tracking information rather than relying on index information
+        num_tracked_frames = max(len(cell_labels) - 2, 0)
+
+        # frame pairs are independent, workers read the label images from shared
+        # memory, which is filled frame by frame (the frames are not stacked here)
+        tracking_maps = map_frames(
+            self._track_frame_pair,
+            num_tracked_frames,
+            {"labels": [entry.data for entry in cell_labels]},
+            cpus=cpus,
+        )
+
+        for i in range(len(cell_labels)):
             centry = cell_labels[i]
             current_props = properties[i].data
 
-            # if we are in the index range for tracking add tracking informtion
-            # otherwise add properties unchanged as future processes will expect
-            # nodes without tracking information rather than relying on index information
-            if i < len(cell_labels) - 2:
-                nentry = cell_labels[i + 1]
-
-                current_tracking_map = (
-                    overlap_tracking.single_timestep_overlap_tracking(
-                        centry.data, nentry.data, self._ignore_labels
-                    )
-                )
-
-                for current_label, next_label in current_tracking_map.items():
+            if i < num_tracked_frames:
+                for current_label, next_label in tracking_maps[i].items():
                     assert current_label in current_props
                     assert "next_object_id" not in current_props[current_label]
                     current_props[current_label]["next_object_id"] = next_label
@@ -50,6 +64,9 @@ class OverlapTrackingTransformation:
 
 
 if __name__ == "__main__":
+
+    mp.set_start_method("spawn")
+
     parser = ArgumentParser()
 
     parser.add_argument(
@@ -80,7 +97,7 @@ if __name__ == "__main__":
     abstract_structure_ds = BaseDataSet.from_pickle(args.abstract_structure_file)
 
     tracking_abstract_structure_ds = OverlapTrackingTransformation((0,))(
-        cell_labels=cell_label_ds, properties=abstract_structure_ds
+        cell_labels=cell_label_ds, properties=abstract_structure_ds, cpus=args.cpus
     )
 
     tracking_abstract_structure_ds.to_pickle(args.outfile)
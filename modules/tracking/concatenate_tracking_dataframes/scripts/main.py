@@ -1,42 +1,66 @@
 from argparse import ArgumentParser
 
-import numpy as np
 import polars as pl
 
 
-def concatenate_tracking_dataframes(file_paths: list[str]) -> pl.DataFrame:
-    big_dataframe: pl.DataFrame = None
-    current_last_track_id: int = 0
+def scan_tracking_dataframes(file_paths: list[str]) -> pl.LazyFrame:
+    """
+    Lazily concatenate tracking dataframes, adding a column 'track_id_unique'
+    which is unique across all dataframes.
+
+    Track ids of every file are offset by the sum of the maximum track ids of
+    all preceding files. The maxima are computed upfront from the 'track_id'
+    column alone, so the returned plan can be streamed (e.g. with
+    'sink_ipc') without holding all rows in memory. Empty files are skipped,
+    all files are restricted to the columns of the first non-empty one.
+
+    Args:
+        file_paths (list[str]): Paths to tracking dataframes (IPC files).
 
-    for ds_path in file_paths:
-        current_df = pl.read_ipc(
-            ds_path,
-            memory_map=False,
+    Returns:
+        (pl.LazyFrame): Concatenated tracking dataframes.
+    """
+
+    track_id_ranges = [
+        pl.scan_ipc(ds_path)
+        .select(
+            pl.col("track_id").min().alias("min"), pl.col("track_id").max().alias("max")
         )
+        .collect()
+        .row(0)
+        for ds_path in file_paths
+    ]
+
+    tracking_dataframes: list[pl.LazyFrame] = []
+    columns: list[str] = None
+    current_last_track_id: int = 0
 
-        if len(current_df) == 0:
+    for ds_path, (min_track_id, max_track_id) in zip(file_paths, track_id_ranges):
+        if max_track_id is None:
             continue
 
-        current_df = current_df.with_columns(
+        # track ids are shifted past all previous ones, they stay unique as long
+        # as they are positive
+        assert min_track_id > 0
+
+        current_df = pl.scan_ipc(ds_path).with_columns(
             (pl.col("track_id") + current_last_track_id).alias("track_id_unique")
         )
-        current_last_track_id += current_df["track_id"].max()
+        current_last_track_id += max_track_id
+
+        if columns is None:
+            columns = current_df.collect_schema().names()
+
+        tracking_dataframes.append(current_df.select(columns))
 
-        if big_dataframe is None:
-            big_dataframe = current_df.clone()
-        else:
-            assert (
-                np.intersect1d(
-                    big_dataframe["track_id_unique"].to_numpy(),
-                    current_df["track_id_unique"].to_numpy(),
-                ).size
-                == 0
-            )
-            big_dataframe = big_dataframe.vstack(
-                current_df.select(big_dataframe.columns)
-            )
+    if len(tracking_dataframes) == 0:
+        raise ValueError("All tracking dataframes are empty.")
 
-    return big_dataframe
+    return pl.concat(tracking_dataframes, how="vertical")
+
+
+def concatenate_tracking_dataframes(file_paths: list[str]) -> pl.DataFrame:
+    return scan_tracking_dataframes(file_paths).collect()
 
 
 if __name__ == "__main__":
@@ -50,6 +74,10 @@ if __name__ == "__main__":
     with open(args.infile, "r", encoding="utf-8") as file:
         file_list = [line.strip() for line in file]
 
-    df = concatenate_tracking_dataframes(file_list)
+    # stream directly into the output file
+    df = scan_tracking_dataframes(file_list)
 
-    df.write_ipc(args.outfile, compression="lz4")
+    if args.outfile.endswith(".parquet"):
+        df.sink_parquet(args.outfile)
+    else:
+        df.sink_ipc(args.outfile, compression="lz4")
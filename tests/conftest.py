@@ -0,0 +1,2 @@
+# puts the shared library on the path before the test modules are imported
+import tests.utils  # noqa: F401
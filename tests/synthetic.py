@@ -0,0 +1,198 @@
+import cv2
+import networkx as nx
+import numpy as np
+
+
+def voronoi_labels(shape: tuple[int, int], num_cells: int, seed: int = 0) -> np.ndarray:
+    """
+    Label image of touching cells, the Voronoi tessellation of random seeds.
+    Cells may consist of more than one component.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    seeds = np.ones(shape, dtype=np.uint8)
+    seeds[
+        rng.integers(0, shape[0], num_cells), rng.integers(0, shape[1], num_cells)
+    ] = 0
+
+    _, labels = cv2.distanceTransformWithLabels(
+        seeds, cv2.DIST_L2, cv2.DIST_MASK_5, labelType=cv2.DIST_LABEL_PIXEL
+    )
+
+    return labels.astype(np.int32)
+
+
+def separated_labels(
+    shape: tuple[int, int], num_cells: int, gap: int = 1, seed: int = 0
+) -> np.ndarray:
+    """
+    Label image of connected cells, separated by background lines at least
+    'gap' pixels wide and numbered consecutively.
+    """
+
+    labels = voronoi_labels(shape, num_cells, seed).astype(np.float32)
+    kernel = np.ones((2 * gap + 1, 2 * gap + 1), dtype=np.uint8)
+
+    interior = (cv2.erode(labels, kernel) == labels) & (
+        cv2.dilate(labels, kernel) == labels
+    )
+
+    _, labels = cv2.connectedComponents(interior.astype(np.uint8), connectivity=8)
+
+    return labels.astype(np.int32)
+
+
+def touching_labels(
+    shape: tuple[int, int], num_cells: int, seed: int = 0
+) -> np.ndarray:
+    """
+    Label image of connected cells, most of which touch their neighbors.
+    """
+
+    labels = separated_labels(shape, num_cells, gap=1, seed=seed)
+    grown = cv2.dilate(labels.astype(np.float32), np.ones((3, 3), dtype=np.uint8))
+
+    return np.where(labels == 0, grown, labels).astype(np.int32)
+
+
+def punched_labels(
+    shape: tuple[int, int], num_cells: int, num_holes: int, seed: int = 0
+) -> np.ndarray:
+    """
+    Voronoi label image with background discs (radius 1 to 4 pixels) punched
+    out at random positions, leaving holes in some of the cells.
+    """
+
+    labels = voronoi_labels(shape, num_cells, seed)
+    rng = np.random.default_rng(seed + 1)
+
+    holes = np.zeros(shape, dtype=np.uint8)
+    for _ in range(num_holes):
+        center = (int(rng.integers(shape[1])), int(rng.integers(shape[0])))
+        cv2.circle(holes, center, int(rng.integers(1, 5)), 1, -1)
+
+    labels[holes > 0] = 0
+
+    return labels
+
+
+def cell_properties(
+    num_cells: int, one_sided_fraction: float = 0.1, seed: int = 0
+) -> dict:
+    """
+    Cell properties (as produced by 'structure_abstraction') of cells on a
+    jittered square lattice with random, non-consecutive ids. Cells neighbor
+    the cells around them (8-neighborhood), a fraction of neighbor relations
+    is only reported by one of the two cells.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    side = int(np.ceil(np.sqrt(num_cells)))
+    lattice_rows, lattice_columns = np.divmod(np.arange(num_cells), side)
+    centroids = np.stack((lattice_columns, lattice_rows), axis=1) * 20.0
+    centroids += rng.normal(0, 3, centroids.shape)
+
+    cell_ids = rng.choice(np.arange(1, 4 * num_cells), num_cells, replace=False)
+    position = {
+        (row, column): index
+        for index, (row, column) in enumerate(zip(lattice_rows, lattice_columns))
+    }
+
+    properties = {}
+    for index, cell_id in enumerate(cell_ids.tolist()):
+        properties[cell_id] = {
+            "cell_centroid_x": float(centroids[index, 0]),
+            "cell_centroid_y": float(centroids[index, 1]),
+            "cell_area_mum_squared": float(rng.uniform(50, 150)),
+            "cell_perimeter_mum": float(rng.uniform(20, 60)),
+            "nucleus_major_axis_mum": float(rng.uniform(5, 10)),
+            "nucleus_minor_axis_mum": float(rng.uniform(2, 5)),
+            "cell_major_axis_angle_rad": float(rng.uniform(-np.pi / 2, np.pi / 2)),
+            "nucleus_major_axis_angle_rad": float(rng.uniform(-np.pi / 2, np.pi / 2)),
+            "neighbors": {},
+        }
+
+    for (row, column), index in position.items():
+        for row_offset, column_offset in ((0, 1), (1, -1), (1, 0), (1, 1)):
+            other = position.get((row + row_offset, column + column_offset))
+            if other is None:
+                continue
+
+            cell_id, other_id = int(cell_ids[index]), int(cell_ids[other])
+            perimeters = rng.uniform(0.5, 5.0, 2)
+
+            properties[cell_id]["neighbors"][other_id] = float(perimeters[0])
+            if rng.random() >= one_sided_fraction:
+                properties[other_id]["neighbors"][cell_id] = float(perimeters[1])
+
+    return properties
+
+
+def tracked_graphs(
+    num_frames: int,
+    num_cells: int,
+    link_fraction: float = 0.9,
+    merge_fraction: float = 0.0,
+    seed: int = 0,
+) -> list[nx.Graph]:
+    """
+    Graphs of 'num_frames' frames of cells with random, non-consecutive ids,
+    as annotated by the tracking. A 'link_fraction' of the cells (except in
+    the last frame) is linked to a cell of the next frame via
+    'next_object_id', a 'merge_fraction' of the links points to a cell which
+    is already linked from another one.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    cell_ids = [
+        rng.choice(np.arange(1, 4 * num_cells), num_cells, replace=False)
+        for _ in range(num_frames)
+    ]
+
+    graphs = []
+    for frame, frame_cell_ids in enumerate(cell_ids):
+        graph = nx.Graph()
+        graph.add_nodes_from(frame_cell_ids.tolist())
+
+        if frame + 1 < num_frames:
+            sources = np.flatnonzero(rng.random(num_cells) < link_fraction)
+            targets = rng.permutation(num_cells)[: len(sources)]
+
+            merged = np.flatnonzero(rng.random(len(sources)) < merge_fraction)
+            if len(merged) > 0:
+                targets[merged] = rng.choice(targets, len(merged))
+
+            for source, target in zip(sources.tolist(), targets.tolist()):
+                graph.nodes[int(frame_cell_ids[source])]["next_object_id"] = int(
+                    cell_ids[frame + 1][target]
+                )
+
+        graphs.append(graph)
+
+    return graphs
+
+
+def nuclei_mask(
+    shape: tuple[int, int],
+    num_nuclei: int,
+    radius: tuple[float, float] = (3.0, 7.0),
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Binary nuclei mask (as produced by the nuclei segmentation) of randomly
+    placed and oriented elliptic nuclei, which may touch or overlap.
+    """
+
+    rng = np.random.default_rng(seed)
+    mask = np.zeros(shape, dtype=np.uint8)
+
+    for _ in range(num_nuclei):
+        center = (int(rng.integers(0, shape[1])), int(rng.integers(0, shape[0])))
+        axes = tuple(int(round(axis)) for axis in rng.uniform(*radius, 2))
+        angle = float(rng.uniform(0, 180))
+        cv2.ellipse(mask, center, axes, angle, 0, 360, 1, thickness=-1)
+
+    return mask
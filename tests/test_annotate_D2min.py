@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from tests.utils import load_script
+
+pytest.importorskip("core_data_utils")
+
+annotate_D2min = load_script(
+    "modules/tracking/annotate_D2min/scripts/annotate_D2min.py"
+)
+calculate_D2min = annotate_D2min.D2minAnnotationTransformation.calculate_D2min
+
+
+def reference_D2min(dij_now: np.ndarray, dij_future: np.ndarray) -> float:
+    """
+    D2min of a single node, from the least-squares fit of the affine
+    deformation of its neighborhood.
+    """
+
+    strain_tensor_T, *_ = np.linalg.lstsq(dij_now, dij_future, rcond=None)
+
+    return ((dij_future - dij_now @ strain_tensor_T) ** 2).sum(axis=1).mean()
+
+
+def neighborhoods(
+    rng: np.random.Generator, num_nodes: int, kind: str
+) -> list[np.ndarray]:
+    """
+    Current neighbor offsets of 'num_nodes' nodes.
+    """
+
+    if kind == "generic":
+        return [rng.normal(0, 10, (rng.integers(3, 9), 2)) for _ in range(num_nodes)]
+
+    if kind == "single":
+        return [rng.normal(0, 10, (1, 2)) for _ in range(num_nodes)]
+
+    if kind == "collinear":
+        # all neighbors on a line through the node
+        return [
+            np.outer(rng.normal(0, 10, rng.integers(2, 7)), rng.normal(0, 1, 2))
+            for _ in range(num_nodes)
+        ]
+
+    if kind == "coincident":
+        # all neighbors at the same offset
+        return [
+            np.repeat(rng.normal(0, 10, (1, 2)), rng.integers(2, 5), axis=0)
+            for _ in range(num_nodes)
+        ]
+
+    raise ValueError(kind)
+
+
+@pytest.mark.parametrize("kind", ["generic", "single", "collinear", "coincident"])
+@pytest.mark.parametrize("noise", [0.0, 0.5])
+def test_calculate_D2min_matches_least_squares(kind, noise):
+    rng = np.random.default_rng(12)
+
+    offsets = neighborhoods(rng, 50, kind)
+    max_neighbors = max(len(dij_now) for dij_now in offsets)
+
+    dij_now = np.zeros((len(offsets), max_neighbors, 2))
+    dij_future = np.zeros((len(offsets), max_neighbors, 2))
+    expected = np.empty(len(offsets))
+
+    for node, node_offsets in enumerate(offsets):
+        # random affine deformation (the translation cancels in the offsets)
+        deformation = np.eye(2) + rng.normal(0, 0.3, (2, 2))
+        future_offsets = node_offsets @ deformation.T
+        future_offsets += rng.normal(0, noise, future_offsets.shape)
+
+        dij_now[node, : len(node_offsets)] = node_offsets
+        dij_future[node, : len(node_offsets)] = future_offsets
+        expected[node] = reference_D2min(node_offsets, future_offsets)
+
+    num_neighbors = np.array([len(node_offsets) for node_offsets in offsets])
+
+    np.testing.assert_allclose(
+        calculate_D2min(dij_now, dij_future, num_neighbors),
+        expected,
+        rtol=1e-6,
+        atol=1e-9,
+    )
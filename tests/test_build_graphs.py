@@ -0,0 +1,110 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from tests.synthetic import cell_properties
+from tests.utils import load_script
+
+pytest.importorskip("core_data_utils")
+
+from core_data_utils.datasets import BaseDataSetEntry  # noqa: E402
+
+build_graphs = load_script(
+    "modules/graph_processing/build_graphs/scripts/build_graphs.py"
+)
+
+
+def reference_graph(properties: dict, mum_px: float) -> nx.Graph:
+    """
+    Graph as constructed before 'edge_arrays', adding one directed neighbor
+    relation at a time.
+    """
+
+    G = nx.Graph()
+
+    for cell_id, property_dict in properties.items():
+        G.add_node(
+            cell_id, **{k: v for k, v in property_dict.items() if k != "neighbors"}
+        )
+
+    for cell_id, property_dict in properties.items():
+        for neighbor_index, overlap in property_dict["neighbors"].items():
+            own_centroid = np.array(
+                [property_dict["cell_centroid_x"], property_dict["cell_centroid_y"]]
+            )
+            nbh_centroid = np.array(
+                [
+                    properties[neighbor_index]["cell_centroid_x"],
+                    properties[neighbor_index]["cell_centroid_y"],
+                ]
+            )
+
+            distance = np.linalg.norm(own_centroid - nbh_centroid) * mum_px
+
+            if G.has_edge(cell_id, neighbor_index):
+                old_value = G[cell_id][neighbor_index]["shared_cell_perimeter_mum"]
+                G[cell_id][neighbor_index]["shared_cell_perimeter_mum"] = (
+                    old_value + overlap
+                ) / 2
+            else:
+                G.add_edge(
+                    cell_id,
+                    neighbor_index,
+                    shared_cell_perimeter_mum=overlap,
+                    distance_mum=distance,
+                )
+
+    return G
+
+
+def build_graph(properties: dict, mum_px: float, graph_format: str) -> nx.Graph:
+    entry = BaseDataSetEntry(identifier="frame", data=properties)
+    graph = (
+        build_graphs.BuildGraphTransform(mum_px=mum_px, graph_format=graph_format)
+        ._transform_single_entry(entry, {})
+        .data
+    )
+
+    if graph_format == "frame_graph":
+        return graph.to_networkx()
+    return graph
+
+
+@pytest.mark.parametrize("graph_format", ["networkx", "frame_graph"])
+@pytest.mark.parametrize("one_sided_fraction", [0.0, 0.2, 1.0])
+def test_build_graph_matches_reference(graph_format, one_sided_fraction):
+    properties = cell_properties(200, one_sided_fraction=one_sided_fraction, seed=3)
+
+    expected = reference_graph(properties, mum_px=0.65)
+    actual = build_graph(properties, mum_px=0.65, graph_format=graph_format)
+
+    assert list(actual.nodes) == list(expected.nodes)
+    for node, attributes in expected.nodes(data=True):
+        assert actual.nodes[node] == pytest.approx(attributes)
+
+    assert {frozenset(edge) for edge in actual.edges} == {
+        frozenset(edge) for edge in expected.edges
+    }
+    for source, target, attributes in expected.edges(data=True):
+        assert actual.edges[source, target] == pytest.approx(attributes)
+
+
+def test_edge_arrays_without_neighbors():
+    properties = cell_properties(3, seed=0)
+    for property_dict in properties.values():
+        property_dict["neighbors"] = {}
+
+    edges, shared_perimeters, distances = build_graphs.BuildGraphTransform.edge_arrays(
+        properties, 1.0
+    )
+
+    assert edges.shape == (0, 2)
+    assert len(shared_perimeters) == len(distances) == 0
+
+
+def test_edge_arrays_rejects_unknown_neighbors():
+    properties = cell_properties(4, seed=0)
+    next(iter(properties.values()))["neighbors"][-1] = 1.0
+
+    with pytest.raises(RuntimeError, match="not present in graph"):
+        build_graphs.BuildGraphTransform.edge_arrays(properties, 1.0)
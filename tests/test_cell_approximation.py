@@ -0,0 +1,102 @@
+import cv2
+import numpy as np
+import pytest
+
+from tests.synthetic import nuclei_mask
+from tests.utils import load_script
+
+pytest.importorskip("core_data_utils")
+
+from core_data_utils.datasets import BaseDataSetEntry  # noqa: E402
+
+cell_approximation = load_script(
+    "modules/image_processing/cell_approximation/scripts/cell_approximation.py"
+)
+
+
+def approximate_cells(image: np.ndarray, **kwargs) -> np.ndarray:
+    return (
+        cell_approximation.CellApproximationTransformation(**kwargs)
+        ._transform_single_entry(BaseDataSetEntry(identifier="frame", data=image), {})
+        .data
+    )
+
+
+def nuclei_per_cell(image: np.ndarray, cell_mask: np.ndarray) -> np.ndarray:
+    """
+    Number of nuclei within every cell of 'cell_mask'.
+    """
+
+    _, nuclei_labels = cv2.connectedComponents((image > 0).astype(np.uint8))
+    num_cells, cell_labels = cv2.connectedComponents(cell_mask)
+
+    # every nucleus lies within a single cell
+    nucleus_cells = np.zeros(nuclei_labels.max() + 1, dtype=np.int64)
+    nucleus_cells[nuclei_labels.ravel()] = cell_labels.ravel()
+    is_nucleus = nuclei_labels > 0
+    np.testing.assert_array_equal(
+        cell_labels[is_nucleus], nucleus_cells[nuclei_labels[is_nucleus]]
+    )
+    assert np.all(nucleus_cells[1:] > 0)
+
+    return np.bincount(nucleus_cells[1:], minlength=num_cells)[1:]
+
+
+@pytest.mark.parametrize("cell_cutoff_px", [None, 6.0, 15.0])
+@pytest.mark.parametrize("seed", range(3))
+def test_voronoi_matches_watershed_cells(cell_cutoff_px, seed):
+    image = nuclei_mask((180, 200), 70, seed=seed)
+
+    voronoi = approximate_cells(image, cell_cutoff_px=cell_cutoff_px, method="voronoi")
+    watershed = approximate_cells(
+        image, cell_cutoff_px=cell_cutoff_px, method="watershed"
+    )
+
+    voronoi_nuclei = nuclei_per_cell(image, voronoi)
+    watershed_nuclei = nuclei_per_cell(image, watershed)
+
+    assert len(voronoi_nuclei) == len(watershed_nuclei)
+    np.testing.assert_array_equal(voronoi_nuclei, 1)
+    np.testing.assert_array_equal(watershed_nuclei, 1)
+
+
+@pytest.mark.filterwarnings("error")
+@pytest.mark.parametrize("method", ["voronoi", "watershed"])
+@pytest.mark.parametrize(
+    "shape, num_nuclei, cell_cutoff_px, tile_size",
+    [
+        ((160, 170), 53, 11.8, 40),
+        ((160, 170), 53, 11.8, 17),
+        ((150, 130), 10, 5.5, 25),
+        ((150, 130), 90, 30.0, 25),
+        ((201, 97), 40, 8.0, 64),
+    ],
+)
+@pytest.mark.parametrize("seed", [38, 3])
+def test_tiled_matches_full_frame(
+    method, shape, num_nuclei, cell_cutoff_px, tile_size, seed
+):
+    image = nuclei_mask(shape, num_nuclei, seed=seed)
+
+    expected = approximate_cells(image, cell_cutoff_px=cell_cutoff_px, method=method)
+    actual = approximate_cells(
+        image,
+        cell_cutoff_px=cell_cutoff_px,
+        method=method,
+        tile_size=tile_size,
+        threads=3,
+    )
+
+    np.testing.assert_array_equal(actual, expected)
+
+
+@pytest.mark.filterwarnings("error")
+@pytest.mark.parametrize("method", ["voronoi", "watershed"])
+@pytest.mark.parametrize("num_nuclei", [0, 1])
+def test_tiled_without_nuclei_in_most_tiles(method, num_nuclei):
+    image = nuclei_mask((80, 90), num_nuclei, seed=0)
+
+    np.testing.assert_array_equal(
+        approximate_cells(image, cell_cutoff_px=6, method=method, tile_size=16),
+        approximate_cells(image, cell_cutoff_px=6, method=method),
+    )
@@ -0,0 +1,52 @@
+import networkx as nx
+import pytest
+from cellular_dynamics.centrality import shortest_path_centralities
+
+
+@pytest.fixture(scope="module")
+def lattice() -> nx.Graph:
+    return nx.convert_node_labels_to_integers(nx.triangular_lattice_graph(30, 30))
+
+
+def test_exact_centralities_match_networkx(lattice):
+    [(centralities, approximation)] = shortest_path_centralities([lattice])
+
+    assert approximation == {}
+    assert centralities["closeness_centrality"] == pytest.approx(
+        nx.closeness_centrality(lattice)
+    )
+    assert centralities["betweenness_centrality"] == pytest.approx(
+        nx.betweenness_centrality(lattice)
+    )
+
+
+def test_sampled_betweenness_keeps_closeness_exact(lattice):
+    with pytest.warns(UserWarning, match="closeness_radius"):
+        [(centralities, approximation)] = shortest_path_centralities(
+            [lattice], num_samples=20
+        )
+
+    assert approximation["betweenness_num_samples"] == 20
+    assert "closeness_radius" not in approximation
+    assert centralities["closeness_centrality"] == pytest.approx(
+        nx.closeness_centrality(lattice)
+    )
+
+
+@pytest.mark.filterwarnings("error")
+def test_sampled_betweenness_with_closeness_radius(lattice):
+    [(centralities, approximation)] = shortest_path_centralities(
+        [lattice], num_samples=20, closeness_radius=5
+    )
+
+    assert approximation["closeness_radius"] == 5
+    assert approximation["closeness_exact_fraction"] < 1.0
+
+    [(centralities, approximation)] = shortest_path_centralities(
+        [lattice], num_samples=20, closeness_radius=nx.diameter(lattice)
+    )
+
+    assert approximation["closeness_exact_fraction"] == 1.0
+    assert centralities["closeness_centrality"] == pytest.approx(
+        nx.closeness_centrality(lattice)
+    )
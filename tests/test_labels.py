@@ -0,0 +1,126 @@
+import cv2
+import numpy as np
+import pytest
+from cellular_dynamics.labels import (
+    bounding_boxes,
+    euler_numbers,
+    external_contour_mask,
+    separate_touching_labels,
+)
+
+from tests.synthetic import punched_labels, touching_labels, voronoi_labels
+
+LABEL_IMAGES = {
+    "voronoi": lambda seed: voronoi_labels((128, 128), 60, seed),
+    "touching": lambda seed: touching_labels((128, 128), 60, seed),
+    "punched": lambda seed: punched_labels((128, 128), 60, 40, seed),
+}
+
+
+def sequential_separation(labels: np.ndarray) -> np.ndarray:
+    """
+    Separation of touching labels as done before vectorization: labels are
+    visited in ascending order, and every pixel on the external contour of
+    their largest component which touches another label is removed.
+    """
+
+    disconnected_labels = labels.copy()
+    height, width = labels.shape
+
+    for cl in np.setdiff1d(disconnected_labels, (0,)):
+        mask = disconnected_labels == cl
+
+        num_ccs, labelled_ccs, stats, _ = cv2.connectedComponentsWithStats(
+            mask.astype(np.uint8), connectivity=8
+        )
+        if num_ccs > 2:
+            keep_label = np.argmax(stats[1:, cv2.CC_STAT_AREA]) + 1
+            mask[labelled_ccs != keep_label] = 0
+
+        contours, _ = cv2.findContours(
+            mask.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE
+        )
+
+        for column, row in contours[0].reshape(-1, 2):
+            current_neighbors = disconnected_labels[
+                max(0, row - 1) : min(height, row + 2),
+                max(0, column - 1) : min(width, column + 2),
+            ].flatten()
+
+            if np.setdiff1d(current_neighbors, (0, cl)).size > 0:
+                disconnected_labels[row, column] = 0
+
+    return disconnected_labels
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("kind", LABEL_IMAGES)
+def test_separate_touching_labels_matches_sequential_separation(kind, seed):
+    labels = LABEL_IMAGES[kind](seed)
+
+    np.testing.assert_array_equal(
+        separate_touching_labels(labels), sequential_separation(labels)
+    )
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("kind", LABEL_IMAGES)
+def test_external_contour_mask_matches_traced_contours(kind, seed):
+    labels = LABEL_IMAGES[kind](seed)
+
+    traced = np.zeros(labels.shape, dtype=bool)
+    for label in np.setdiff1d(labels, (0,)):
+        _, components, stats, _ = cv2.connectedComponentsWithStats(
+            (labels == label).astype(np.uint8), connectivity=8
+        )
+        largest = np.argmax(stats[1:, cv2.CC_STAT_AREA]) + 1
+
+        contours, _ = cv2.findContours(
+            (components == largest).astype(np.uint8),
+            cv2.RETR_EXTERNAL,
+            cv2.CHAIN_APPROX_NONE,
+        )
+        points = contours[0].reshape(-1, 2)
+        traced[points[:, 1], points[:, 0]] = True
+
+    np.testing.assert_array_equal(external_contour_mask(labels), traced)
+
+
+@pytest.mark.parametrize("kind", LABEL_IMAGES)
+def test_euler_numbers(kind):
+    labels = LABEL_IMAGES[kind](0)
+
+    expected = np.zeros(labels.max() + 1, dtype=np.int64)
+    for label in np.setdiff1d(labels, (0,)):
+        mask = np.pad(labels == label, 1).astype(np.uint8)
+
+        num_components, _ = cv2.connectedComponents(mask, connectivity=8)
+        # the outside is one of the 4-connected background components
+        num_background, _ = cv2.connectedComponents(1 - mask, connectivity=4)
+
+        expected[label] = (num_components - 1) - (num_background - 2)
+
+    np.testing.assert_array_equal(euler_numbers(labels), expected)
+
+
+@pytest.mark.parametrize("kind", LABEL_IMAGES)
+def test_bounding_boxes(kind):
+    labels = LABEL_IMAGES[kind](1)
+
+    expected_labels = np.setdiff1d(labels, (0,))
+    expected_boxes = []
+    for label in expected_labels:
+        rows, columns = np.nonzero(labels == label)
+        expected_boxes.append((rows.min(), columns.min(), rows.max(), columns.max()))
+
+    actual_labels, actual_boxes = bounding_boxes(labels)
+
+    np.testing.assert_array_equal(actual_labels, expected_labels)
+    np.testing.assert_array_equal(actual_boxes, expected_boxes)
+
+
+def test_bounding_boxes_without_labels():
+    actual_labels, actual_boxes = bounding_boxes(np.zeros((5, 4), dtype=np.int32))
+
+    assert actual_labels.shape == (0,)
+    assert actual_boxes.shape == (0, 4)
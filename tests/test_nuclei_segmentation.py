@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from tests.synthetic import separated_labels
+from tests.utils import load_script
+
+pytest.importorskip("core_data_utils")
+pytest.importorskip("stardist")
+
+from core_data_utils.datasets import BaseDataSet, BaseDataSetEntry  # noqa: E402
+from stardist.models import Config2D, StarDist2D  # noqa: E402
+
+nuclei_segmentation = load_script(
+    "modules/image_processing/nuclei_segmentation/scripts/nuclei_segmentation.py"
+)
+
+
+@pytest.fixture(scope="module")
+def stardist_model() -> StarDist2D:
+    # randomly initialized, with the grid of '2D_versatile_fluo': batched and
+    # per-frame prediction have to agree for any weights
+    return StarDist2D(
+        Config2D(n_rays=32, grid=(2, 2), n_channel_in=1), name=None, basedir=None
+    )
+
+
+def nuclei_images(shape: tuple[int, int], num_frames: int) -> BaseDataSet:
+    entries = {}
+
+    for frame in range(num_frames):
+        labels = separated_labels(shape, 30, gap=3, seed=frame)
+        image = np.repeat((labels > 0)[..., np.newaxis], 3, axis=2) * 200
+        image = image.astype(np.uint8) + np.uint8(frame)
+
+        identifier = f"frame_{frame}"
+        entries[identifier] = BaseDataSetEntry(identifier=identifier, data=image)
+
+    return BaseDataSet(dataset_entries=entries)
+
+
+def segment(
+    monkeypatch, stardist_model: StarDist2D, dataset: BaseDataSet, batch_size: int
+) -> BaseDataSet:
+    monkeypatch.setattr(
+        nuclei_segmentation.StarDist2D,
+        "from_pretrained",
+        lambda *args, **kwargs: stardist_model,
+    )
+
+    return nuclei_segmentation.StarDistSegmentationTransform(
+        prob_threshold=0.5,
+        batch_size=batch_size,
+        preprocessing=[nuclei_segmentation.GrayScaleNormalizeTransform()],
+    )(dataset)
+
+
+# image sizes which are not divisible by the network's downsampling
+@pytest.mark.parametrize("shape", [(96, 96), (100, 90), (75, 83)])
+def test_batched_prediction_matches_predict_instances(
+    monkeypatch, stardist_model, shape
+):
+    dataset = nuclei_images(shape, 4)
+
+    expected = segment(monkeypatch, stardist_model, dataset, batch_size=1)
+    actual = segment(monkeypatch, stardist_model, dataset, batch_size=3)
+
+    assert [entry.identifier for entry in actual] == [
+        entry.identifier for entry in expected
+    ]
+    for actual_entry, expected_entry in zip(actual, expected):
+        assert np.count_nonzero(expected_entry.data) > 0
+        np.testing.assert_array_equal(actual_entry.data, expected_entry.data)
@@ -0,0 +1,39 @@
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+from cellular_dynamics.parallel import SharedArrays, map_frames
+
+
+def frame_sum(frame: int, arrays: dict) -> int:
+    return int(arrays["frames"][frame].sum())
+
+
+def test_shared_arrays_stacks_frame_sequences():
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 100, (5, 7), dtype=np.int32) for _ in range(4)]
+
+    with SharedArrays({"frames": frames}) as shared_arrays:
+        memory_name, shape, dtype = shared_arrays.handles["frames"]
+        memory = SharedMemory(name=memory_name)
+
+        np.testing.assert_array_equal(
+            np.ndarray(shape, dtype=dtype, buffer=memory.buf), np.stack(frames)
+        )
+        memory.close()
+
+
+def test_shared_arrays_rejects_empty_frame_sequences():
+    with pytest.raises(ValueError, match="without frames"):
+        SharedArrays({"frames": []})
+
+
+@pytest.mark.parametrize("num_frames", [0, 1, 5])
+@pytest.mark.parametrize("cpus", [1, 2])
+def test_map_frames_with_frame_sequences(num_frames, cpus):
+    rng = np.random.default_rng(1)
+    frames = [rng.integers(0, 100, (6, 6)) for _ in range(num_frames)]
+
+    assert map_frames(frame_sum, num_frames, {"frames": frames}, cpus=cpus) == [
+        int(frame.sum()) for frame in frames
+    ]
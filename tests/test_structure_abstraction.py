@@ -0,0 +1,115 @@
+from collections import defaultdict
+
+import cv2
+import numpy as np
+import pytest
+
+from tests.synthetic import separated_labels, touching_labels
+from tests.utils import load_script
+
+pytest.importorskip("core_data_utils")
+
+from core_data_utils.datasets import BaseDataSetEntry  # noqa: E402
+
+structure_abstraction = load_script(
+    "modules/graph_processing/structure_abstraction/scripts/structure_abstraction.py"
+)
+
+
+def reference_neighbors(
+    labelim: np.ndarray,
+    mum_px: float,
+    cutout_size: int,
+    dilation_size: int,
+    iterations: int,
+) -> dict:
+    """
+    Contact lengths as computed before vectorization, by dilating every
+    contour point on its own.
+    """
+
+    neighbors = {}
+
+    for current_cell_label in np.setdiff1d(np.unique(labelim), 0):
+        contours, _ = cv2.findContours(
+            (labelim == current_cell_label).astype(np.uint8),
+            cv2.RETR_EXTERNAL,
+            cv2.CHAIN_APPROX_NONE,
+        )
+
+        neighbors[current_cell_label] = defaultdict(int)
+        empty_image = np.zeros_like(labelim, dtype=np.uint8)
+
+        for point in contours[0]:
+            column, row = point[0]
+
+            min_row = max(0, row - cutout_size)
+            max_row = min(labelim.shape[0], row + cutout_size)
+            min_col = max(0, column - cutout_size)
+            max_col = min(labelim.shape[1], column + cutout_size)
+
+            empty_image *= 0
+            empty_image[row, column] = 1
+
+            dilated = cv2.dilate(
+                empty_image[min_row:max_row, min_col:max_col],
+                cv2.getStructuringElement(
+                    cv2.MORPH_RECT, (dilation_size, dilation_size)
+                ),
+                iterations=iterations,
+            )
+
+            overlaps = np.setdiff1d(
+                labelim[min_row:max_row, min_col:max_col] * dilated,
+                [0, current_cell_label],
+            )
+
+            for ov in overlaps:
+                neighbors[current_cell_label][ov] += 1 * mum_px
+
+    return neighbors
+
+
+def identify_neighbors(labelim: np.ndarray, mum_px: float, **kwargs) -> dict:
+    transformation = structure_abstraction.IdentifyNeighborsTransformation(
+        mum_px=mum_px, **kwargs
+    )
+
+    props = {label: {} for label in np.setdiff1d(np.unique(labelim), 0)}
+    entry = BaseDataSetEntry(
+        identifier="frame",
+        data={"merged_properties": props, "cell_labels": labelim},
+    )
+
+    result = transformation._transform_single_entry(entry, {}).data
+
+    return {label: result[label]["neighbors"] for label in result}
+
+
+@pytest.mark.parametrize("dilation_size", [3, 4, 5, 6])
+@pytest.mark.parametrize("iterations", [1, 2])
+@pytest.mark.parametrize("cutout_size", [1, 2, 3, 4, 30])
+@pytest.mark.parametrize("make_labels", [separated_labels, touching_labels])
+def test_identify_neighbors_matches_per_point_dilation(
+    dilation_size, iterations, cutout_size, make_labels
+):
+    labelim = make_labels((96, 128), 40, seed=dilation_size * iterations)
+
+    expected = reference_neighbors(
+        labelim,
+        mum_px=0.5,
+        cutout_size=cutout_size,
+        dilation_size=dilation_size,
+        iterations=iterations,
+    )
+    actual = identify_neighbors(
+        labelim,
+        mum_px=0.5,
+        cutout_size=cutout_size,
+        dilation_size=dilation_size,
+        iterations=iterations,
+    )
+
+    assert actual.keys() == expected.keys()
+    for label, neighbors in expected.items():
+        assert actual[label] == pytest.approx(dict(neighbors))
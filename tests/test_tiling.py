@@ -0,0 +1,130 @@
+import cv2
+import networkx as nx
+import numpy as np
+import pytest
+from cellular_dynamics.tiling import (
+    TiledComponents,
+    clip_window,
+    merge_labels,
+    read_window,
+    tile_grid,
+)
+
+from tests.synthetic import nuclei_mask
+
+
+@pytest.mark.parametrize("tile_size", [7, 16, 50])
+def test_tile_grid_covers_image_once(tile_size):
+    coverage = np.zeros((37, 23), dtype=np.int64)
+
+    for grid_row in tile_grid(coverage.shape, tile_size):
+        for tile in grid_row:
+            assert coverage[tile].shape[0] <= tile_size
+            assert coverage[tile].shape[1] <= tile_size
+            coverage[tile] += 1
+
+    np.testing.assert_array_equal(coverage, 1)
+
+
+@pytest.mark.parametrize("halo", [0, 2, 9])
+def test_read_window_fills_outside_with_zeros(halo):
+    image = np.arange(1, 21 * 17 + 1).reshape(21, 17)
+    padded = np.pad(image, halo)
+
+    for grid_row in tile_grid(image.shape, 8):
+        for rows, columns in grid_row:
+            np.testing.assert_array_equal(
+                read_window(image, (rows, columns), halo),
+                padded[
+                    rows.start : rows.stop + 2 * halo,
+                    columns.start : columns.stop + 2 * halo,
+                ],
+            )
+
+
+@pytest.mark.parametrize("halo", [0, 2, 9])
+def test_clip_window(halo):
+    image = np.arange(1, 21 * 17 + 1).reshape(21, 17)
+
+    for grid_row in tile_grid(image.shape, 8):
+        for tile in grid_row:
+            (rows, columns), window_tile = clip_window(image.shape, tile, halo)
+
+            assert rows.start == max(tile[0].start - halo, 0)
+            assert rows.stop == min(tile[0].stop + halo, image.shape[0])
+            assert columns.start == max(tile[1].start - halo, 0)
+            assert columns.stop == min(tile[1].stop + halo, image.shape[1])
+            np.testing.assert_array_equal(
+                image[rows, columns][window_tile], image[tile]
+            )
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_merge_labels_matches_connected_components(seed):
+    rng = np.random.default_rng(seed)
+    num_labels = 200
+    pairs = rng.integers(0, num_labels, (150, 2))
+
+    graph = nx.Graph()
+    graph.add_nodes_from(range(num_labels))
+    graph.add_edges_from(pairs.tolist())
+
+    expected = np.empty(num_labels, dtype=np.int64)
+    for component in nx.connected_components(graph):
+        expected[list(component)] = min(component)
+
+    np.testing.assert_array_equal(merge_labels(num_labels, pairs), expected)
+
+
+def test_merge_labels_without_pairs():
+    np.testing.assert_array_equal(
+        merge_labels(4, np.empty((0, 2), dtype=np.int64)), np.arange(4)
+    )
+
+
+def component_image(seed: int) -> np.ndarray:
+    """
+    Foreground with components of very different sizes, from single pixels
+    to components spanning many tiles.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    image = nuclei_mask((90, 110), 60, radius=(1.0, 9.0), seed=seed)
+    image[rng.random(image.shape) < 0.02] = 1
+    # thin diagonal lines, whose pixels only touch at their corners
+    np.fill_diagonal(image[5:], 1)
+    np.fill_diagonal(image[:, 40:], 1)
+
+    return image
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("tile_size", [8, 13, 32, 200])
+def test_tiled_components_match_full_image(seed, tile_size):
+    image = component_image(seed)
+
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(
+        image, connectivity=8
+    )
+    # the full image label of some components at a few of their pixels
+    values = labels * (np.random.default_rng(seed).random(image.shape) < 0.05)
+
+    components = TiledComponents(image, tile_size, values=values, threads=2)
+
+    assert components.num_components == num_labels - 1
+
+    # every component with its area and value
+    expected_values = np.zeros(num_labels, dtype=values.dtype)
+    np.maximum.at(expected_values, labels.ravel(), values.ravel())
+
+    assert sorted(zip(components.areas.tolist(), components.values.tolist())) == (
+        sorted(zip(stats[1:, cv2.CC_STAT_AREA].tolist(), expected_values[1:].tolist()))
+    )
+
+    # components are numbered differently, compare through the pixels
+    keep = components.values % 2 == 1
+    np.testing.assert_array_equal(
+        components.write_mask(keep, np.zeros_like(image)),
+        (expected_values[labels] % 2 == 1).astype(image.dtype),
+    )
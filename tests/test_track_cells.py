@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from tests.synthetic import voronoi_labels
+from tests.utils import load_script
+
+pytest.importorskip("core_data_utils")
+overlap_tracking = pytest.importorskip("overlap_tracking")
+
+from core_data_utils.datasets import BaseDataSet, BaseDataSetEntry  # noqa: E402
+
+track_cells = load_script(
+    "modules/tracking/cell_tracking_overlap/scripts/track_cells.py"
+)
+
+
+def reference_tracking(cell_labels: BaseDataSet, properties: BaseDataSet) -> list:
+    """
+    'next_object_id' annotations as computed before the frame pairs were
+    tracked in parallel, one frame pair after the other.
+    """
+
+    annotations = []
+
+    for i in range(len(cell_labels)):
+        current_props = {
+            label: dict(property_dict)
+            for label, property_dict in properties[i].data.items()
+        }
+
+        if i < len(cell_labels) - 2:
+            tracking_map = overlap_tracking.single_timestep_overlap_tracking(
+                cell_labels[i].data, cell_labels[i + 1].data, (0,)
+            )
+            for current_label, next_label in tracking_map.items():
+                current_props[current_label]["next_object_id"] = next_label
+
+        annotations.append(current_props)
+
+    return annotations
+
+
+def label_movie(num_frames: int) -> tuple[BaseDataSet, BaseDataSet]:
+    cell_labels, properties = {}, {}
+
+    for frame in range(num_frames):
+        labels = voronoi_labels((64, 64), 20, seed=frame)
+        identifier = f"frame_{frame}"
+
+        cell_labels[identifier] = BaseDataSetEntry(identifier=identifier, data=labels)
+        properties[identifier] = BaseDataSetEntry(
+            identifier=identifier,
+            data={int(label): {} for label in np.unique(labels) if label != 0},
+        )
+
+    return (
+        BaseDataSet(dataset_entries=cell_labels),
+        BaseDataSet(dataset_entries=properties),
+    )
+
+
+@pytest.mark.parametrize("num_frames", [0, 1, 2, 6])
+@pytest.mark.parametrize("cpus", [1, 2])
+def test_tracking_matches_reference(num_frames, cpus):
+    cell_labels, properties = label_movie(num_frames)
+    expected = reference_tracking(cell_labels, properties)
+
+    tracked = track_cells.OverlapTrackingTransformation((0,))(
+        cell_labels, properties, cpus=cpus
+    )
+
+    assert len(tracked) == num_frames
+    assert [tracked[i].data for i in range(num_frames)] == expected
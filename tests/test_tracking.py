@@ -0,0 +1,104 @@
+import networkx as nx
+import numpy as np
+import pytest
+from cellular_dynamics.tracking import NO_OBJECT, TrackIndex
+
+from tests.synthetic import tracked_graphs
+
+
+def reference_future_id(graphs: list[nx.Graph], frame: int, node_id: int, lag: int):
+    """
+    Id of the object 'lag' frames after 'node_id' by following the
+    'next_object_id' links one frame at a time, None where the track ends.
+    """
+
+    for step in range(lag):
+        node_id = graphs[frame + step].nodes[node_id].get("next_object_id")
+        if node_id is None:
+            return None
+
+    return node_id
+
+
+def reference_tracks(graphs: list[nx.Graph]) -> list[list[tuple[int, int]]]:
+    """
+    (frame, object id) of all tracks, assembled like 'CellTrackAssembler'
+    did before the track index: a track starts at every node not seen yet
+    and follows the links to its end.
+    """
+
+    seen = [set() for _ in graphs]
+    tracks = []
+
+    for start_frame, graph in enumerate(graphs):
+        for node_id in graph.nodes:
+            if node_id in seen[start_frame]:
+                continue
+
+            track = []
+            frame = start_frame
+            while node_id is not None:
+                seen[frame].add(node_id)
+                track.append((frame, node_id))
+                node_id = graphs[frame].nodes[node_id].get("next_object_id")
+                frame += 1
+
+            tracks.append(track)
+
+    return tracks
+
+
+@pytest.mark.parametrize("merge_fraction", [0.0, 0.3])
+def test_track_table_matches_reference(merge_fraction):
+    graphs = tracked_graphs(8, 40, merge_fraction=merge_fraction, seed=5)
+    track_index = TrackIndex(graphs)
+
+    tracks = []
+    for track in range(track_index.num_tracks):
+        entries = np.s_[
+            track_index.track_offsets[track] : track_index.track_offsets[track + 1]
+        ]
+        tracks.append(
+            [
+                (frame, int(track_index.node_ids(frame)[position]))
+                for frame, position in zip(
+                    track_index.track_frames[entries].tolist(),
+                    track_index.track_positions[entries].tolist(),
+                )
+            ]
+        )
+
+    assert tracks == reference_tracks(graphs)
+    assert track_index.track_starts.tolist() == [track[0][0] for track in tracks]
+
+
+@pytest.mark.parametrize("merge_fraction", [0.0, 0.3])
+def test_future_positions_match_reference(merge_fraction):
+    graphs = tracked_graphs(8, 40, merge_fraction=merge_fraction, seed=6)
+    track_index = TrackIndex(graphs)
+
+    for frame in range(len(graphs)):
+        frame_node_ids = track_index.node_ids(frame)
+
+        for lag in range(1, len(graphs) - frame - 1):
+            future = track_index.future_positions(frame, lag)
+            future_node_ids = track_index.node_ids(frame + lag)
+
+            expected = [
+                reference_future_id(graphs, frame, node_id, lag)
+                for node_id in frame_node_ids.tolist()
+            ]
+            actual = [
+                None if position == NO_OBJECT else int(future_node_ids[position])
+                for position in future.tolist()
+            ]
+
+            assert actual == expected
+
+
+def test_links_to_unknown_objects_raise():
+    graphs = tracked_graphs(3, 5, seed=0)
+    next(iter(graphs[0].nodes.values()))["next_object_id"] = -5
+
+    with pytest.raises(RuntimeError, match="do not exist"):
+        TrackIndex(graphs)
@@ -0,0 +1,33 @@
+import importlib.util
+import sys
+from pathlib import Path
+from types import ModuleType
+
+REPOSITORY = Path(__file__).resolve().parents[1]
+
+# the module scripts import the shared library like in the pipeline
+if str(REPOSITORY / "lib") not in sys.path:
+    sys.path.insert(0, str(REPOSITORY / "lib"))
+
+
+def load_script(relative_path: str) -> ModuleType:
+    """
+    Import a module script, which is not part of a package, by its path.
+
+    Args:
+        relative_path (str): Path of the script relative to the repository root.
+
+    Returns:
+        (ModuleType): The imported script.
+    """
+
+    path = REPOSITORY / relative_path
+    name = path.stem
+
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+
+    return sys.modules[name]